@@ -0,0 +1,222 @@
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from preprocessing import ConnectionPool
+from plantree import PlanTree
+from whatif import QueryModifier
+
+
+# Keeps the QEP fingerprint and cost of a set of registered queries in a local SQLite file and reports plan changes
+class PlanBaselineStore:
+    def __init__(self, path="baselines.db"):
+        self.path = path
+        self.database = sqlite3.connect(path)
+        self.database.executescript("""
+        CREATE TABLE IF NOT EXISTS queries (
+            name TEXT PRIMARY KEY,
+            dbname TEXT NOT NULL,
+            query TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS baselines (
+            name TEXT PRIMARY KEY REFERENCES queries(name) ON DELETE CASCADE,
+            fingerprint TEXT NOT NULL,
+            cost REAL,
+            plan BLOB NOT NULL,
+            captured_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS checks (
+            name TEXT NOT NULL,
+            fingerprint TEXT,
+            cost REAL,
+            status TEXT NOT NULL,
+            checked_at REAL NOT NULL
+        );
+        """)
+        self.database.execute("PRAGMA foreign_keys = ON")
+
+
+    def close(self):
+        self.database.close()
+
+
+    #============================================Logic to manage query set===========================================#
+    # Registers a query to watch under a name, replacing the query and dropping its baseline if the name exists
+    def register_query(self, name, query, dbname):
+        with self.database:
+            self.database.execute("DELETE FROM baselines WHERE name = ?", (name,))
+            self.database.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?)", (name, dbname, query.strip().rstrip(';')))
+
+
+    def remove_query(self, name):
+        with self.database:
+            self.database.execute("DELETE FROM queries WHERE name = ?", (name,))
+
+
+    # Returns the registered queries as (name, dbname, query), optionally only the given names
+    def retrieve_queries(self, names=None):
+        rows = self.database.execute("SELECT name, dbname, query FROM queries ORDER BY name").fetchall()
+        return [row for row in rows if names is None or row[0] in names]
+
+
+    # Returns the stored baseline of a query as a dict, or None if it has none yet
+    def retrieve_baseline(self, name):
+        row = self.database.execute("SELECT fingerprint, cost, plan, captured_at FROM baselines WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        # Plans are stored as zlib compressed JSON to keep the file small
+        return {'fingerprint': row[0], 'cost': row[1], 'plan': json.loads(zlib.decompress(row[2])), 'captured_at': row[3]}
+
+
+    # Stores a plan as the new baseline of a query
+    def save_baseline(self, name, qep, fingerprint):
+        plan = zlib.compress(json.dumps(qep, separators=(',', ':')).encode())
+        with self.database:
+            self.database.execute(
+                "INSERT OR REPLACE INTO baselines VALUES (?, ?, ?, ?, ?)",
+                (name, fingerprint, qep['Plan'].get('Total Cost'), plan, time.time())
+            )
+    #================================================================================================================#
+
+    #==========================================Logic to detect plan changes==========================================#
+    # Plans the registered queries concurrently, one pooled connection per worker.
+    # Returns name -> (QEP, fingerprint), or the exception raised while planning.
+    def plan_queries(self, pool, names=None, max_workers=4):
+        queries = self.retrieve_queries(names)
+
+        def plan_query(dbname, query):
+            try:
+                with pool.connection(dbname) as connection:
+                    query_modifier = QueryModifier(connection)
+                    qep = query_modifier.explain_json(query, [])
+                    return qep, query_modifier.fingerprint_plan(qep)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(plan_query, dbname, query) for name, dbname, query in queries}
+        return {name: future.result() for name, future in futures.items()}
+
+
+    # Re-plans the registered queries and compares them with their baselines. Queries without a baseline get one.
+    # With accept, changed plans become the new baselines.
+    def check_plans(self, pool, names=None, max_workers=4, accept=False):
+        reports = []
+        for name, result in self.plan_queries(pool, names, max_workers).items():
+            if isinstance(result, Exception):
+                reports.append({'name': name, 'status': 'error', 'error': str(result).strip()})
+                self.record_check(name, None, None, 'error')
+                continue
+
+            qep, fingerprint = result
+            cost = qep['Plan'].get('Total Cost')
+            baseline = self.retrieve_baseline(name)
+            report = {'name': name, 'fingerprint': fingerprint, 'cost': cost}
+            if baseline is None:
+                report['status'] = 'new'
+                self.save_baseline(name, qep, fingerprint)
+            elif baseline['fingerprint'] == fingerprint:
+                report['status'] = 'unchanged'
+                report['cost_delta'] = cost - baseline['cost']
+            else:
+                report['status'] = 'changed'
+                report['baseline_fingerprint'] = baseline['fingerprint']
+                report['baseline_cost'] = baseline['cost']
+                report['cost_delta'] = cost - baseline['cost']
+                report['removed'], report['added'] = self.compare_operators(baseline['plan']['Plan'], qep['Plan'])
+                if accept:
+                    self.save_baseline(name, qep, fingerprint)
+            self.record_check(name, fingerprint, cost, report['status'])
+            reports.append(report)
+        return reports
+
+
+    def record_check(self, name, fingerprint, cost, status):
+        with self.database:
+            self.database.execute("INSERT INTO checks VALUES (?, ?, ?, ?, ?)", (name, fingerprint, cost, status, time.time()))
+
+
+    # Returns the operators only in the baseline plan and those only in the new plan, counting repeats
+    def compare_operators(self, baseline, plan):
+        baseline_operators = collections.Counter(PlanTree.from_plan(baseline).operators())
+        plan_operators = collections.Counter(PlanTree.from_plan(plan).operators())
+        return sorted((baseline_operators - plan_operators).elements()), sorted((plan_operators - baseline_operators).elements())
+
+
+    # Formats the results of a check for display
+    def parse_reports(self, reports):
+        output_text = ""
+        for report in reports:
+            output_text += f"{report['name']}: "
+            if report['status'] == 'error':
+                output_text += f"failed to plan: {report['error']}\n"
+            elif report['status'] == 'new':
+                output_text += f"baseline recorded, plan {report['fingerprint']} with total cost {report['cost']}\n"
+            elif report['status'] == 'unchanged':
+                output_text += f"plan unchanged, total cost {report['cost']} ({report['cost_delta']:+.2f})\n"
+            else:
+                output_text += f"PLAN CHANGED from {report['baseline_fingerprint']} to {report['fingerprint']}, "
+                output_text += f"total cost {report['baseline_cost']} -> {report['cost']} ({report['cost_delta']:+.2f})\n"
+                for operator in report['removed']:
+                    output_text += f"    - {operator}\n"
+                for operator in report['added']:
+                    output_text += f"    + {operator}\n"
+        return output_text
+    #================================================================================================================#
+
+
+# Command line entry point, so checks can run from cron or another scheduler. Exits with 1 if any plan changed.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch the query plans of registered queries for changes.")
+    parser.add_argument("--store", default="baselines.db", help="SQLite file holding the query set and baselines")
+    parser.add_argument("--host", default=os.environ.get("PGHOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PGPORT", 5432)))
+    parser.add_argument("--user", default=os.environ.get("PGUSER", "postgres"))
+    parser.add_argument("--dbname", default=os.environ.get("PGDATABASE", "postgres"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    register_parser = subparsers.add_parser("register", help="Register a query read from a file, or - for stdin")
+    register_parser.add_argument("name")
+    register_parser.add_argument("file")
+    remove_parser = subparsers.add_parser("remove", help="Stop watching a query")
+    remove_parser.add_argument("name")
+    subparsers.add_parser("list", help="List the registered queries")
+    check_parser = subparsers.add_parser("check", help="Re-plan the registered queries and report plan changes")
+    check_parser.add_argument("names", nargs="*")
+    check_parser.add_argument("--workers", type=int, default=4)
+    check_parser.add_argument("--accept", action="store_true", help="Make changed plans the new baselines")
+    args = parser.parse_args(argv)
+
+    store = PlanBaselineStore(args.store)
+    try:
+        if args.command == "register":
+            file = sys.stdin if args.file == "-" else open(args.file)
+            with file:
+                store.register_query(args.name, file.read(), args.dbname)
+        elif args.command == "remove":
+            store.remove_query(args.name)
+        elif args.command == "list":
+            for name, dbname, query in store.retrieve_queries():
+                print(f"{name} ({dbname}): {' '.join(query.split())}")
+        else:
+            # The password comes from the environment or ~/.pgpass so it does not show up in the process list
+            login_details = {"host": args.host, "port": args.port, "user": args.user, "password": os.environ.get("PGPASSWORD"), "dbname": args.dbname}
+            pool = ConnectionPool(login_details, max_idle_per_database=args.workers)
+            try:
+                reports = store.check_plans(pool, args.names or None, args.workers, args.accept)
+            finally:
+                pool.close_all()
+            print(store.parse_reports(reports), end="")
+            return 1 if any(report['status'] == 'changed' for report in reports) else 0
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
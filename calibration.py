@@ -0,0 +1,164 @@
+import math
+import numpy as np
+from whatif import QueryModifier
+from knobs import COST_PARAMETERS
+
+CALIBRATION_TABLE = "whatif_calibration"
+
+# Micro-queries on the calibration table with the settings that force the plan shape each one exercises
+MICRO_QUERIES = [
+    (f"SELECT count(*) FROM {CALIBRATION_TABLE}", []),
+    (f"SELECT count(*) FROM {CALIBRATION_TABLE} WHERE val < 50000", []),
+    (f"SELECT count(*) FROM {CALIBRATION_TABLE} WHERE val < 50000 AND id % 3 = 0 AND pad > 'a'", []),
+    (f"SELECT * FROM {CALIBRATION_TABLE} WHERE id < {{rows}} / 20", ["SET enable_seqscan TO off;", "SET enable_bitmapscan TO off;"]),
+    (f"SELECT * FROM {CALIBRATION_TABLE} WHERE val < 2000", ["SET enable_seqscan TO off;", "SET enable_bitmapscan TO off;"]),
+    (f"SELECT * FROM {CALIBRATION_TABLE} WHERE val < 5000", ["SET enable_seqscan TO off;", "SET enable_indexscan TO off;"]),
+    (f"SELECT val, count(*) FROM {CALIBRATION_TABLE} GROUP BY val", []),
+    (f"SELECT id FROM {CALIBRATION_TABLE} ORDER BY pad", []),
+    (f"SELECT count(*) FROM {CALIBRATION_TABLE} a JOIN {CALIBRATION_TABLE} b ON a.id = b.val", []),
+]
+
+# Node types whose pages are read in index order rather than sequentially
+RANDOM_ACCESS_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan', 'Bitmap Index Scan')
+INDEX_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+CONDITION_KEYS = ('Filter', 'Index Cond', 'Recheck Cond', 'Hash Cond', 'Merge Cond', 'Join Filter')
+
+
+# Fits the planner cost parameters to timings of sampled executions so that estimated costs read as milliseconds
+class CostCalibrator(QueryModifier):
+    #===========================================Logic to sample executions===========================================#
+    # Runs the micro-queries on a temporary table, and any given queries, with EXPLAIN ANALYZE and fits the cost parameters.
+    # Everything runs in one transaction that is rolled back, but the queries are executed, so this is meant for a local server.
+    def calibrate(self, queries=(), samples=3, rows=100000):
+        # Observations are collected per attempt, so a retried probe does not count them twice
+        def measure(cursor):
+            observations = []
+            cursor.execute("SET LOCAL max_parallel_workers_per_gather TO 0;")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {CALIBRATION_TABLE} AS "
+                "SELECT g AS id, (g * 7919) %% %s AS val, md5(g::text) AS pad FROM generate_series(1, %s) g",
+                (rows, rows)
+            )
+            cursor.execute(f"CREATE INDEX ON {CALIBRATION_TABLE} (id)")
+            cursor.execute(f"CREATE INDEX ON {CALIBRATION_TABLE} (val)")
+            cursor.execute(f"ANALYZE {CALIBRATION_TABLE}")
+
+            runs = [(query.format(rows=rows), settings) for query, settings in MICRO_QUERIES]
+            runs += [(query, []) for query in queries]
+            for query, settings in runs:
+                # The first run warms the cache and is not used
+                for sample in range(samples + 1):
+                    plan = self.explain_analyze(cursor, query, settings)
+                    if sample > 0:
+                        observations.extend(self.get_node_observations(plan['Plan']))
+
+            cursor.execute("SELECT name, setting::float FROM pg_settings WHERE name = ANY(%s)", (COST_PARAMETERS,))
+            return observations, dict(cursor.fetchall())
+
+        # The queries are executed, so only waiting for locks is limited
+        observations, current = self.probe_runner.run_transaction(self.connection, measure, analyze=True)
+        return self.fit_cost_parameters(observations, current)
+
+
+    # Runs one query with EXPLAIN ANALYZE under a savepoint, so its settings are undone afterwards
+    def explain_analyze(self, cursor, query, settings):
+        cursor.execute("SAVEPOINT whatif_calibration;" + "".join(settings) + f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+        plan = cursor.fetchall()[0][0][0]
+        cursor.execute("ROLLBACK TO SAVEPOINT whatif_calibration;")
+        return plan
+
+
+    # Returns (work counts per cost parameter, time in ms) for each node, counting only the work and time of the node itself
+    def get_node_observations(self, plan):
+        observations = []
+        for sub_plan in plan.get('Plans', []):
+            observations.extend(self.get_node_observations(sub_plan))
+
+        loops = plan.get('Actual Loops', 1) or 0
+        node_time = plan.get('Actual Total Time', 0) * loops
+        node_time -= sum(sub_plan.get('Actual Total Time', 0) * (sub_plan.get('Actual Loops', 1) or 0) for sub_plan in plan.get('Plans', []))
+        if loops == 0:
+            return observations
+
+        node_type = plan.get('Node Type')
+        rows = plan.get('Actual Rows', 0) * loops
+        examined = rows + plan.get('Rows Removed by Filter', 0) * loops + plan.get('Rows Removed by Index Recheck', 0) * loops
+        input_rows = sum(sub_plan.get('Actual Rows', 0) * (sub_plan.get('Actual Loops', 1) or 0) for sub_plan in plan.get('Plans', []))
+
+        # Buffer counts include the children, so pages are only attributed to scans
+        pages = 0
+        if 'Scan' in node_type:
+            pages = sum(plan.get(f"{kind} {access} Blocks", 0) for kind in ('Shared', 'Local') for access in ('Hit', 'Read'))
+            pages -= sum(sub_plan.get(f"{kind} {access} Blocks", 0) for sub_plan in plan.get('Plans', []) for kind in ('Shared', 'Local') for access in ('Hit', 'Read'))
+        operators = sum(self.count_operators(plan.get(key, '')) for key in CONDITION_KEYS)
+
+        features = [0.0] * len(COST_PARAMETERS)
+        features[0 if node_type not in RANDOM_ACCESS_NODES else 1] = max(pages, 0)
+        features[2] = examined if 'Scan' in node_type else rows
+        features[3] = examined if node_type in INDEX_NODES else 0
+        comparisons = max(examined if 'Scan' in node_type else input_rows, 1) * operators
+        if node_type in ('Sort', 'Incremental Sort'):
+            comparisons += 2 * input_rows * math.log2(max(input_rows, 2))
+        elif node_type in ('Aggregate', 'Hash', 'Hash Join', 'Memoize'):
+            comparisons += input_rows
+        features[4] = comparisons
+        observations.append((features, max(node_time, 0)))
+        return observations
+
+
+    # Rough number of operators evaluated per row by a condition, one per comparison
+    def count_operators(self, condition):
+        if not condition:
+            return 0
+        return max(len([token for token in condition.replace('(', ' ').replace(')', ' ').split() if token in ('=', '<>', '<', '>', '<=', '>=', '~~', '!~~', '%')]), 1)
+    #================================================================================================================#
+
+    #==========================================Logic to fit cost parameters==========================================#
+    # Fits ms per unit of work for each cost parameter with non-negative least squares.
+    # Parameters the samples cannot determine keep their current value scaled like the fitted ones.
+    def fit_cost_parameters(self, observations, current):
+        if not observations:
+            raise ValueError("No executions were sampled.")
+        features = np.array([features for features, _ in observations], dtype=float)
+        timings = np.array([timing for _, timing in observations], dtype=float)
+
+        # Columns are scaled to unit norm so that page counts do not drown out operator counts
+        norms = np.linalg.norm(features, axis=0)
+        active = [column for column in range(len(COST_PARAMETERS)) if norms[column] > 0]
+        solution = {}
+        while active:
+            scaled = features[:, active] / norms[active]
+            fitted = np.linalg.lstsq(scaled, timings, rcond=None)[0] / norms[active]
+            if (fitted > 0).all():
+                solution = {COST_PARAMETERS[column]: float(value) for column, value in zip(active, fitted)}
+                break
+            # Drop the most negative parameter and fit the rest again
+            del active[int(np.argmin(fitted))]
+
+        ratios = [value / current[name] for name, value in solution.items() if current.get(name)]
+        scale = float(np.median(ratios)) if ratios else 1.0
+        parameters = {name: solution.get(name, current.get(name, 0) * scale) for name in COST_PARAMETERS}
+
+        predicted = features @ np.array([parameters[name] for name in COST_PARAMETERS])
+        residual = float(np.sum((timings - predicted) ** 2))
+        total = float(np.sum((timings - timings.mean()) ** 2))
+        return {
+            'parameters': parameters,
+            'current': current,
+            'fitted': sorted(solution),
+            'nodes': len(observations),
+            'r_squared': 1 - residual / total if total else None,
+        }
+
+
+    # Formats a calibration for display
+    def parse_calibration(self, calibration):
+        output_text = f"Fitted to {calibration['nodes']} plan nodes"
+        if calibration['r_squared'] is not None:
+            output_text += f" (R squared {calibration['r_squared']:.3f})"
+        output_text += ". Costs are now in estimated milliseconds.\n\n"
+        for name, value in calibration['parameters'].items():
+            source = "fitted" if name in calibration['fitted'] else "scaled"
+            output_text += f"{name}: {calibration['current'].get(name)} -> {value:.6g} ({source})\n"
+        return output_text
+    #================================================================================================================#
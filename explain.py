@@ -0,0 +1,307 @@
+import math
+import re
+
+
+# Checks if a query has $1 style parameter placeholders outside of string literals
+def has_placeholders(query):
+    return get_placeholder_count(query) > 0
+
+
+# Highest $n placeholder number in a query outside of string literals, 0 if it has none
+def get_placeholder_count(query):
+    return max((int(number) for number in re.findall(r"\$(\d+)", re.sub(r"'(?:[^']|'')*'", "''", query))), default=0)
+
+
+# An option of EXPLAIN, with the server versions it can be used on
+class ExplainOption:
+    def __init__(self, name, min_version=0, analyze_optional_from=0, conflicts=()):
+        self.name = name  # Option as written in EXPLAIN, e.g. BUFFERS
+        self.min_version = min_version  # First server_version_num the option exists in
+        self.analyze_optional_from = analyze_optional_from  # First server_version_num the option works without ANALYZE. None means never.
+        self.conflicts = conflicts  # Options it cannot be combined with
+
+
+    # Checks if the option needs ANALYZE on a server. An unknown version is assumed to be recent.
+    def needs_analyze(self, server_version):
+        if self.analyze_optional_from is None:
+            return True
+        return server_version is not None and server_version < self.analyze_optional_from
+
+
+    def __repr__(self):
+        return f"ExplainOption({self.name})"
+
+
+# Known EXPLAIN options, in the order they are written. FORMAT JSON is always added last.
+EXPLAIN_OPTIONS = [
+    ExplainOption('ANALYZE'),
+    ExplainOption('VERBOSE'),
+    ExplainOption('GENERIC_PLAN', min_version=160000, conflicts=('ANALYZE',)),
+    ExplainOption('COSTS', min_version=90000),
+    ExplainOption('SETTINGS', min_version=120000),
+    ExplainOption('BUFFERS', min_version=90000, analyze_optional_from=130000),
+    ExplainOption('WAL', min_version=130000, analyze_optional_from=None),
+    ExplainOption('TIMING', min_version=90200, analyze_optional_from=None),
+    ExplainOption('SUMMARY', min_version=100000),
+    ExplainOption('MEMORY', min_version=170000),
+    ExplainOption('SERIALIZE', min_version=170000, analyze_optional_from=None),
+]
+
+# Options that add I/O and settings detail to a plan, used where plans are shown rather than enumerated
+DETAIL_OPTIONS = ('SETTINGS', 'BUFFERS', 'WAL', 'SUMMARY', 'MEMORY', 'SERIALIZE')
+
+# Prepared statement parameterized queries are planned through on servers without GENERIC_PLAN
+GENERIC_STATEMENT = "whatif_generic"
+
+# First server_version_num with plan_cache_mode, which the prepared statement fallback needs
+PLAN_CACHE_MODE_VERSION = 120000
+
+
+# Looks up a known EXPLAIN option by name
+def get_explain_option(name):
+    return next(option for option in EXPLAIN_OPTIONS if option.name == name)
+
+
+# A single EXPLAIN (FORMAT JSON) statement whose options are checked against the server version before it is run.
+# Parameterized queries are planned generically unless they are analysed: with GENERIC_PLAN from PostgreSQL 16, and as a
+# prepared statement forced to a generic plan on PostgreSQL 12 to 15.
+class ExplainRequest:
+    def __init__(self, query, options=(), server_version=None):
+        self.query = query
+        self.server_version = server_version
+        self.parameters = get_placeholder_count(query)  # Number of $n placeholders
+        self.prepared = False  # Whether the query is planned through a prepared statement
+        options = [option.upper() for option in options]
+        if self.parameters and 'ANALYZE' not in options and server_version is not None:
+            if server_version >= get_explain_option('GENERIC_PLAN').min_version:
+                options.append('GENERIC_PLAN')
+            elif server_version >= PLAN_CACHE_MODE_VERSION:
+                self.prepared = True
+            else:
+                raise ValueError(f"Parameterized queries can only be planned on PostgreSQL 12 or later, the server is {server_version}. Replace the $n placeholders with values.")
+        self.options = sorted(set(options), key=self.get_position)
+        self.validate()
+
+
+    # Request with every detail option the server supports in addition to the given options, e.g. to show a plan with its buffers
+    @classmethod
+    def with_details(cls, query, options=(), server_version=None):
+        options = [option.upper() for option in options]
+        for name in DETAIL_OPTIONS:
+            option = get_explain_option(name)
+            if (server_version or 0) >= option.min_version and ('ANALYZE' in options or not option.needs_analyze(server_version)):
+                options.append(name)
+        return cls(query, options, server_version)
+
+
+    def get_position(self, name):
+        try:
+            return EXPLAIN_OPTIONS.index(get_explain_option(name))
+        except StopIteration:
+            raise ValueError(f"Unknown EXPLAIN option {name}")
+
+
+    # Raises ValueError for options the server does not have or that cannot be combined
+    def validate(self):
+        for name in self.options:
+            option = get_explain_option(name)
+            if self.server_version is not None and self.server_version < option.min_version:
+                raise ValueError(f"EXPLAIN option {name} needs server version {option.min_version} or later, the server is {self.server_version}")
+            if 'ANALYZE' not in self.options and option.needs_analyze(self.server_version):
+                raise ValueError(f"EXPLAIN option {name} requires ANALYZE")
+            conflicts = [conflict for conflict in option.conflicts if conflict in self.options]
+            if conflicts:
+                raise ValueError(f"EXPLAIN option {name} cannot be combined with {', '.join(conflicts)}")
+
+
+    # Statements to run, the last of which returns the plan. A prepared statement left by an earlier probe is deallocated first,
+    # as prepared statements outlive the rollback of the probe.
+    def statement(self):
+        explain = f"EXPLAIN ({', '.join(self.options + ['FORMAT JSON'])})"
+        if not self.prepared:
+            return f"{explain} {self.query};"
+        arguments = ", ".join(["NULL"] * self.parameters)
+        return (
+            f"DEALLOCATE ALL;SET LOCAL plan_cache_mode TO force_generic_plan;"
+            f"PREPARE {GENERIC_STATEMENT} AS {self.query.strip().rstrip(';')};"
+            f"{explain} EXECUTE {GENERIC_STATEMENT} ({arguments});"
+        )
+
+
+    def __repr__(self):
+        return f"ExplainRequest({', '.join(self.options)})"
+
+
+#=======================================Logic to render a JSON plan as text======================================#
+# Node attributes shown in the first line of a node, or that only describe the plan tree. Every other attribute is printed under the node.
+STRUCTURAL_KEYS = {
+    'Node Type', 'Strategy', 'Partial Mode', 'Join Type', 'Command', 'Operation', 'Custom Plan Provider', 'Parallel Aware', 'Async Capable',
+    'Scan Direction', 'Index Name', 'Relation Name', 'Schema', 'Alias', 'CTE Name', 'Function Name', 'Table Function Name', 'Tuplestore Name',
+    'Startup Cost', 'Total Cost', 'Plan Rows', 'Plan Width', 'Actual Startup Time', 'Actual Total Time', 'Actual Rows', 'Actual Loops',
+    'Parent Relationship', 'Subplan Name', 'Plans',
+}
+
+# Attributes printed on the Buffers and WAL lines
+BUFFER_KEYS = {f"{scope} {kind} Blocks" for scope in ('Shared', 'Local', 'Temp') for kind in ('Hit', 'Read', 'Dirtied', 'Written')}
+WAL_KEYS = {'WAL Records', 'WAL FPI', 'WAL Bytes'}
+
+# Summary attributes of a plan printed on lines of their own
+SUMMARY_KEYS = {'Plan', 'Settings', 'Planning', 'Planning Time', 'Serialization', 'Execution Time'}
+
+# Names of the relations a scan reads, in the order they are looked for. Subquery and values scans only have an alias.
+SCAN_TARGET_KEYS = ('Relation Name', 'CTE Name', 'Function Name', 'Table Function Name', 'Tuplestore Name')
+
+# Names EXPLAIN gives aggregates and set operations in text, by strategy
+AGGREGATE_NAMES = {'Hashed': "HashAggregate", 'Sorted': "GroupAggregate", 'Mixed': "MixedAggregate"}
+SETOP_NAMES = {'Hashed': "HashSetOp", 'Sorted': "SetOp"}
+
+
+# Renders a plan from EXPLAIN (FORMAT JSON) in the layout of the text format, so both are served by one JSON call
+def format_plan_text(qep):
+    lines = []
+    format_node(qep['Plan'], 0, lines)
+    if qep.get('Settings'):
+        lines.append("Settings: " + ", ".join(f"{name} = '{value}'" for name, value in qep['Settings'].items()))
+    planning = qep.get('Planning') or {}
+    planning_lines = [line for line in (format_buffers(planning), format_memory(planning)) if line]
+    if planning_lines:
+        lines.append("Planning:")
+        lines.extend("  " + line for line in planning_lines)
+    if 'Planning Time' in qep:
+        lines.append(f"Planning Time: {qep['Planning Time']:.3f} ms")
+    if 'Serialization' in qep:
+        serialization = qep['Serialization']
+        lines.append(f"Serialization: time={serialization.get('Time', 0):.3f} ms  output={serialization.get('Output Volume', 0)}kB  format={serialization.get('Format')}")
+        buffers = format_buffers(serialization)
+        if buffers:
+            lines.append("  " + buffers)
+    # Other summaries, e.g. Triggers and JIT
+    format_details(qep, SUMMARY_KEYS, "", lines)
+    if 'Execution Time' in qep:
+        lines.append(f"Execution Time: {qep['Execution Time']:.3f} ms")
+    return "\n".join(lines)
+
+
+# Adds the lines of a node and its children, indented like EXPLAIN does at the given depth
+def format_node(node, depth, lines):
+    indent = " " * (6 * depth + 2)
+    if 'Subplan Name' in node:
+        lines.append(" " * max(0, 6 * depth - 4) + node['Subplan Name'])
+    prefix = " " * (6 * depth - 4) + "->  " if depth else ""
+    line = prefix + get_node_name(node)
+    line += f"  (cost={node.get('Startup Cost', 0):.2f}..{node.get('Total Cost', 0):.2f} rows={node.get('Plan Rows', 0):.0f} width={node.get('Plan Width', 0)})"
+    if 'Actual Rows' in node:
+        timing = f"time={node['Actual Startup Time']:.3f}..{node['Actual Total Time']:.3f} " if 'Actual Startup Time' in node else ""
+        line += f" (actual {timing}rows={node['Actual Rows']:.0f} loops={node.get('Actual Loops', 1)})"
+    lines.append(line)
+
+    format_details(node, STRUCTURAL_KEYS | BUFFER_KEYS | WAL_KEYS, indent, lines)
+    for line in (format_buffers(node), format_wal(node)):
+        if line:
+            lines.append(indent + line)
+    for child in node.get('Plans', []):
+        format_node(child, depth + 1, lines)
+
+
+# Adds a Key: value line for every attribute of a node or plan that is not in the excluded keys, in the order EXPLAIN reported them
+def format_details(node, excluded, indent, lines):
+    for key, value in node.items():
+        if key in excluded:
+            continue
+        text = format_value(key, value)
+        if text is not None:
+            lines.append(f"{indent}{key}: {text}")
+
+
+# Value of an attribute as text, or None for values the text format leaves out: false flags and zero row or I/O counts
+def format_value(key, value):
+    if value is None or value is False:
+        return None
+    if value is True:
+        return "true"
+    if isinstance(value, (int, float)) and not value and (key.startswith('Rows Removed') or 'I/O' in key):
+        return None
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    if isinstance(value, dict):
+        # Inside an object, e.g. the JIT options, false flags are shown as they say what was not done. Nested objects are parenthesized.
+        items = ((name, "false" if item is False else format_value(name, item)) for name, item in value.items())
+        items = ((name, f"({text})" if isinstance(value[name], dict) else text) for name, text in items)
+        return "  ".join(f"{name}={text}" for name, text in items if text)
+    if isinstance(value, list):
+        # Lists of objects, e.g. the Workers of a parallel node, are shown one object after the other
+        separator = "; " if any(isinstance(item, dict) for item in value) else ", "
+        return separator.join(format_value(key, item) or "" for item in value)
+    return str(value)
+
+
+# Name of a node as the text format shows it, e.g. Parallel Seq Scan on orders o, CTE Scan on c or Hash Left Join
+def get_node_name(node):
+    node_type = node.get('Node Type', "Unknown")
+    if node_type == 'Aggregate':
+        name = AGGREGATE_NAMES.get(node.get('Strategy'), node_type)
+        if node.get('Partial Mode') in ('Partial', 'Finalize'):
+            name = f"{node['Partial Mode']} {name}"
+    elif node_type == 'SetOp':
+        name = SETOP_NAMES.get(node.get('Strategy'), node_type)
+        if 'Command' in node:
+            name += f" {node['Command']}"
+    elif node_type == 'ModifyTable' and 'Operation' in node:
+        name = node['Operation']
+    elif node_type == 'Custom Scan' and 'Custom Plan Provider' in node:
+        name = f"{node_type} ({node['Custom Plan Provider']})"
+    elif node.get('Join Type') not in (None, 'Inner') and node_type in ('Hash Join', 'Merge Join', 'Nested Loop'):
+        name = f"{node_type.replace(' Join', '')} {node['Join Type']} Join"
+    else:
+        name = node_type
+    if node.get('Parallel Aware'):
+        name = "Parallel " + name
+    if node.get('Async Capable'):
+        name = "Async " + name
+    if node.get('Scan Direction') == 'Backward':
+        name += " Backward"
+    if 'Index Name' in node:
+        name += f" using {quote_name(node['Index Name'])}"
+
+    target_key = next((key for key in SCAN_TARGET_KEYS if key in node), None)
+    if target_key is not None:
+        target = quote_name(node[target_key])
+        if 'Schema' in node:
+            target = f"{quote_name(node['Schema'])}.{target}"
+        name += f" on {target}"
+        if node.get('Alias') and node['Alias'] != node[target_key]:
+            name += f" {quote_name(node['Alias'])}"
+    elif node.get('Alias'):
+        name += f" on {quote_name(node['Alias'])}"
+    return name
+
+
+# Quotes a name the way the text format does when it is not a plain lower case identifier, e.g. "*VALUES*"
+def quote_name(name):
+    if re.fullmatch(r"[a-z_][a-z0-9_$]*", name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Buffers line of a node or summary, e.g. Buffers: shared hit=12 read=3, or None if it used no buffers
+def format_buffers(node):
+    parts = []
+    for scope in ('Shared', 'Local', 'Temp'):
+        counts = [f"{kind.lower()}={node[f'{scope} {kind} Blocks']}" for kind in ('Hit', 'Read', 'Dirtied', 'Written') if node.get(f'{scope} {kind} Blocks')]
+        if counts:
+            parts.append(f"{scope.lower()} {' '.join(counts)}")
+    return "Buffers: " + ", ".join(parts) if parts else None
+
+
+def format_wal(node):
+    if not any(node.get(key) for key in ('WAL Records', 'WAL FPI', 'WAL Bytes')):
+        return None
+    return f"WAL: records={node.get('WAL Records', 0)} fpi={node.get('WAL FPI', 0)} bytes={node.get('WAL Bytes', 0)}"
+
+
+# Memory line of the planning summary. EXPLAIN (FORMAT JSON) reports bytes, the text format kB.
+def format_memory(planning):
+    if 'Memory Used' not in planning:
+        return None
+    return f"Memory: used={math.ceil(planning['Memory Used'] / 1024)}kB  allocated={math.ceil(planning.get('Memory Allocated', 0) / 1024)}kB"
+#================================================================================================================#
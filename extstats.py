@@ -0,0 +1,139 @@
+import itertools
+import psycopg2
+from whatif import QueryModifier
+from indexadvisor import IndexAdvisor, quote_identifier
+from plantree import PlanTree
+
+# Kinds of extended statistics with the first server_version_num that supports them
+STATISTICS_KINDS = {
+    'dependencies': 100000,
+    'ndistinct': 100000,
+    'mcv': 120000,
+}
+
+
+# Tests whether extended statistics on correlated columns would fix row misestimates in the plan of a query
+class StatisticsAdvisor(QueryModifier):
+    def __init__(self, connection, knobs=None, columns=None):
+        super().__init__(connection, knobs)
+        self.columns = columns or {}  # Table name -> column names, e.g. from DbConnect.retrieve_schema
+
+
+    #=====================================Logic to generate statistics candidates=====================================#
+    # Generates (table, columns, kind) candidates for groups of columns a table uses together in predicates
+    def generate_candidates(self, inputQuery, max_columns=8):
+        advisor = IndexAdvisor(self.connection, self.knobs, self.columns)
+        server_version = getattr(self.knobs, 'server_version', None) or 0
+        kinds = [kind for kind, min_version in STATISTICS_KINDS.items() if not server_version or server_version >= min_version]
+
+        candidates = []
+        for table, (equality_columns, other_columns) in advisor.get_predicate_columns(inputQuery).items():
+            used_columns = equality_columns + [column for column in other_columns if column not in equality_columns]
+            if len(used_columns) < 2:
+                continue
+            # All columns used together, then every pair if there are more than two
+            groups = [tuple(used_columns[:max_columns])]
+            if len(used_columns) > 2:
+                groups += list(itertools.combinations(used_columns, 2))
+            for columns in groups:
+                for kind in kinds:
+                    candidates.append((table, columns, kind))
+        return candidates
+    #================================================================================================================#
+
+    #=====================================Logic to evaluate statistics candidates=====================================#
+    # Plans the query with each candidate statistics object in place and compares estimates with a baseline planned on the same sample
+    def evaluate_statistics(self, inputQuery, candidates=None, measure=False):
+        if candidates is None:
+            candidates = self.generate_candidates(inputQuery)
+
+        baseline = self.explain_json(inputQuery, [])
+        actual_rows = None
+        if measure:
+            analysed = self.explain_json(inputQuery, [], ['ANALYZE'])
+            actual_rows = analysed['Plan'].get('Actual Rows')
+
+        results = []
+        for idx, (table, columns, kind) in enumerate(candidates):
+            try:
+                candidate_baseline, plan = self.plan_with_statistics(inputQuery, table, columns, kind, idx)
+            except psycopg2.Error as e:
+                results.append({'table': table, 'columns': columns, 'kind': kind, 'error': str(e).strip()})
+                continue
+            results.append({
+                'table': table,
+                'columns': columns,
+                'kind': kind,
+                'cost': plan['Plan'].get('Total Cost'),
+                'rows': plan['Plan'].get('Plan Rows'),
+                'plan_changed': self.fingerprint_plan(plan) != self.fingerprint_plan(candidate_baseline),
+                'row_changes': self.compare_row_estimates(candidate_baseline['Plan'], plan['Plan']),
+                'aqp': self.parse_plan(plan),
+            })
+
+        return {
+            'baseline_cost': baseline['Plan'].get('Total Cost'),
+            'baseline_rows': baseline['Plan'].get('Plan Rows'),
+            'actual_rows': actual_rows,
+            'results': results,
+        }
+
+
+    # Creates the statistics object, analyses the table and plans the query, then drops the object and plans it again, all in a
+    # transaction that is rolled back. Both plans use the same ANALYZE sample, so they only differ by the statistics object.
+    # Returns (baseline, plan). ANALYZE also updates row counts in pg_class in place, which the rollback keeps, so this is meant for a local server.
+    def plan_with_statistics(self, inputQuery, table, columns, kind, idx):
+        column_list = ", ".join(quote_identifier(column) for column in columns)
+
+        def evaluate(cursor):
+            for session_query in self.knobs.session_queries():
+                cursor.execute(session_query)
+            cursor.execute(f"CREATE STATISTICS whatif_statistics_{idx} ({kind}) ON {column_list} FROM {quote_identifier(table)}")
+            cursor.execute(f"ANALYZE {quote_identifier(table)}")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {inputQuery}")
+            plan = cursor.fetchall()[0][0][0]
+            cursor.execute(f"DROP STATISTICS whatif_statistics_{idx}")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {inputQuery}")
+            return cursor.fetchall()[0][0][0], plan
+
+        # ANALYZE reads the table, so only waiting for locks is limited
+        return self.probe_runner.run_transaction(self.connection, evaluate, analyze=True)
+
+
+    # Lists the nodes whose estimated rows differ between two plans, where both plans still use the same operators
+    def compare_row_estimates(self, baseline, plan):
+        baseline_tree = PlanTree.from_plan(baseline)
+        return [
+            (baseline_tree.describe(difference['index']), *(int(rows) for rows in difference['rows']))
+            for difference in baseline_tree.diff(PlanTree.from_plan(plan)) if 'rows' in difference
+        ]
+
+
+    # Formats the evaluated statistics for display
+    def parse_statistics(self, evaluation):
+        output_text = f"QEP: Total Cost {evaluation['baseline_cost']}, Estimated Rows {evaluation['baseline_rows']}"
+        if evaluation['actual_rows'] is not None:
+            output_text += f", Actual Rows {evaluation['actual_rows']}"
+        output_text += "\n\n"
+        for idx, result in enumerate(evaluation['results']):
+            output_text += f"Candidate {idx + 1}: CREATE STATISTICS ({result['kind']}) ON {', '.join(result['columns'])} FROM {result['table']};\n"
+            if 'error' in result:
+                output_text += f"Failed to evaluate: {result['error']}\n\n"
+                continue
+            output_text += f"Total Cost: {result['cost']}, Estimated Rows: {result['rows']}"
+            if evaluation['actual_rows']:
+                output_text += f" (misestimate {self.estimate_error(result['rows'], evaluation['actual_rows']):.2f}x"
+                output_text += f" vs. {self.estimate_error(evaluation['baseline_rows'], evaluation['actual_rows']):.2f}x for QEP)"
+            output_text += "\n"
+            output_text += f"Plan Changed: {'Yes' if result['plan_changed'] else 'No'}\n"
+            for node, before, after in result['row_changes']:
+                output_text += f"    {node}: {before} -> {after} rows\n"
+            output_text += "\n"
+        return output_text
+
+
+    # Factor by which an estimate is off from the actual value, 1 meaning exact
+    def estimate_error(self, estimated, actual):
+        estimated, actual = max(estimated or 0, 1), max(actual or 0, 1)
+        return max(estimated / actual, actual / estimated)
+    #================================================================================================================#
@@ -0,0 +1,162 @@
+import re
+import psycopg2
+from whatif import QueryModifier
+from joinorder import JoinOrderExplorer
+
+
+# Quotes an identifier such as a table or column name for use in SQL
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Suggests indexes for a query by planning it with candidate indexes that are hypothetical or rolled back
+class IndexAdvisor(QueryModifier):
+    def __init__(self, connection, knobs=None, columns=None):
+        super().__init__(connection, knobs)
+        self.columns = columns or {}  # Table name -> column names, e.g. from DbConnect.retrieve_schema
+
+
+    #===========================================Logic to generate candidates===========================================#
+    # Generates candidate indexes on the columns used in predicates and joins, as (table, columns) pairs
+    def generate_candidates(self, inputQuery, max_candidates=20):
+        predicates = self.get_predicate_columns(inputQuery)
+        candidates = []
+        for table, (equality_columns, other_columns) in predicates.items():
+            used_columns = equality_columns + [column for column in other_columns if column not in equality_columns]
+            for column in used_columns:
+                candidates.append((table, (column,)))
+            # Equality columns lead composite indexes so the second column can still narrow the scan
+            for first in equality_columns:
+                for second in used_columns:
+                    if second != first:
+                        candidates.append((table, (first, second)))
+        return candidates[:max_candidates]
+
+
+    # Finds the columns of each table used in predicates, split into columns compared for equality and all others
+    def get_predicate_columns(self, inputQuery):
+        parser = JoinOrderExplorer(self.connection, self.knobs, self.columns)
+        try:
+            parsed = parser.parse_join_query(inputQuery)
+            relations = {relation['alias']: relation['table'] for relation in parsed['relations']}
+            conjuncts = [conjunct['text'] for conjunct in parsed['conjuncts']]
+        except ValueError:
+            # Queries that cannot be rewritten are still searched for columns of the tables they name
+            relations = {table: table for table in self.columns if re.search(rf"\b{re.escape(table)}\b", inputQuery)}
+            where = re.split(r"\bWHERE\b", inputQuery, maxsplit=1, flags=re.IGNORECASE)
+            conjuncts = re.split(r"\bAND\b|\bON\b", where[-1], flags=re.IGNORECASE)
+
+        predicates = {}
+        for conjunct in conjuncts:
+            is_equality = re.search(r"(?<![<>!])=", conjunct) is not None
+            for table, column in self.get_conjunct_columns(conjunct, relations):
+                equality_columns, other_columns = predicates.setdefault(table, ([], []))
+                target = equality_columns if is_equality else other_columns
+                if column not in target:
+                    target.append(column)
+        return predicates
+
+
+    # Returns the (table, column) pairs a predicate refers to
+    def get_conjunct_columns(self, conjunct, relations):
+        conjunct = re.sub(r"'[^']*'", "''", conjunct)
+        found = []
+        for alias, column in re.findall(r"\b(\w+)\s*\.\s*(\w+)", conjunct):
+            table = relations.get(alias)
+            if table and column in self.columns.get(table, []):
+                found.append((table, column))
+        unqualified = re.sub(r"\b\w+\s*\.\s*\w+", " ", conjunct)
+        for name in re.findall(r"\b([A-Za-z_]\w*)\b(?!\s*\()", unqualified):
+            owners = [table for table in set(relations.values()) if name in self.columns.get(table, [])]
+            if len(owners) == 1:
+                found.append((owners[0], name))
+        return found
+    #================================================================================================================#
+
+    #===========================================Logic to evaluate candidates==========================================#
+    # Checks if the HypoPG extension is installed in the connected database
+    def has_hypopg(self):
+        return bool(self.probe_runner.run(self.connection, "BEGIN;SELECT 1 FROM pg_extension WHERE extname = 'hypopg';"))
+
+
+    # Plans the query with each candidate index and ranks candidates by cost reduction per megabyte of index
+    def recommend_indexes(self, inputQuery, candidates=None, use_hypopg=None):
+        if candidates is None:
+            candidates = self.generate_candidates(inputQuery)
+        if use_hypopg is None:
+            use_hypopg = self.has_hypopg()
+
+        baseline = self.explain_json(inputQuery, [])
+        baseline_cost = baseline['Plan'].get('Total Cost', 0)
+
+        recommendations = []
+        for idx, (table, columns) in enumerate(candidates):
+            try:
+                plan, size, index_name = self.evaluate_candidate(inputQuery, table, columns, idx, use_hypopg)
+            except psycopg2.Error as e:
+                recommendations.append({'table': table, 'columns': columns, 'error': str(e).strip()})
+                continue
+            cost = plan['Plan'].get('Total Cost', 0)
+            reduction = baseline_cost - cost
+            recommendations.append({
+                'table': table,
+                'columns': columns,
+                'cost': cost,
+                'reduction': reduction,
+                'size': size,
+                'used': index_name in str(plan),
+                'score': reduction / max(size / (1024 * 1024), 0.01),
+                'aqp': self.parse_plan(plan),
+            })
+
+        recommendations.sort(key=lambda recommendation: recommendation.get('score', float('-inf')), reverse=True)
+        return {'baseline_cost': baseline_cost, 'method': 'HypoPG' if use_hypopg else 'CREATE INDEX', 'recommendations': recommendations}
+
+
+    # Plans the query with one candidate index in place and returns the plan, the index size in bytes and the index name
+    def evaluate_candidate(self, inputQuery, table, columns, idx, use_hypopg):
+        column_list = ", ".join(quote_identifier(column) for column in columns)
+
+        def evaluate(cursor):
+            for session_query in self.knobs.session_queries():
+                cursor.execute(session_query)
+            if use_hypopg:
+                # Hypothetical indexes only exist for the planner in this session and cost nothing to build.
+                # Those left by a failed attempt are removed first, so a retry plans with this candidate only.
+                cursor.execute("SELECT hypopg_reset();")
+                statement = f"CREATE INDEX ON {quote_identifier(table)} ({column_list})"
+                cursor.execute("SELECT indexrelid, indexname FROM hypopg_create_index(%s)", (statement,))
+                index_oid, index_name = cursor.fetchone()
+                cursor.execute("SELECT hypopg_relation_size(%s)", (index_oid,))
+            else:
+                # The index is really built and then dropped by the rollback, so this is meant for a local copy
+                index_name = f"whatif_candidate_{idx}"
+                cursor.execute(f"CREATE INDEX {index_name} ON {quote_identifier(table)} ({column_list})")
+                cursor.execute("SELECT pg_relation_size(%s::regclass)", (index_name,))
+            size = cursor.fetchone()[0]
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {inputQuery}")
+            return cursor.fetchall()[0][0][0], size, index_name
+
+        # Building a real index reads the table, so only waiting for locks is limited then
+        try:
+            return self.probe_runner.run_transaction(self.connection, evaluate, analyze=not use_hypopg)
+        finally:
+            # Hypothetical indexes outlive the rollback, so they are removed separately
+            if use_hypopg:
+                self.probe_runner.run(self.connection, "BEGIN;SELECT hypopg_reset();")
+
+
+    # Formats the recommended indexes for display
+    def parse_recommendations(self, advice):
+        output_text = f"Candidates evaluated with {advice['method']}. The total cost of QEP is {advice['baseline_cost']}.\n\n"
+        for idx, recommendation in enumerate(advice['recommendations']):
+            definition = f"CREATE INDEX ON {recommendation['table']} ({', '.join(recommendation['columns'])});"
+            output_text += f"Candidate {idx + 1}: {definition}\n"
+            if 'error' in recommendation:
+                output_text += f"Failed to evaluate: {recommendation['error']}\n\n"
+                continue
+            output_text += f"Total Cost: {recommendation['cost']} (reduction of {recommendation['reduction']:.2f})\n"
+            output_text += f"Estimated Size: {recommendation['size'] / 1024:.0f} kB\n"
+            output_text += f"Used by Planner: {'Yes' if recommendation['used'] else 'No'}\n\n"
+        return output_text
+    #================================================================================================================#
@@ -1,24 +1,45 @@
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 import psycopg2
-import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.patches import FancyArrowPatch
 from preprocessing import LoginDetails, DbConnect
 from whatif import QueryModifier
+from joinorder import JoinOrderExplorer
+from parallel import ParallelAnalyzer
+from indexadvisor import IndexAdvisor
+from extstats import StatisticsAdvisor
+from paramquery import ParameterizedQueryAnalyzer
+from workload import WorkloadImporter
+from planstore import PlanStore
+from session import save_session, SessionReader, load_plan_body
+from plantree import PlanTree, compress_plan
+from knobs import PARAMETERS
+from textview import VirtualTextView
+from service import ServiceClient
+from probes import FatalProbeError
 import ast
+import itertools
 
 ctk.set_appearance_mode("dark")  
 ctk.set_default_color_theme("blue")  
 
+# matplotlib takes seconds to import, so it is only loaded when the first graph is drawn
+plt = FigureCanvasTkAgg = FancyArrowPatch = None
+
+
+def load_plotting():
+    global plt, FigureCanvasTkAgg, FancyArrowPatch
+    if plt is None:
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.patches import FancyArrowPatch
+
 
 class LoginWindow:
     def __init__(self, root):
         self.root = root
         self.root.title("PostgreSQL Connection")
-        self.root.geometry("500x400")
+        self.root.geometry("500x520")
         self.root.resizable(False, False)
 
         # Handle window close event to exit the mainloop
@@ -67,9 +88,21 @@ class LoginWindow:
         self.port_input.insert(0, "5432")
         self.port_input.grid(row=7, column=1, padx=(10, 50), pady=5, sticky="W")
 
+        ctk.CTkLabel(self.login_frame, text="Replicas:").grid(row=8, column=0, padx=(50, 10), pady=5, sticky="E")
+        self.replicas_input = ctk.CTkEntry(self.login_frame, placeholder_text="host:port, ... (Optional)")
+        self.replicas_input.grid(row=8, column=1, padx=(10, 50), pady=5, sticky="W")
+
+        ctk.CTkLabel(self.login_frame, text="Service:").grid(row=9, column=0, padx=(50, 10), pady=5, sticky="E")
+        self.service_input = ctk.CTkEntry(self.login_frame, placeholder_text="http://host:8765 (Optional)")
+        self.service_input.grid(row=9, column=1, padx=(10, 50), pady=5, sticky="W")
+
         # Centered Connect button
         connect_button = ctk.CTkButton(self.login_frame, text="Connect", command=self.connect_to_db)
-        connect_button.grid(row=8, column=0, columnspan=2, pady=20, sticky="N")
+        connect_button.grid(row=10, column=0, columnspan=2, pady=(20, 5), sticky="N")
+
+        # Saved sessions are viewed without connecting
+        open_session_button = ctk.CTkButton(self.login_frame, text="Open Saved Session", command=self.on_open_session)
+        open_session_button.grid(row=11, column=0, columnspan=2, pady=(5, 20), sticky="N")
 
 
     def connect_to_db(self):
@@ -87,7 +120,17 @@ class LoginWindow:
             login_details["dbname"] = "postgres"  # Default to 'postgres' database if empty
 
         try:
-            dbconnect = DbConnect(login_details)
+            # Read-only replicas to spread what-if probes over, e.g. "localhost:5433, localhost:5434"
+            replicas = []
+            for endpoint in self.replicas_input.get().split(","):
+                if endpoint.strip():
+                    host, _, port = endpoint.strip().partition(":")
+                    replicas.append({"host": host or login_details["host"], "port": int(port) if port else login_details["port"]})
+
+            dbconnect = DbConnect(login_details, replicas)
+
+            # Shared what-if service that enumerates, plans and sweeps for this window, e.g. "http://localhost:8765"
+            service = ServiceClient(self.service_input.get().strip()) if self.service_input.get().strip() else None
             
             # Check if a database was provided in the input
             if self.db_input.get().strip() != "":
@@ -100,12 +143,29 @@ class LoginWindow:
             return
 
         # Open the main window, passing the connection object
-        self.open_main_window(dbconnect)
+        self.open_main_window(dbconnect, service)
 
 
-    def open_main_window(self, dbconnect):
+    def open_main_window(self, dbconnect, service=None):
         self.root.withdraw()  # Hide the login window
-        MainWindow(self.root, dbconnect)
+        MainWindow(self.root, dbconnect, service)
+
+
+    # Opens a session saved from the main window in a read-only viewer
+    def on_open_session(self):
+        path = filedialog.askopenfilename(title="Select saved session", filetypes=[("QEP sessions", "*.qeps"), ("All files", "*")])
+        if not path:
+            return
+
+        try:
+            with SessionReader(path) as reader:
+                header, entries = reader.header, list(reader)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open session: {e}")
+            return
+
+        self.root.withdraw()  # Hide the login window
+        SessionWindow(self.root, header, entries)
 
 
     def on_close(self):
@@ -113,10 +173,18 @@ class LoginWindow:
 
 
 class MainWindow:
-    def __init__(self, master, dbconnect):
+    def __init__(self, master, dbconnect, service=None):
         self.master = master
         self.dbconnect = dbconnect
+        self.service = service  # ServiceClient that runs enumerations and sweeps, None to run them on this connection
         self.valid_configurations = None
+        self.plans = None
+        self.plans_query = None  # Query the enumerated plans belong to
+        self.workload = None
+        self.pending_trees = {}  # Graph frame -> plan JSON to draw when its tab is first opened
+        self.qep_json = None  # Plans shown in the QEP and AQP frames, redrawn when grouping is switched
+        self.aqp_json = None
+        self.plan_store = PlanStore()  # Bodies of enumerated plans by configuration, loaded when a session is saved
 
         # Create main window
         self.window = ctk.CTkToplevel(master)
@@ -205,21 +273,41 @@ class MainWindow:
         self.query_input_button = ctk.CTkButton(self.query_frame, text="Submit Query", command=self.on_submit_query)
         self.query_input_button.grid(row=2, column=0, padx=10, pady=10)
 
+        # For grouping identical subplans, e.g. the scans of every partition, in the procedural, cost and tree views
+        self.group_subplans_var = ctk.BooleanVar(value=True)
+        self.group_subplans_switch = ctk.CTkSwitch(self.query_frame, text="Group Identical Subplans", variable=self.group_subplans_var, command=self.on_toggle_grouping)
+        self.group_subplans_switch.grid(row=3, column=0, padx=10, pady=(0, 10))
+
         # For viewing of results 
-        self.query_result_tab_view = ctk.CTkTabview(self.query_frame)
-        self.query_result_tab_view.grid(row=3, column=0, padx=10, pady=10) 
+        self.query_result_tab_view = ctk.CTkTabview(self.query_frame, command=lambda: self.on_select_tree_tab(self.query_result_tab_view, "QEP Tree", self.qep_graph_frame))
+        self.query_result_tab_view.grid(row=4, column=0, padx=10, pady=10) 
         self.query_result_tab_view.add("QEP")
         self.query_result_tab_view.add("Procedural QEP")
         self.query_result_tab_view.add("QEP Tree")
         self.query_result_tab_view.add("QEP Cost Calculation")
-        self.qep_display_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("QEP"), width=700, height=150)
+        self.qep_display_box =  VirtualTextView(self.query_result_tab_view.tab("QEP"), width=700, height=150)
         self.qep_display_box.pack(padx=10, pady=10)
-        self.procedural_qep_display_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("Procedural QEP"), width=700, height=150)
+        self.procedural_qep_display_box =  VirtualTextView(self.query_result_tab_view.tab("Procedural QEP"), width=700, height=150)
         self.procedural_qep_display_box.pack(padx=10, pady=10)
         self.qep_graph_frame = ctk.CTkFrame(self.query_result_tab_view.tab("QEP Tree"), width=700, height=400, fg_color="#2b2b2b")
         self.qep_graph_frame.pack(padx=10, pady=10)
-        self.qep_cost_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("QEP Cost Calculation"), width=700, height=150)
+        self.qep_cost_box =  VirtualTextView(self.query_result_tab_view.tab("QEP Cost Calculation"), width=700, height=150)
         self.qep_cost_box.pack(padx=10, pady=10)
+        self.query_result_tab_view.add("Index Advisor")
+        self.index_advisor_button = ctk.CTkButton(self.query_result_tab_view.tab("Index Advisor"), text="Suggest Indexes", command=self.on_suggest_indexes)
+        self.index_advisor_button.pack(padx=10, pady=(10, 0))
+        self.index_advisor_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("Index Advisor"), width=700, height=150)
+        self.index_advisor_box.pack(padx=10, pady=10)
+        self.query_result_tab_view.add("Extended Statistics")
+        self.statistics_button = ctk.CTkButton(self.query_result_tab_view.tab("Extended Statistics"), text="Test Extended Statistics", command=self.on_test_statistics)
+        self.statistics_button.pack(padx=10, pady=(10, 0))
+        self.statistics_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("Extended Statistics"), width=700, height=150)
+        self.statistics_box.pack(padx=10, pady=10)
+        self.query_result_tab_view.add("Generic vs Custom")
+        self.generic_plan_button = ctk.CTkButton(self.query_result_tab_view.tab("Generic vs Custom"), text="Compare Generic and Custom Plans", command=self.on_compare_generic_plan)
+        self.generic_plan_button.pack(padx=10, pady=(10, 0))
+        self.generic_plan_box =  ctk.CTkTextbox(self.query_result_tab_view.tab("Generic vs Custom"), width=700, height=150)
+        self.generic_plan_box.pack(padx=10, pady=10)
         #================================================================================================================#
 
         #====================================================AQP Frame===================================================#
@@ -239,89 +327,191 @@ class MainWindow:
         self.valid_configurations_tab_view = ctk.CTkTabview(self.aqp_frame)
         self.valid_configurations_tab_view.grid(row=1, column=0, columnspan=4, padx=10, pady=10) 
         self.valid_configurations_tab_view.add("Valid Combinations")
-        self.valid_configurations_display_box =  ctk.CTkTextbox(self.valid_configurations_tab_view.tab("Valid Combinations"), width=700, height=150)
+        self.valid_configurations_display_box =  VirtualTextView(self.valid_configurations_tab_view.tab("Valid Combinations"), width=700, height=150)
         self.valid_configurations_display_box.pack(padx=10, pady=10)
-
-        # For selecting scan options
-        scan_options_label = ctk.CTkLabel(self.aqp_frame, text="Select Scan Options", font=("Arial", 14))
-        scan_options_label.grid(row=2, column=0, columnspan=4, padx=10, pady=10)
-        self.bitmapscan_switch_var = ctk.BooleanVar(value=True)
-        self.indexscan_switch_var = ctk.BooleanVar(value=True)
-        self.indexonlyscan_switch_var = ctk.BooleanVar(value=True)
-        self.seqscan_switch = ctk.BooleanVar(value=True)
-        self.bitmapscan_switch = ctk.CTkSwitch(self.aqp_frame, text="Bitmap Scan", variable=self.bitmapscan_switch_var, command=self.update_button)
-        self.bitmapscan_switch.grid(row=3, column=0, padx=10, pady=10)
-        self.indexscan_switch = ctk.CTkSwitch(self.aqp_frame, text="Index Scan", variable=self.indexscan_switch_var, command=self.update_button)
-        self.indexscan_switch.grid(row=3, column=1, padx=10, pady=10)
-        self.indexonlyscan_switch = ctk.CTkSwitch(self.aqp_frame, text="Index Only Scan", variable=self.indexonlyscan_switch_var, command=self.update_button)
-        self.indexonlyscan_switch.grid(row=3, column=2, padx=10, pady=10)
-        self.seqscan_switch = ctk.CTkSwitch(self.aqp_frame, text="Sequential Scan", variable=self.seqscan_switch, command=self.update_button)
-        self.seqscan_switch.grid(row=3, column=3, padx=10, pady=10)
-
-        # For selecting join options
-        join_options_label = ctk.CTkLabel(self.aqp_frame, text="Select Join Options", font=("Arial", 14))
-        join_options_label.grid(row=4, column=0, columnspan=4, padx=10, pady=10)
-        self.hashjoin_switch_var = ctk.BooleanVar(value=True)
-        self.mergejoin_switch_var = ctk.BooleanVar(value=True)
-        self.nestloop_switch_var = ctk.BooleanVar(value=True)
-        self.hashjoin_switch = ctk.CTkSwitch(self.aqp_frame, text="Hash Join", variable=self.hashjoin_switch_var, command=self.update_button)
-        self.hashjoin_switch.grid(row=5, column=0, padx=10, pady=10)
-        self.mergejoin_switch = ctk.CTkSwitch(self.aqp_frame, text="Merge Join", variable=self.mergejoin_switch_var, command=self.update_button)
-        self.mergejoin_switch.grid(row=5, column=1, padx=10, pady=10)
-        self.nestloop_switch = ctk.CTkSwitch(self.aqp_frame, text="Nest Loop", variable=self.nestloop_switch_var, command=self.update_button)
-        self.nestloop_switch.grid(row=5, column=2, padx=10, pady=10)
-
-        # For selecting aggregate options
-        aggregate_options_label = ctk.CTkLabel(self.aqp_frame, text="Select Aggregate Options", font=("Arial", 14))
-        aggregate_options_label.grid(row=6, column=0, columnspan=4, padx=10, pady=10)
-        self.hashagg_switch_var = ctk.BooleanVar(value=True)
-        self.presorted_aggregate_switch_var = ctk.BooleanVar(value=True)
-        self.hashagg_switch = ctk.CTkSwitch(self.aqp_frame, text="Hash Aggregate", variable=self.hashagg_switch_var, command=self.update_button)
-        self.hashagg_switch.grid(row=7, column=0, padx=10, pady=10)
-        self.presorted_aggregate_switch = ctk.CTkSwitch(self.aqp_frame, text="Presorted Aggregate", variable=self.presorted_aggregate_switch_var, command=self.update_button)
-        self.presorted_aggregate_switch.grid(row=7, column=1, padx=10, pady=10)
-
-        # For selecting sort options
-        sort_options_label = ctk.CTkLabel(self.aqp_frame, text="Select Sort Options", font=("Arial", 14))
-        sort_options_label.grid(row=8, column=0, columnspan=4, padx=10, pady=10)
-        self.incremental_sort_switch_var = ctk.BooleanVar(value=True)
-        self.sort_switch_var = ctk.BooleanVar(value=True)
-        self.incremental_sort_switch = ctk.CTkSwitch(self.aqp_frame, text="Incremental Sort", variable=self.incremental_sort_switch_var, command=self.update_button)
-        self.incremental_sort_switch.grid(row=9, column=0,  padx=10, pady=10)
-        self.sort_switch = ctk.CTkSwitch(self.aqp_frame, text="Sort", variable=self.sort_switch_var, command=self.update_button)
-        self.sort_switch.grid(row=9, column=1,  padx=10, pady=10)
+        self.valid_configurations_tab_view.add("Join Orders")
+        self.join_orders_button = ctk.CTkButton(self.valid_configurations_tab_view.tab("Join Orders"), text="Explore Join Orders", command=self.on_explore_join_orders)
+        self.join_orders_button.pack(padx=10, pady=(10, 0))
+        self.join_orders_display_box =  ctk.CTkTextbox(self.valid_configurations_tab_view.tab("Join Orders"), width=700, height=150)
+        self.join_orders_display_box.pack(padx=10, pady=10)
+        self.valid_configurations_tab_view.add("Planning Time")
+        self.planning_time_button = ctk.CTkButton(self.valid_configurations_tab_view.tab("Planning Time"), text="Measure Planning Time", command=self.on_measure_planning_time)
+        self.planning_time_button.pack(padx=10, pady=(10, 0))
+        self.planning_time_display_box =  ctk.CTkTextbox(self.valid_configurations_tab_view.tab("Planning Time"), width=700, height=100)
+        self.planning_time_display_box.pack(padx=10, pady=10)
+        self.planning_time_graph_frame = ctk.CTkFrame(self.valid_configurations_tab_view.tab("Planning Time"), width=700, height=400, fg_color="#2b2b2b")
+        self.planning_time_graph_frame.pack(padx=10, pady=10)
+
+        # For selecting planner knobs, one group of switches per knob group
+        self.knobs = self.dbconnect.retrieve_knobs()
+        self.knob_switch_vars = []
+        self.knob_switches = []
+        row = 2
+        for group, indices in self.knobs.groups().items():
+            options_label = ctk.CTkLabel(self.aqp_frame, text=f"Select {group} Options", font=("Arial", 14))
+            options_label.grid(row=row, column=0, columnspan=4, padx=10, pady=10)
+            row += 1
+            for position, index in enumerate(indices):
+                knob = self.knobs[index]
+                switch_var = ctk.BooleanVar(value=knob.default)
+                switch = ctk.CTkSwitch(self.aqp_frame, text=knob.label, variable=switch_var, command=self.update_button)
+                switch.grid(row=row + position // 4, column=position % 4, padx=10, pady=10)
+                self.knob_switch_vars.append(switch_var)
+                self.knob_switches.append(switch)
+            row += (len(indices) + 3) // 4
 
         # For submitting configurations
         self.modified_query_button = ctk.CTkButton(self.aqp_frame, text="Submit Configurations", command=self.on_submit_configs)
-        self.modified_query_button.grid(row=10, column=0, columnspan=4, padx=10, pady=10) 
+        self.modified_query_button.grid(row=row, column=0, columnspan=2, padx=10, pady=10) 
+        self.cheapest_plan_button = ctk.CTkButton(self.aqp_frame, text="Find Cheapest Plan", command=self.on_find_cheapest_plan)
+        self.cheapest_plan_button.grid(row=row, column=2, columnspan=2, padx=10, pady=10)
+        self.invalid_configuration_row = row + 1
         self.invalid_configuration_label = ctk.CTkLabel(self.aqp_frame, text="Invalid Combination of Configurations", font=("Arial", 14),text_color="red")
-        self.invalid_configuration_label.grid(row=11, column=0, columnspan=4) # Only shown for invalid configurations
+        self.invalid_configuration_label.grid(row=self.invalid_configuration_row, column=0, columnspan=4) # Only shown for invalid configurations
         self.invalid_configuration_label.grid_forget()
 
         # For viewing results
-        self.aqp_result_tab_view = ctk.CTkTabview(self.aqp_frame)
-        self.aqp_result_tab_view.grid(row=12, column=0, columnspan=4, padx=10, pady=10) 
+        self.aqp_result_tab_view = ctk.CTkTabview(self.aqp_frame, command=lambda: self.on_select_tree_tab(self.aqp_result_tab_view, "AQP Tree", self.aqp_graph_frame))
+        self.aqp_result_tab_view.grid(row=self.invalid_configuration_row + 1, column=0, columnspan=4, padx=10, pady=10) 
         self.aqp_result_tab_view.add("AQP")
         self.aqp_result_tab_view.add("Procedural AQP")
         self.aqp_result_tab_view.add("Modified SQL Query")
         self.aqp_result_tab_view.add("AQP Tree")
         self.aqp_result_tab_view.add("AQP Cost Calculation")
         self.aqp_result_tab_view.add("Cost Comparison")
-        self.aqp_display_box =  ctk.CTkTextbox(self.aqp_result_tab_view.tab("AQP"), width=700, height=150)
+        self.aqp_display_box =  VirtualTextView(self.aqp_result_tab_view.tab("AQP"), width=700, height=150)
         self.aqp_display_box.pack(padx=10, pady=10)
-        self.procedural_aqp_display_box =  ctk.CTkTextbox(self.aqp_result_tab_view.tab("Procedural AQP"), width=700, height=150)
+        self.procedural_aqp_display_box =  VirtualTextView(self.aqp_result_tab_view.tab("Procedural AQP"), width=700, height=150)
         self.procedural_aqp_display_box.pack(padx=10, pady=10)
         self.modified_sql_query_display_box =  ctk.CTkTextbox(self.aqp_result_tab_view.tab("Modified SQL Query"), width=700, height=150)
         self.modified_sql_query_display_box.pack(padx=10, pady=10)
         self.aqp_graph_frame = ctk.CTkFrame(self.aqp_result_tab_view.tab("AQP Tree"), width=700, height=400, fg_color="#2b2b2b")
         self.aqp_graph_frame.pack(padx=10, pady=10)
-        self.aqp_cost_box =  ctk.CTkTextbox(self.aqp_result_tab_view.tab("AQP Cost Calculation"), width=700, height=150)
+        self.aqp_cost_box =  VirtualTextView(self.aqp_result_tab_view.tab("AQP Cost Calculation"), width=700, height=150)
         self.aqp_cost_box.pack(padx=10, pady=10)
         self.cost_comparison_box =  ctk.CTkTextbox(self.aqp_result_tab_view.tab("Cost Comparison"), width=700, height=150)
         self.cost_comparison_box.pack(padx=10, pady=10)
         #================================================================================================================#
 
-        # Close button outside of scrollabe frame
+        #===============================================Parameter Sweep Frame============================================#
+        # Outer frame for alignment
+        self.sweep_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.sweep_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # Sweep frame
+        self.sweep_frame = ctk.CTkFrame(self.sweep_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.sweep_frame.pack(expand=True)
+
+        # Frame title
+        sweep_label = ctk.CTkLabel(self.sweep_frame, text="Sweep Numeric Parameters", font=("Arial", 28))
+        sweep_label.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+
+        # For selecting the parameter to sweep, using the configurations selected above
+        self.select_parameter_dropdown = ctk.CTkComboBox(self.sweep_frame, values=[parameter.label for parameter in PARAMETERS])
+        self.select_parameter_dropdown.grid(row=1, column=0, padx=10, pady=10)
+        self.sweep_button = ctk.CTkButton(self.sweep_frame, text="Sweep Parameter", command=self.on_sweep_parameter)
+        self.sweep_button.grid(row=1, column=1, padx=10, pady=10)
+
+        # For viewing results
+        self.sweep_result_tab_view = ctk.CTkTabview(self.sweep_frame)
+        self.sweep_result_tab_view.grid(row=2, column=0, columnspan=2, padx=10, pady=10)
+        self.sweep_result_tab_view.add("Cost Plot")
+        self.sweep_result_tab_view.add("Plan Changes")
+        self.sweep_graph_frame = ctk.CTkFrame(self.sweep_result_tab_view.tab("Cost Plot"), width=700, height=400, fg_color="#2b2b2b")
+        self.sweep_graph_frame.pack(padx=10, pady=10)
+        self.sweep_display_box = ctk.CTkTextbox(self.sweep_result_tab_view.tab("Plan Changes"), width=700, height=150)
+        self.sweep_display_box.pack(padx=10, pady=10)
+        #================================================================================================================#
+
+        #==============================================Parallel Query Frame==============================================#
+        # Outer frame for alignment
+        self.parallel_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.parallel_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # Parallel frame
+        self.parallel_frame = ctk.CTkFrame(self.parallel_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.parallel_frame.pack(expand=True)
+
+        # Frame title
+        parallel_label = ctk.CTkLabel(self.parallel_frame, text="Analyse Parallel Query", font=("Arial", 28))
+        parallel_label.grid(row=0, column=0, columnspan=3, padx=10, pady=10)
+
+        # For selecting how parallel plans are analysed, using the configurations selected above
+        self.encourage_parallel_var = ctk.BooleanVar(value=False)
+        self.encourage_parallel_switch = ctk.CTkSwitch(self.parallel_frame, text="Zero Parallel Costs", variable=self.encourage_parallel_var)
+        self.encourage_parallel_switch.grid(row=1, column=0, padx=10, pady=10)
+        self.measure_parallel_var = ctk.BooleanVar(value=False)
+        self.measure_parallel_switch = ctk.CTkSwitch(self.parallel_frame, text="Measure with EXPLAIN ANALYZE", variable=self.measure_parallel_var)
+        self.measure_parallel_switch.grid(row=1, column=1, padx=10, pady=10)
+        self.parallel_button = ctk.CTkButton(self.parallel_frame, text="Analyse Workers", command=self.on_analyse_parallelism)
+        self.parallel_button.grid(row=1, column=2, padx=10, pady=10)
+
+        # For viewing results
+        self.parallel_display_box = ctk.CTkTextbox(self.parallel_frame, width=700, height=150)
+        self.parallel_display_box.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
+        #================================================================================================================#
+
+        #=================================================Workload Frame=================================================#
+        # Outer frame for alignment
+        self.workload_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.workload_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # Workload frame
+        self.workload_frame = ctk.CTkFrame(self.workload_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.workload_frame.pack(expand=True)
+
+        # Frame title
+        workload_label = ctk.CTkLabel(self.workload_frame, text="Import Workload", font=("Arial", 28))
+        workload_label.grid(row=0, column=0, columnspan=4, padx=10, pady=10)
+
+        # For importing logs or a pg_stat_statements export and choosing how many queries to analyse
+        self.import_workload_button = ctk.CTkButton(self.workload_frame, text="Import File", command=self.on_import_workload)
+        self.import_workload_button.grid(row=1, column=0, padx=10, pady=10)
+        ctk.CTkLabel(self.workload_frame, text="Top Queries:").grid(row=1, column=1, padx=(10, 0), pady=10)
+        self.workload_top_input = ctk.CTkEntry(self.workload_frame, width=60)
+        self.workload_top_input.insert(0, "10")
+        self.workload_top_input.grid(row=1, column=2, padx=(0, 10), pady=10)
+        self.enumerate_workload_button = ctk.CTkButton(self.workload_frame, text="Enumerate Top Queries", command=self.on_enumerate_workload)
+        self.enumerate_workload_button.grid(row=1, column=3, padx=10, pady=10)
+
+        # For loading one of the imported queries into the query frame
+        self.select_workload_query_dropdown = ctk.CTkComboBox(self.workload_frame, values=[])
+        self.select_workload_query_dropdown.grid(row=2, column=0, columnspan=3, padx=10, pady=10, sticky="EW")
+        load_workload_query_button = ctk.CTkButton(self.workload_frame, text="Load Query", command=self.on_load_workload_query)
+        load_workload_query_button.grid(row=2, column=3, padx=10, pady=10)
+
+        # For viewing results
+        self.workload_display_box = ctk.CTkTextbox(self.workload_frame, width=700, height=150)
+        self.workload_display_box.grid(row=3, column=0, columnspan=4, padx=10, pady=10)
+        #================================================================================================================#
+
+        #=============================================Cost Calibration Frame=============================================#
+        # Outer frame for alignment
+        self.calibration_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.calibration_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # Calibration frame
+        self.calibration_frame = ctk.CTkFrame(self.calibration_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.calibration_frame.pack(expand=True)
+
+        # Frame title
+        calibration_label = ctk.CTkLabel(self.calibration_frame, text="Calibrate Cost Model", font=("Arial", 28))
+        calibration_label.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+
+        # For fitting cost parameters to measured timings, so costs of every plan are shown in estimated milliseconds
+        self.calibrate_button = ctk.CTkButton(self.calibration_frame, text="Calibrate Costs", command=self.on_calibrate_costs)
+        self.calibrate_button.grid(row=1, column=0, padx=10, pady=10)
+        self.reset_calibration_button = ctk.CTkButton(self.calibration_frame, text="Use Server Costs", command=self.on_reset_calibration)
+        self.reset_calibration_button.grid(row=1, column=1, padx=10, pady=10)
+
+        # For viewing results
+        self.calibration_display_box = ctk.CTkTextbox(self.calibration_frame, width=700, height=150)
+        self.calibration_display_box.grid(row=2, column=0, columnspan=2, padx=10, pady=10)
+        #================================================================================================================#
+
+        # Save and close buttons outside of scrollabe frame
+        save_session_button = ctk.CTkButton(self.window, text="Save Session", command=self.on_save_session)
+        save_session_button.pack(pady=(10, 0))
         close_button = ctk.CTkButton(self.window, text="Close", command=self.on_close)
         close_button.pack(pady=10)
 
@@ -339,29 +529,30 @@ class MainWindow:
             self.select_table_dropdown.set(new_tables[0])
             self.columns_display_box.delete("1.0", "end")
             self.query_input_box.delete("1.0", "end") 
-            self.qep_display_box.delete("1.0", "end")
-            self.procedural_qep_display_box.delete("1.0", "end")
+            self.qep_display_box.clear()
+            self.procedural_qep_display_box.clear()
             self.destroy_canvas_in_frame(self.qep_graph_frame)
-            self.qep_cost_box.delete("1.0", "end")
-            self.valid_configurations_display_box.delete("1.0", "end")
-            self.bitmapscan_switch.select()
-            self.indexscan_switch.select()
-            self.indexonlyscan_switch.select()
-            self.seqscan_switch.select()
-            self.hashjoin_switch.select()
-            self.mergejoin_switch.select()
-            self.nestloop_switch.select()
-            self.hashagg_switch.select()
-            self.presorted_aggregate_switch.select()
-            self.incremental_sort_switch.select()
-            self.sort_switch.select()
+            self.pending_trees.pop(self.qep_graph_frame, None)
+            self.qep_json = None
+            self.plans = self.plans_query = None
+            self.qep_cost_box.clear()
+            self.index_advisor_box.delete("1.0", "end")
+            self.statistics_box.delete("1.0", "end")
+            self.generic_plan_box.delete("1.0", "end")
+            self.valid_configurations_display_box.clear()
+            self.join_orders_display_box.delete("1.0", "end")
+            self.planning_time_display_box.delete("1.0", "end")
+            self.destroy_canvas_in_frame(self.planning_time_graph_frame)
+            self.reset_switches()
             self.modified_query_button.configure(state='normal', fg_color="#1f6aa5")
             self.invalid_configuration_label.grid_forget()
-            self.aqp_display_box.delete("1.0", "end")
-            self.procedural_aqp_display_box.delete("1.0", "end")
+            self.aqp_display_box.clear()
+            self.procedural_aqp_display_box.clear()
             self.modified_sql_query_display_box.delete("1.0", "end")
             self.destroy_canvas_in_frame(self.aqp_graph_frame)
-            self.aqp_cost_box.delete("1.0", "end")
+            self.pending_trees.pop(self.aqp_graph_frame, None)
+            self.aqp_json = None
+            self.aqp_cost_box.clear()
             self.cost_comparison_box.delete("1.0", "end")
 
         except psycopg2.Error as e:
@@ -379,65 +570,76 @@ class MainWindow:
              return
 
         try:
-            # Updates the QEP tab in the QEP frame
-            qep = self.get_qep(query)  
-            self.qep_display_box.delete("1.0", "end")
-            self.qep_display_box.insert("1.0", qep)
+            # Updates the QEP tab in the QEP frame, rendering the text from the one JSON plan fetched
+            qep_json = self.get_qep(query, True)  
+            self.qep_display_box.set_text(self.dbconnect.generate_text_qep(qep_json))
 
             # Updates the Procedural QEP tab in the QEP frame
-            qep_json = self.get_qep(query, True)  
-            procedural_qep = self.dbconnect.generate_procedural_qep(qep_json) 
-            self.procedural_qep_display_box.delete("1.0", "end")
-            self.procedural_qep_display_box.insert("1.0", procedural_qep)
+            procedural_qep = self.dbconnect.generate_procedural_qep(qep_json, self.group_subplans_var.get())
+            self.procedural_qep_display_box.set_text(procedural_qep)
 
             # Updates the QEP Tree tab in the QEP frame
-            qep_graph, root_node_id = self.dbconnect.generate_qep_graph(qep_json)
-            self.visualise_qep_graph(qep_graph, root_node_id, self.qep_graph_frame)
+            self.show_plan_tree(qep_json, self.query_result_tab_view, "QEP Tree", self.qep_graph_frame)
 
             # Updates the QEP Cost Calculation tab in the QEP frame
-            qep_cost_explanation, _  = self.dbconnect.explain_cost(qep_json)
-            self.qep_cost_box.delete("1.0", "end")
-            self.qep_cost_box.insert("1.0", qep_cost_explanation)
+            qep_cost_explanation, _  = self.dbconnect.explain_cost(qep_json, self.group_subplans_var.get())
+            self.qep_cost_box.set_text(qep_cost_explanation)
+            self.index_advisor_box.delete("1.0", "end")
+            self.statistics_box.delete("1.0", "end")
+            self.generic_plan_box.delete("1.0", "end")
 
             # Generate a list of all valid combinations of configurations and store them
+            self.qep_json = qep_json
             qep_dict = ast.literal_eval(qep_json)
-            query_modifier = QueryModifier(self.dbconnect.get_connection())
-            plans = query_modifier.retrieve_all_plans(query, qep_dict)
+            self.plan_store.clear()
+            if self.service is not None:
+                query_modifier = QueryModifier(self.dbconnect.get_connection(), self.knobs)
+                plans = self.service.enumerate(self.dbconnect.dbname, query, self.knobs.cost_settings)['plans']
+                enumeration_text = ""
+            else:
+                with self.dbconnect.worker_connection() as connection:
+                    query_modifier = QueryModifier(connection, self.knobs)
+                    query_modifier.probe_executor = self.dbconnect.probe_executor()
+                    query_modifier.plan_store = self.plan_store
+
+                    # A query whose literals were edited is re-analysed from the configurations that found distinct plans for the previous one
+                    changes = None
+                    if self.plans_query is not None and self.plans_query.strip() != query.strip():
+                        changes = query_modifier.diff_queries(self.plans_query, query)
+                    reuse = changes is not None and query_modifier.is_literal_change(changes)
+                    plans = query_modifier.retrieve_all_plans(query, qep_dict, self.plans if reuse else None)
+                enumeration_text = query_modifier.parse_enumeration_stats(changes)
             valid_configs = query_modifier.retrieve_valid_combinations(plans)
+            self.plans = plans
+            self.plans_query = query
             self.valid_configurations = valid_configs
 
-            # Updates the Valid Combinations tab in the AQP frame
-            valid_combinations_text = query_modifier.parse_valid_configurations(self.valid_configurations)
-            self.valid_configurations_display_box.delete("1.0", "end")
-            self.valid_configurations_display_box.insert("1.0", valid_combinations_text)
+            # Updates the Valid Combinations tab in the AQP frame, after how the plans were enumerated
+            header_lines = enumeration_text.splitlines() + [""] if enumeration_text else []
+            self.valid_configurations_display_box.set_lines(itertools.chain(header_lines, query_modifier.generate_valid_configuration_lines(self.valid_configurations)))
 
             # Resets AQP frame
-            self.bitmapscan_switch.select()
-            self.indexscan_switch.select()
-            self.indexonlyscan_switch.select()
-            self.seqscan_switch.select()
-            self.hashjoin_switch.select()
-            self.mergejoin_switch.select()
-            self.nestloop_switch.select()
-            self.hashagg_switch.select()
-            self.presorted_aggregate_switch.select()
-            self.incremental_sort_switch.select()
-            self.sort_switch.select()
+            self.join_orders_display_box.delete("1.0", "end")
+            self.planning_time_display_box.delete("1.0", "end")
+            self.destroy_canvas_in_frame(self.planning_time_graph_frame)
+            self.reset_switches()
             self.modified_query_button.configure(state='normal', fg_color="#1f6aa5")
             self.invalid_configuration_label.grid_forget()
-            self.aqp_display_box.delete("1.0", "end")
-            self.procedural_aqp_display_box.delete("1.0", "end")
+            self.aqp_display_box.clear()
+            self.procedural_aqp_display_box.clear()
             self.modified_sql_query_display_box.delete("1.0", "end")
             self.destroy_canvas_in_frame(self.aqp_graph_frame)
-            self.aqp_cost_box.delete("1.0", "end")
+            self.pending_trees.pop(self.aqp_graph_frame, None)
+            self.aqp_json = None
+            self.aqp_cost_box.clear()
             self.cost_comparison_box.delete("1.0", "end")
         except Exception as e:
             print(f"Error: {e}")
         
 
 
-    # Displays results in the tabs in the AQP frame.
-    def on_submit_configs(self):
+    # Displays results in the tabs in the AQP frame, applying settings_queries after the configuration of the switches.
+    def on_submit_configs(self, settings_queries=()):
         # Gets original input query
         query = self.query_input_box.get("1.0", "end-1c")
 
@@ -445,89 +647,479 @@ class MainWindow:
         if not query.strip(): 
              messagebox.showerror("Error", f"Query is empty.")
 
-        # Get boolean values of switches
-        bitmapscan_bool = self.bitmapscan_switch_var.get()
-        indexscan_bool = self.indexscan_switch_var.get()
-        indexonlyscan_bool = self.indexonlyscan_switch_var.get()
-        seqscan_bool = self.seqscan_switch.get()
-        hashjoin_bool = self.hashjoin_switch_var.get()
-        mergejoin_bool = self.mergejoin_switch_var.get()
-        nestloop_bool =  self.nestloop_switch_var.get()
-        hashagg_bool = self.hashagg_switch_var.get()
-        presorted_aggregate_bool = self.presorted_aggregate_switch_var.get()
-        incremental_sort_bool = self.incremental_sort_switch_var.get()
-        sort_bool = self.sort_switch_var.get()
-
-        # Creates list of configs
-        configs = [bitmapscan_bool, indexscan_bool, indexonlyscan_bool, seqscan_bool, hashjoin_bool, mergejoin_bool, nestloop_bool, hashagg_bool, presorted_aggregate_bool, incremental_sort_bool, sort_bool]
+        # Creates list of configs from the boolean values of switches
+        configs = self.get_selected_configs()
 
         try:
-            # Updates the AQP tab in AQP Frame
-            query_modifier = QueryModifier(self.dbconnect.get_connection())
-            modified_query, aqp_text = query_modifier.get_aqp_and_query(query, configs)
-            self.aqp_display_box.delete("1.0", "end")
-            self.aqp_display_box.insert("1.0", aqp_text)
+            # Updates the AQP tab in AQP Frame, rendering the text from the one JSON plan fetched
+            query_modifier = QueryModifier(self.dbconnect.get_connection(), self.knobs)
+            modified_query, detailed_aqp_json = query_modifier.get_aqp_and_query(query, configs, True, settings_queries=settings_queries)
+            self.aqp_display_box.set_text(self.dbconnect.generate_text_qep(detailed_aqp_json))
 
             # Updates the Modified SQL Query tab in the AQP Frame
             parsed_query = query_modifier.parse_query(modified_query)
             self.modified_sql_query_display_box.delete("1.0", "end")
             self.modified_sql_query_display_box.insert("1.0", parsed_query)
 
-            # Updates the Procedural AQP tab in the AQP Frame
-            _ ,  aqp_json = query_modifier.get_aqp_and_query(query, configs, True)
-            procedural_aqp = self.dbconnect.generate_procedural_qep(aqp_json) 
-            self.procedural_aqp_display_box.delete("1.0", "end")
-            self.procedural_aqp_display_box.insert("1.0", procedural_aqp)
+            # Updates the Procedural AQP tab in the AQP Frame from the plan just fetched for the configuration
+            aqp_json = detailed_aqp_json
+            self.aqp_json = aqp_json
+            procedural_aqp = self.dbconnect.generate_procedural_qep(aqp_json, self.group_subplans_var.get())
+            self.procedural_aqp_display_box.set_text(procedural_aqp)
 
             # Updates the AQP Tree tab in the AQP Frame
-            aqp_graph, root_node_id = self.dbconnect.generate_qep_graph(aqp_json)
-            self.visualise_qep_graph(aqp_graph, root_node_id, self.aqp_graph_frame)
+            self.show_plan_tree(aqp_json, self.aqp_result_tab_view, "AQP Tree", self.aqp_graph_frame)
 
             # Updates the AQP Cost Cauculation tab in the AQP Frame
-            aqp_cost_explanation, aqp_cost = self.dbconnect.explain_cost(aqp_json)
-            self.aqp_cost_box.delete("1.0", "end")
-            self.aqp_cost_box.insert("1.0", aqp_cost_explanation)
+            aqp_cost_explanation, aqp_cost = self.dbconnect.explain_cost(aqp_json, self.group_subplans_var.get())
+            self.aqp_cost_box.set_text(aqp_cost_explanation)
             qep_json = self.get_qep(query, True)
             _ , qep_cost = self.dbconnect.explain_cost(qep_json)
 
-            # Updates the Cost Comparison tab in the AQP Frame
+            # Updates the Cost Comparison tab in the AQP Frame, with the buffers and memory of both plans where the server reports them
             cost_comparison = self.dbconnect.compare_cost(qep_cost, aqp_cost)
+            io_comparison = self.dbconnect.compare_io(qep_json, detailed_aqp_json)
+            if io_comparison:
+                cost_comparison += "\n\n" + io_comparison
             self.cost_comparison_box.delete("1.0", "end")
             self.cost_comparison_box.insert("1.0", cost_comparison)
 
         except Exception as e:
             print(f"Error: {e}")
 
+    # Searches for a plan cheaper than the QEP, starting from the plans enumerated for the query, then displays it in the AQP frame
+    def on_find_cheapest_plan(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        try:
+            qep_dict = ast.literal_eval(self.get_qep(query, True))
+            with self.dbconnect.worker_connection() as connection:
+                query_modifier = QueryModifier(connection, self.knobs)
+                query_modifier.plan_store = self.plan_store
+                plans = self.plans if self.plans_query is not None and self.plans_query.strip() == query.strip() else None
+                cheapest = query_modifier.find_cheapest_plan(query, qep_dict, plans)
+
+            # Sets the switches to the configuration of the cheapest plan and displays it
+            for switch, enabled in zip(self.knob_switches, cheapest['config']):
+                if enabled:
+                    switch.select()
+                else:
+                    switch.deselect()
+            self.modified_query_button.configure(state='normal', fg_color="#1f6aa5")
+            self.invalid_configuration_label.grid_forget()
+            self.on_submit_configs(cheapest['settings_queries'])
+            settings = "".join(f"\n  {statement}" for statement in cheapest['settings_queries'])
+            messagebox.showinfo("Cheapest Plan", f"Cheapest plan found has a total cost of {cheapest['cost']:.2f}, "
+                                f"against {cheapest['qep_cost']:.2f} for the QEP.{settings}\n"
+                                f"It started from {cheapest['seeded']} enumerated plans and planned {cheapest['probes']} more settings. "
+                                f"The search is greedy, so a cheaper plan may still exist.")
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Evaluates candidate indexes for the query and lists them by cost reduction relative to their size
+    def on_suggest_indexes(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        try:
+            columns = self.dbconnect.retrieve_schema()["columns"]
+            with self.dbconnect.worker_connection() as connection:
+                advisor = IndexAdvisor(connection, self.knobs, columns)
+
+                # Without HypoPG every candidate index is really built, so confirm first
+                use_hypopg = advisor.has_hypopg()
+                if not use_hypopg and not messagebox.askyesno("Confirm Index Builds", "HypoPG is not installed, so each candidate index will be built inside a rolled back transaction. Only do this on a local copy. Continue?"):
+                    return
+                advice = advisor.recommend_indexes(query, use_hypopg=use_hypopg)
+
+            # Updates the Index Advisor tab in the QEP frame
+            self.index_advisor_box.delete("1.0", "end")
+            self.index_advisor_box.insert("1.0", advisor.parse_recommendations(advice))
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Tests candidate extended statistics on the columns of the query and compares estimates with the QEP
+    def on_test_statistics(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        # Candidates are created and the tables analysed before rolling back, so confirm first
+        if not messagebox.askyesno("Confirm Analyze", "Each candidate is created and its table analysed inside a rolled back transaction. Only do this on a local server. Continue?"):
+            return
+
+        try:
+            columns = self.dbconnect.retrieve_schema()["columns"]
+            with self.dbconnect.worker_connection() as connection:
+                advisor = StatisticsAdvisor(connection, self.knobs, columns)
+                evaluation = advisor.evaluate_statistics(query)
+
+            # Updates the Extended Statistics tab in the QEP frame
+            self.statistics_box.delete("1.0", "end")
+            self.statistics_box.insert("1.0", advisor.parse_statistics(evaluation))
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Compares the generic plan of a query with $n parameters against custom plans for values sampled from column statistics
+    def on_compare_generic_plan(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        try:
+            columns = self.dbconnect.retrieve_schema()["columns"]
+            with self.dbconnect.worker_connection() as connection:
+                analyzer = ParameterizedQueryAnalyzer(connection, self.knobs, columns)
+                comparison = analyzer.compare_generic_custom(query, self.get_selected_configs())
+
+            # Updates the Generic vs Custom tab in the QEP frame
+            self.generic_plan_box.delete("1.0", "end")
+            self.generic_plan_box.insert("1.0", analyzer.parse_generic_custom(comparison))
+
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Measures the planning time of the QEP and every AQP and plots it against estimated cost
+    def on_measure_planning_time(self):
+        if self.plans is None:
+            messagebox.showerror("Error", "Submit a query first.")
+            return
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        try:
+            with self.dbconnect.worker_connection() as connection:
+                query_modifier = QueryModifier(connection, self.knobs)
+                query_modifier.measure_planning_times(query, self.plans)
+
+            # Updates the Planning Time tab in the AQP frame
+            self.planning_time_display_box.delete("1.0", "end")
+            self.planning_time_display_box.insert("1.0", query_modifier.parse_planning_times(self.plans))
+            self.visualise_planning_times(self.plans, self.planning_time_graph_frame)
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Plans alternative join orders of the query under the selected configurations and lists them by cost
+    def on_explore_join_orders(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        try:
+            # Join orders are ranked by the cost of their root node, so the QEP is compared by its root too
+            qep_cost = ast.literal_eval(self.get_qep(query, True))['Plan']['Total Cost']
+            columns = self.dbconnect.retrieve_schema()["columns"]
+            with self.dbconnect.worker_connection() as connection:
+                explorer = JoinOrderExplorer(connection, self.knobs, columns)
+                exploration = explorer.explore_join_orders(query, self.get_selected_configs())
+
+            # Updates the Join Orders tab in the AQP frame
+            self.join_orders_display_box.delete("1.0", "end")
+            self.join_orders_display_box.insert("1.0", explorer.parse_join_orders(exploration, qep_cost))
+
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Plans the query with different numbers of parallel workers and displays the cost, and optionally time, of each
+    def on_analyse_parallelism(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        # Measuring executes the query, so confirm first
+        measure = self.measure_parallel_var.get()
+        if measure and not messagebox.askyesno("Confirm Execution", "Measuring runs the query once per sample and worker count. Continue?"):
+            return
+
+        try:
+            with self.dbconnect.worker_connection() as connection:
+                analyzer = ParallelAnalyzer(connection, self.knobs)
+                results = analyzer.analyse_parallelism(query, self.get_selected_configs(), encourage=self.encourage_parallel_var.get(), measure=measure)
+
+            # Updates the Parallel Query frame
+            self.parallel_display_box.delete("1.0", "end")
+            self.parallel_display_box.insert("1.0", analyzer.parse_parallelism(results))
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Imports a log or pg_stat_statements export and lists its heaviest queries
+    def on_import_workload(self):
+        path = filedialog.askopenfilename(title="Select PostgreSQL log or pg_stat_statements export")
+        if not path:
+            return
+
+        try:
+            self.workload = WorkloadImporter()
+            self.workload.import_file(path)
+            self.update_workload_display(self.workload.top(self.get_workload_top()))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to import workload: {e}")
+
+
+    # Runs the what-if enumerator on the heaviest imported queries
+    def on_enumerate_workload(self):
+        if self.workload is None:
+            messagebox.showerror("Error", "No workload imported.")
+            return
+
+        try:
+            with self.dbconnect.worker_connection() as connection:
+                query_modifier = QueryModifier(connection, self.knobs)
+                query_modifier.probe_executor = self.dbconnect.probe_executor()
+                query_modifier.plan_store = self.plan_store
+                results = self.workload.enumerate_workload(query_modifier, self.get_workload_top())
+            self.update_workload_display(results)
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Loads the selected imported query into the query frame
+    def on_load_workload_query(self):
+        if self.workload is None:
+            return
+        fingerprint = self.select_workload_query_dropdown.get().split(":", 1)[0]
+        entry = self.workload.entries.get(fingerprint)
+        if entry is not None:
+            self.query_input_box.delete("1.0", "end")
+            self.query_input_box.insert("1.0", entry['query'])
+
+
+    def get_workload_top(self):
+        try:
+            return max(int(self.workload_top_input.get()), 1)
+        except ValueError:
+            return 10
+
+
+    def update_workload_display(self, entries):
+        self.workload_display_box.delete("1.0", "end")
+        self.workload_display_box.insert("1.0", self.workload.parse_workload(entries))
+        queries = [f"{entry['fingerprint']}: {entry['query'][:80]}" for entry in entries]
+        self.select_workload_query_dropdown.configure(values=queries)
+        if queries:
+            self.select_workload_query_dropdown.set(queries[0])
+
+
+    # Fits the cost parameters to timings of micro-queries, and of the input query if any, and applies them to every probe
+    def on_calibrate_costs(self):
+        # Calibration executes the queries, so confirm first
+        if not messagebox.askyesno("Confirm Execution", "Calibration runs micro-queries on a temporary table and the input query with EXPLAIN ANALYZE. Only do this on a local server. Continue?"):
+            return
+
+        query = self.query_input_box.get("1.0", "end-1c")
+        try:
+            # NumPy is only needed for fitting, so it is imported on first use
+            from calibration import CostCalibrator
+            with self.dbconnect.worker_connection() as connection:
+                calibrator = CostCalibrator(connection, self.knobs)
+                calibration = calibrator.calibrate([query] if query.strip() else [])
+            self.knobs.cost_settings = calibration['parameters']
+
+            self.calibration_display_box.delete("1.0", "end")
+            self.calibration_display_box.insert("1.0", calibrator.parse_calibration(calibration))
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Goes back to the cost parameters of the server
+    def on_reset_calibration(self):
+        self.knobs.cost_settings = {}
+        self.calibration_display_box.delete("1.0", "end")
+        self.calibration_display_box.insert("1.0", "Using the cost parameters of the server.")
+
+
+    # Sweeps the selected numeric parameter and displays where the plan changes
+    def on_sweep_parameter(self):
+        # Gets original input query
+        query = self.query_input_box.get("1.0", "end-1c")
+
+        # Handle empty query
+        if not query.strip(): 
+             messagebox.showerror("Error", f"Query is empty.")
+             return
+
+        parameter = next(parameter for parameter in PARAMETERS if parameter.label == self.select_parameter_dropdown.get())
+
+        try:
+            if self.service is not None:
+                query_modifier = QueryModifier(self.dbconnect.get_connection(), self.knobs)
+                sweep = self.service.sweep(self.dbconnect.dbname, query, parameter, self.get_selected_configs(), self.knobs.cost_settings)
+            else:
+                with self.dbconnect.worker_connection() as connection:
+                    query_modifier = QueryModifier(connection, self.knobs)
+                    sweep = query_modifier.sweep_parameter(query, parameter, self.get_selected_configs())
+
+            # Updates the Plan Changes tab in the Sweep frame
+            self.sweep_display_box.delete("1.0", "end")
+            self.sweep_display_box.insert("1.0", query_modifier.parse_sweep(sweep))
+
+            # Updates the Cost Plot tab in the Sweep frame
+            self.visualise_sweep(sweep, self.sweep_graph_frame)
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Saves the query, QEP and every enumerated plan with its costs and layout, so the analysis can be viewed without a database
+    def on_save_session(self):
+        if self.plans is None:
+            messagebox.showerror("Error", "Submit a query before saving a session.")
+            return
+
+        path = filedialog.asksaveasfilename(title="Save session", defaultextension=".qeps", filetypes=[("QEP sessions", "*.qeps")])
+        if not path:
+            return
+
+        try:
+            header = {
+                'query': self.plans_query,
+                'database': self.dbconnect.retrieve_current_database(),
+                'knobs': self.knobs.labels(),
+                'qep': self.qep_display_box.get_text(),
+            }
+            count = save_session(path, header, self.generate_session_plans())
+            messagebox.showinfo("Success", f"Saved {count} plans to {path}.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save session: {e}")
+
+
+    # Loads the enumerated plans one at a time and adds the text and layout the session viewer shows
+    def generate_session_plans(self):
+        query_modifier = QueryModifier(self.dbconnect.get_connection(), self.knobs)
+        query_modifier.plan_store = self.plan_store
+        for idx, entry in enumerate(self.plans):
+            plan = query_modifier.load_plan(self.plans_query, entry['config'])
+            if plan is None and self.service is not None:
+                plan = self.service.plan(self.dbconnect.dbname, self.plans_query, entry['config'], self.knobs.cost_settings)['plan']
+            # Plans stored under other cost settings, e.g. before a calibration, are planned again
+            if plan is None:
+                plan = query_modifier.explain_json(self.plans_query, self.knobs.settings_queries(entry['config']), ['SUMMARY'])
+            # Text is saved with identical subplans grouped, and also expanded if that differs
+            procedural = self.dbconnect.generate_procedural_qep(str(plan), True)
+            procedural_expanded = self.dbconnect.generate_procedural_qep(str(plan))
+            cost_explanation, _ = self.dbconnect.explain_cost(str(plan), True)
+            cost_explanation_expanded, _ = self.dbconnect.explain_cost(str(plan))
+            yield {
+                **entry,
+                'label': "QEP" if idx == 0 else f"Combination {idx + 1}",
+                'plan': plan,
+                'procedural': procedural,
+                'procedural_expanded': procedural_expanded if procedural_expanded != procedural else None,
+                'cost_explanation': cost_explanation,
+                'cost_explanation_expanded': cost_explanation_expanded if cost_explanation_expanded != cost_explanation else None,
+                'layout': self.dbconnect.generate_plan_tree(plan, True).layout(),
+            }
+
+
     # For updating state of button to disallow invalid combinations of configurations
     def update_button(self):
         # If query habs not been entered yet
         if self.valid_configurations == None:
             return
 
-        # Get boolean values of switches
-        bitmapscan_bool = self.bitmapscan_switch_var.get()
-        indexscan_bool = self.indexscan_switch_var.get()
-        indexonlyscan_bool = self.indexonlyscan_switch_var.get()
-        seqscan_bool = self.seqscan_switch.get()
-        hashjoin_bool = self.hashjoin_switch_var.get()
-        mergejoin_bool = self.mergejoin_switch_var.get()
-        nestloop_bool =  self.nestloop_switch_var.get()
-        hashagg_bool = self.hashagg_switch_var.get()
-        presorted_aggregate_bool = self.presorted_aggregate_switch_var.get()
-        incremental_sort_bool = self.incremental_sort_switch_var.get()
-        sort_bool = self.sort_switch_var.get()
-
-        # Creates list of configs
-        selected_configs = [bitmapscan_bool, indexscan_bool, indexonlyscan_bool, seqscan_bool, hashjoin_bool, mergejoin_bool, nestloop_bool, hashagg_bool, presorted_aggregate_bool, incremental_sort_bool, sort_bool]
+        # Creates list of configs from the boolean values of switches
+        selected_configs = self.get_selected_configs()
         if selected_configs not in self.valid_configurations:
             self.modified_query_button.configure(state='disabled', fg_color="grey")
-            self.invalid_configuration_label.grid(row=11, column=0, columnspan=4) 
+            self.invalid_configuration_label.grid(row=self.invalid_configuration_row, column=0, columnspan=4) 
         else:
             self.modified_query_button.configure(state='normal', fg_color="#1f6aa5")
             self.invalid_configuration_label.grid_forget()
 
 
-    def visualise_qep_graph(self, graph, root_node_id, canvas_frame):
+    # Gets boolean values of switches, in the order of the knob registry
+    def get_selected_configs(self):
+        return [switch_var.get() for switch_var in self.knob_switch_vars]
+
+
+    # Resets all switches to the default value of their knob
+    def reset_switches(self):
+        for knob, switch in zip(self.knobs, self.knob_switches):
+            if knob.default:
+                switch.select()
+            else:
+                switch.deselect()
+
+
+    # Shows the QEP and AQP again with identical subplans grouped or expanded
+    def on_toggle_grouping(self):
+        compress = self.group_subplans_var.get()
+        views = [
+            (self.qep_json, self.procedural_qep_display_box, self.qep_cost_box, self.query_result_tab_view, "QEP Tree", self.qep_graph_frame),
+            (self.aqp_json, self.procedural_aqp_display_box, self.aqp_cost_box, self.aqp_result_tab_view, "AQP Tree", self.aqp_graph_frame),
+        ]
+        try:
+            for plan_json, procedural_box, cost_box, tab_view, tab_name, canvas_frame in views:
+                if plan_json is None:
+                    continue
+                procedural_box.set_text(self.dbconnect.generate_procedural_qep(plan_json, compress))
+                cost_explanation, _ = self.dbconnect.explain_cost(plan_json, compress)
+                cost_box.set_text(cost_explanation)
+                self.show_plan_tree(plan_json, tab_view, tab_name, canvas_frame)
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Draws a plan tree now if its tab is open, otherwise the first time the tab is opened
+    def show_plan_tree(self, plan_json, tab_view, tab_name, canvas_frame):
+        self.destroy_canvas_in_frame(canvas_frame)
+        self.pending_trees[canvas_frame] = plan_json
+        self.on_select_tree_tab(tab_view, tab_name, canvas_frame)
+
+
+    def on_select_tree_tab(self, tab_view, tab_name, canvas_frame):
+        if tab_view.get() != tab_name or canvas_frame not in self.pending_trees:
+            return
+        tree = self.dbconnect.generate_plan_tree(self.pending_trees.pop(canvas_frame), self.group_subplans_var.get())
+        self.visualise_qep_graph(tree, canvas_frame)
+
+
+    # Draws a plan tree, at the positions of a saved layout if one is given
+    def visualise_qep_graph(self, tree, canvas_frame, layout=None):
+        load_plotting()
+
         # Destroy any existing widgets in the frame
         self.destroy_canvas_in_frame(canvas_frame)
 
@@ -535,7 +1127,7 @@ class MainWindow:
         content_frame = self.create_scrollable_canvas(canvas_frame)
 
         # Calculate positions with layout (relative positions)
-        pos = self.dbconnect.hierarchical_layout(graph, root=root_node_id)
+        x_vals, y_vals = layout if layout is not None else tree.layout()
         
         # Define the canvas or figure dimensions (absolute size you want to occupy)
         canvas_width = 800  # Adjust as needed
@@ -543,11 +1135,10 @@ class MainWindow:
         scaling_factor = 0.2  # Adjust this scaling factor as needed to control the size of the graph
 
         # Convert relative positions to absolute positions with scaling
-        pos = {node: (x * canvas_width * scaling_factor, y * canvas_height * scaling_factor) for node, (x, y) in pos.items()}
+        x_vals = [x * canvas_width * scaling_factor for x in x_vals]
+        y_vals = [y * canvas_height * scaling_factor for y in y_vals]
         
         # Calculate bounding box based on layout positions
-        x_vals = [x for x, y in pos.values()]
-        y_vals = [y for x, y in pos.values()]
         width = max(x_vals) - min(x_vals)
         height = max(y_vals) - min(y_vals)
         
@@ -564,30 +1155,28 @@ class MainWindow:
         # Create figure with enforced minimum size
         fig, ax = plt.subplots(figsize=(fig_width, fig_height))
         
-        # Draw nodes with adjusted node size
-        nx.draw_networkx_nodes(graph, pos, ax=ax, node_size=1000, node_color="lightblue", edgecolors="black")
-        labels = {
-            node: "\n".join(f"{k}: {v}" for k, v in attrs.items() if k != "Plans")
-            for node, attrs in graph.nodes(data=True)
-        }
-        for node, (x, y) in pos.items():
+        # Draw nodes with their labels
+        for node in range(len(tree)):
             ax.text(
-                x, y, labels[node],
+                x_vals[node], y_vals[node], tree.label(node),
                 ha='center', va='center',
                 bbox=dict(boxstyle="round,pad=0.3", edgecolor="black", facecolor="lightblue")
             )
         
         # Draw edges and add arrow heads
-        nx.draw_networkx_edges(graph, pos, ax=ax, arrows=False)
-        for u, v in graph.edges():
-            x1, y1 = pos[u]
-            x2, y2 = pos[v]
+        for u, v in tree.edges():
+            x1, y1 = x_vals[u], y_vals[u]
+            x2, y2 = x_vals[v], y_vals[v]
+            ax.plot([x1, x2], [y1, y2], color="black", linewidth=1, zorder=0)
             mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
             dx, dy = x1 - x2, y1 - y2
             arrow = FancyArrowPatch((mid_x, mid_y), (mid_x + dx * 0.01, mid_y + dy * 0.01), 
                                     connectionstyle="arc3", arrowstyle="-|>", color="black", mutation_scale=15)
             ax.add_patch(arrow)    
         
+        # Text does not widen the axes, so the limits are set from the layout with room for the boxes
+        ax.set_xlim(min(x_vals) - 20, max(x_vals) + 20)
+        ax.set_ylim(min(y_vals) - 20, max(y_vals) + 20)
         ax.axis("off")
         
         # Embed the matplotlib figure in the scrollable content frame
@@ -602,6 +1191,48 @@ class MainWindow:
         return canvas
 
 
+    # Plots estimated cost against the value of the swept parameter, marking where the plan changes
+    def visualise_sweep(self, sweep, canvas_frame):
+        load_plotting()
+        self.destroy_canvas_in_frame(canvas_frame)
+        parameter = sweep['parameter']
+        points = [(value, cost) for value, cost, _ in sweep['points'] if cost is not None]
+
+        fig, ax = plt.subplots(figsize=(8, 4))
+        ax.plot([value for value, _ in points], [cost for _, cost in points], marker="o", drawstyle="steps-post")
+        for breakpoint in sweep['breakpoints']:
+            ax.axvline(breakpoint['high'], color="red", linestyle="--")
+        if parameter.log_scale:
+            ax.set_xscale("log")
+        ax.set_xlabel(f"{parameter.name} ({parameter.unit})" if parameter.unit else parameter.name)
+        ax.set_ylabel("Estimated Total Cost")
+
+        canvas = FigureCanvasTkAgg(fig, master=canvas_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+        return canvas
+
+
+    # Plots planning time against estimated cost, one point for the QEP and for each AQP
+    def visualise_planning_times(self, plans, canvas_frame):
+        load_plotting()
+        self.destroy_canvas_in_frame(canvas_frame)
+        fig, ax = plt.subplots(figsize=(8, 4))
+        for idx, plan in enumerate(plans):
+            if plan.get('cost') is None or plan.get('planning_time') is None:
+                continue
+            is_qep = idx == 0
+            ax.scatter(plan['cost'], plan['planning_time'], color="red" if is_qep else "tab:blue", zorder=3 if is_qep else 2)
+            ax.annotate("QEP" if is_qep else str(idx + 1), (plan['cost'], plan['planning_time']), textcoords="offset points", xytext=(4, 4))
+        ax.set_xlabel("Estimated Total Cost")
+        ax.set_ylabel("Planning Time (ms)")
+
+        canvas = FigureCanvasTkAgg(fig, master=canvas_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+        return canvas
+
+
     # Destroys all widgets in the specified frame
     def destroy_canvas_in_frame(self, frame):
         for widget in frame.winfo_children():
@@ -614,7 +1245,9 @@ class MainWindow:
         try:
             qep_text = self.dbconnect.retrieve_qep(query, json)
             return qep_text
-        except psycopg2.Error as e:
+        except ValueError as e:
+            messagebox.showerror("Error", f"Failed to retrieve QEP. {e}")
+        except (psycopg2.Error, FatalProbeError) as e:
             messagebox.showerror("Error", "Failed to retrieve QEP.")
     
 
@@ -661,6 +1294,7 @@ class MainWindow:
         # Proceed with closing if the user confirms
         if confirm:
             self.dbconnect.close_connection() # Close the database connection
+            self.plan_store.close() # Remove the spilled plans
             self.window.destroy() # Destroy the Toplevel window
             self.master.deiconify()  # Show the master window again
 
@@ -698,3 +1332,172 @@ class MainWindow:
         update_scrollregion()
 
         return content_frame
+
+
+# Read-only viewer of a saved session. It draws plans like the main window, but needs no database connection.
+class SessionWindow(MainWindow):
+    def __init__(self, master, header, entries):
+        self.master = master
+        self.header = header
+        self.entries = entries  # Plan summaries in the order they were enumerated, the QEP first
+        self.pending_trees = {}  # Graph frame -> (plan, layout) to draw when its tab is first opened
+
+        # Create session window
+        self.window = ctk.CTkToplevel(master)
+        self.window.title("QEP Explainer - Saved Session")
+        self.window.geometry("1000x500")
+        self.window.minsize(1100, 500)
+
+        # Bind the close event of the new window
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Main scrollable frame
+        self.scrollable_frame = ctk.CTkScrollableFrame(self.window, width=200, height=200, fg_color="#2b2b2b")
+        self.scrollable_frame.pack(fill="both", expand=True)
+
+
+        #===================================================Query Frame==================================================#
+        # Outer frame for alignment
+        self.query_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.query_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # Query frame
+        self.query_frame = ctk.CTkFrame(self.query_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.query_frame.pack(expand=True)
+
+        # Frame title
+        query_label = ctk.CTkLabel(self.query_frame, text=f"Saved Session on {header.get('database')}", font=("Arial", 28))
+        query_label.grid(row=0, column=0, padx=10, pady=10)
+
+        # For viewing the saved query
+        self.query_display_box = ctk.CTkTextbox(self.query_frame, width=700, height=150)
+        self.query_display_box.grid(row=1, column=0, padx=10, pady=10)
+        self.query_display_box.insert("1.0", header.get('query', ""))
+        self.query_display_box.configure(state="disabled")
+
+        # For grouping identical subplans in the procedural, cost and tree views
+        self.group_subplans_var = ctk.BooleanVar(value=True)
+        self.group_subplans_switch = ctk.CTkSwitch(self.query_frame, text="Group Identical Subplans", variable=self.group_subplans_var, command=self.on_toggle_grouping)
+        self.group_subplans_switch.grid(row=2, column=0, padx=10, pady=(0, 10))
+
+        # For viewing results
+        self.query_result_tab_view = ctk.CTkTabview(self.query_frame, command=lambda: self.on_select_tree_tab(self.query_result_tab_view, "QEP Tree", self.qep_graph_frame))
+        self.query_result_tab_view.grid(row=3, column=0, padx=10, pady=10)
+        self.query_result_tab_view.add("QEP")
+        self.query_result_tab_view.add("Procedural QEP")
+        self.query_result_tab_view.add("QEP Tree")
+        self.query_result_tab_view.add("QEP Cost Calculation")
+        self.qep_display_box = VirtualTextView(self.query_result_tab_view.tab("QEP"), width=700, height=150)
+        self.qep_display_box.pack(padx=10, pady=10)
+        self.procedural_qep_display_box = VirtualTextView(self.query_result_tab_view.tab("Procedural QEP"), width=700, height=150)
+        self.procedural_qep_display_box.pack(padx=10, pady=10)
+        self.qep_graph_frame = ctk.CTkFrame(self.query_result_tab_view.tab("QEP Tree"), width=700, height=400, fg_color="#2b2b2b")
+        self.qep_graph_frame.pack(padx=10, pady=10)
+        self.qep_cost_box = VirtualTextView(self.query_result_tab_view.tab("QEP Cost Calculation"), width=700, height=150)
+        self.qep_cost_box.pack(padx=10, pady=10)
+        #================================================================================================================#
+
+        #====================================================AQP Frame===================================================#
+        # Outer frame for alignment
+        self.aqp_frame_main = ctk.CTkFrame(self.scrollable_frame, width=100, height=100, corner_radius=15, fg_color="#333333")
+        self.aqp_frame_main.pack(pady=20, padx=20, fill="both", expand=True)
+
+        # AQP frame
+        self.aqp_frame = ctk.CTkFrame(self.aqp_frame_main, width=100, height=200, corner_radius=15, fg_color="#333333")
+        self.aqp_frame.pack(expand=True)
+
+        # Frame title
+        plans_label = ctk.CTkLabel(self.aqp_frame, text=f"Enumerated Plans ({len(entries)})", font=("Arial", 28))
+        plans_label.grid(row=0, column=0, padx=10, pady=10)
+
+        # For selecting one of the saved plans
+        self.select_plan_dropdown = ctk.CTkComboBox(self.aqp_frame, values=[entry['label'] for entry in entries], command=self.on_select_plan)
+        self.select_plan_dropdown.grid(row=1, column=0, padx=10, pady=10)
+
+        # For viewing results
+        self.aqp_result_tab_view = ctk.CTkTabview(self.aqp_frame, command=lambda: self.on_select_tree_tab(self.aqp_result_tab_view, "AQP Tree", self.aqp_graph_frame))
+        self.aqp_result_tab_view.grid(row=2, column=0, padx=10, pady=10)
+        self.aqp_result_tab_view.add("Configuration")
+        self.aqp_result_tab_view.add("Procedural AQP")
+        self.aqp_result_tab_view.add("AQP Tree")
+        self.aqp_result_tab_view.add("AQP Cost Calculation")
+        self.configuration_display_box = ctk.CTkTextbox(self.aqp_result_tab_view.tab("Configuration"), width=700, height=150)
+        self.configuration_display_box.pack(padx=10, pady=10)
+        self.procedural_aqp_display_box = VirtualTextView(self.aqp_result_tab_view.tab("Procedural AQP"), width=700, height=150)
+        self.procedural_aqp_display_box.pack(padx=10, pady=10)
+        self.aqp_graph_frame = ctk.CTkFrame(self.aqp_result_tab_view.tab("AQP Tree"), width=700, height=400, fg_color="#2b2b2b")
+        self.aqp_graph_frame.pack(padx=10, pady=10)
+        self.aqp_cost_box = VirtualTextView(self.aqp_result_tab_view.tab("AQP Cost Calculation"), width=700, height=150)
+        self.aqp_cost_box.pack(padx=10, pady=10)
+        #================================================================================================================#
+
+        # Close button outside of scrollabe frame
+        close_button = ctk.CTkButton(self.window, text="Close", command=self.on_close)
+        close_button.pack(pady=10)
+
+        # Displays the QEP, and selects it as the first plan
+        self.qep_display_box.set_text(header.get('qep', ""))
+        if entries:
+            self.show_saved_plan(entries[0], self.procedural_qep_display_box, self.qep_cost_box, self.query_result_tab_view, "QEP Tree", self.qep_graph_frame)
+            self.select_plan_dropdown.set(entries[0]['label'])
+            self.on_select_plan(entries[0]['label'])
+
+
+    # Displays a saved plan in the tabs of the AQP frame, parsing its body only now
+    def on_select_plan(self, label):
+        entry = next((entry for entry in self.entries if entry['label'] == label), None)
+        if entry is None:
+            return
+
+        try:
+            body = load_plan_body(entry)
+
+            # Updates the Configuration tab with the knobs and the cost against the QEP
+            configuration_text = f"Total Cost: {entry.get('cost')} (QEP: {self.entries[0].get('cost')})\n"
+            if entry.get('planning_time') is not None:
+                configuration_text += f"Planning Time: {entry['planning_time']:.3f} ms\n"
+            configuration_text += "\n"
+            for knob, is_enabled in zip(self.header.get('knobs', []), entry.get('config') or []):
+                status = "Enabled" if is_enabled else "Disabled"
+                configuration_text += f"{knob}: {status}\n"
+            self.configuration_display_box.delete("1.0", "end")
+            self.configuration_display_box.insert("1.0", configuration_text)
+
+            # Updates the Procedural AQP, AQP Tree and AQP Cost Calculation tabs
+            self.show_saved_plan(entry, self.procedural_aqp_display_box, self.aqp_cost_box, self.aqp_result_tab_view, "AQP Tree", self.aqp_graph_frame, body)
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+    # Fills the procedural, cost and tree views of a saved plan, using the expanded text if grouping is switched off
+    def show_saved_plan(self, entry, procedural_box, cost_box, tab_view, tab_name, canvas_frame, body=None):
+        body = body if body is not None else load_plan_body(entry)
+        expanded = not self.group_subplans_var.get()
+        procedural_box.set_text(body.get('procedural_expanded') if expanded and body.get('procedural_expanded') else body['procedural'])
+        cost_box.set_text(body.get('cost_explanation_expanded') if expanded and body.get('cost_explanation_expanded') else body['cost_explanation'])
+        self.show_plan_tree((body['plan'], entry['layout']), tab_view, tab_name, canvas_frame)
+
+
+    def on_toggle_grouping(self):
+        if not self.entries:
+            return
+        self.show_saved_plan(self.entries[0], self.procedural_qep_display_box, self.qep_cost_box, self.query_result_tab_view, "QEP Tree", self.qep_graph_frame)
+        self.on_select_plan(self.select_plan_dropdown.get())
+
+
+    # Saved plans are drawn at their saved layout, which is that of the grouped tree, without asking a database connection for the tree
+    def on_select_tree_tab(self, tab_view, tab_name, canvas_frame):
+        if tab_view.get() != tab_name or canvas_frame not in self.pending_trees:
+            return
+        plan, layout = self.pending_trees.pop(canvas_frame)
+        if self.group_subplans_var.get():
+            self.visualise_qep_graph(PlanTree.from_plan(compress_plan(plan)), canvas_frame, layout)
+        else:
+            self.visualise_qep_graph(PlanTree.from_plan(plan), canvas_frame)
+
+
+    # Handles closing the session window
+    def on_close(self):
+        self.window.destroy() # Destroy the Toplevel window
+        self.master.deiconify()  # Show the master window again
@@ -0,0 +1,241 @@
+import re
+from whatif import QueryModifier
+from probes import FatalProbeError
+
+# Keywords that end the WHERE clause of a query
+CLAUSE_KEYWORDS = r"\b(GROUP\s+BY|HAVING|WINDOW|ORDER\s+BY|LIMIT|OFFSET|FETCH|FOR\s+UPDATE|FOR\s+SHARE)\b"
+SQL_KEYWORDS = {
+    'and', 'or', 'not', 'in', 'is', 'null', 'like', 'ilike', 'between', 'exists', 'case', 'when', 'then',
+    'else', 'end', 'true', 'false', 'date', 'interval', 'timestamp', 'as', 'any', 'all', 'some', 'cast'
+}
+
+
+# Explores alternative join orders by rewriting a query with explicit joins that the planner has to follow
+class JoinOrderExplorer(QueryModifier):
+    def __init__(self, connection, knobs=None, columns=None):
+        super().__init__(connection, knobs)
+        self.columns = columns or {}  # Table name -> column names, used to resolve unqualified columns
+
+
+    #===============================================Logic to parse query==============================================#
+    # Splits a query into its select list, relations in FROM, conjuncts in WHERE and the remaining clauses
+    def parse_join_query(self, inputQuery):
+        query = inputQuery.strip().rstrip(';').strip()
+        mask = self.top_level_mask(query)
+
+        select_match = re.match(r"SELECT\b", query, re.IGNORECASE)
+        from_match = self.find_top_level(query, mask, r"\bFROM\b")
+        if not select_match or not from_match:
+            raise ValueError("Only single SELECT ... FROM queries can be rewritten.")
+
+        where_match = self.find_top_level(query, mask, r"\bWHERE\b", from_match.end())
+        tail_match = self.find_top_level(query, mask, CLAUSE_KEYWORDS, (where_match or from_match).end())
+        from_end = where_match.start() if where_match else (tail_match.start() if tail_match else len(query))
+        where_end = tail_match.start() if tail_match else len(query)
+
+        relations = []
+        for item in self.split_top_level(query[from_match.end():from_end], r","):
+            if '(' in item or re.search(r"\bJOIN\b", item, re.IGNORECASE):
+                raise ValueError("Only relations listed with commas in FROM can be reordered.")
+            words = [word for word in item.split() if word.upper() != 'AS']
+            if len(words) not in (1, 2):
+                raise ValueError(f"Could not parse relation '{item}'.")
+            relations.append({'table': words[0], 'alias': words[-1]})
+
+        conjuncts = []
+        if where_match:
+            where = query[where_match.end():where_end].strip()
+            # AND binds tighter than OR, so a top-level OR makes the whole clause one predicate, kept in parentheses when rejoined
+            if len(self.split_top_level(where, r"\bOR\b")) > 1:
+                conjuncts = [f"({where})"]
+            else:
+                conjuncts = self.split_top_level(where, r"\bAND\b")
+
+        return {
+            'select': query[select_match.end():from_match.start()].strip(),
+            'relations': relations,
+            'conjuncts': [{'text': text, 'aliases': self.get_referenced_aliases(text, relations)} for text in conjuncts],
+            'tail': query[where_end:].strip()
+        }
+
+
+    # Marks which characters are outside of parentheses and quotes
+    def top_level_mask(self, text):
+        mask, depth, quote = [], 0, None
+        for char in text:
+            if quote:
+                mask.append(False)
+                if char == quote:
+                    quote = None
+                continue
+            if char in ("'", '"'):
+                quote = char
+                mask.append(False)
+                continue
+            if char == '(':
+                depth += 1
+            mask.append(depth == 0 and char != ')')
+            if char == ')':
+                depth -= 1
+        return mask
+
+
+    def find_top_level(self, text, mask, pattern, start=0):
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            if match.start() >= start and mask[match.start()]:
+                return match
+        return None
+
+
+    # Splits text on a separator that is not inside parentheses or quotes
+    def split_top_level(self, text, separator):
+        mask = self.top_level_mask(text)
+        parts, start = [], 0
+        for match in re.finditer(separator, text, re.IGNORECASE):
+            if mask[match.start()]:
+                # BETWEEN x AND y is a single predicate
+                if separator == r"\bAND\b" and re.search(r"\bBETWEEN\s+[^\s]+\s*$", text[start:match.start()], re.IGNORECASE):
+                    continue
+                parts.append(text[start:match.start()].strip())
+                start = match.end()
+        parts.append(text[start:].strip())
+        return [part for part in parts if part]
+
+
+    # Finds the relations a predicate refers to, by qualifier or by unqualified column name
+    def get_referenced_aliases(self, text, relations):
+        text = re.sub(r"'[^']*'", "''", text)
+        aliases = {relation['alias'] for relation in relations}
+        referenced = {qualifier for qualifier in re.findall(r"\b(\w+)\s*\.\s*\w+", text) if qualifier in aliases}
+
+        unqualified = re.sub(r"\b\w+\s*\.\s*\w+", " ", text)
+        for name in re.findall(r"\b([A-Za-z_]\w*)\b(?!\s*\()", unqualified):
+            if name.lower() in SQL_KEYWORDS:
+                continue
+            owners = [relation['alias'] for relation in relations if name in self.columns.get(relation['table'], [])]
+            if len(owners) == 1:
+                referenced.add(owners[0])
+        return referenced
+    #================================================================================================================#
+
+    #============================================Logic to rewrite join order===========================================#
+    # Builds the query with relations joined explicitly in the given order, placing each predicate at the first join it fits
+    def build_join_query(self, parsed, order, select=None, include_tail=True):
+        relations = {relation['alias']: relation for relation in parsed['relations']}
+        placed, joined = set(), set()
+        from_clause = ""
+        for alias in order:
+            relation = relations[alias]
+            item = relation['table'] if relation['table'] == alias else f"{relation['table']} {alias}"
+            joined.add(alias)
+            if not from_clause:
+                from_clause = item
+                continue
+            conditions = [
+                idx for idx, conjunct in enumerate(parsed['conjuncts'])
+                if idx not in placed and alias in conjunct['aliases'] and len(conjunct['aliases']) > 1 and conjunct['aliases'] <= joined
+            ]
+            placed.update(conditions)
+            if conditions:
+                from_clause += f" JOIN {item} ON " + " AND ".join(parsed['conjuncts'][idx]['text'] for idx in conditions)
+            else:
+                from_clause += f" CROSS JOIN {item}"
+
+        # Predicates on a single relation, or on relations not all joined yet, stay in WHERE
+        where = [
+            conjunct['text'] for idx, conjunct in enumerate(parsed['conjuncts'])
+            if idx not in placed and conjunct['aliases'] <= joined
+        ]
+        query = f"SELECT {select or parsed['select']} FROM {from_clause}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        if include_tail and parsed['tail']:
+            query += " " + parsed['tail']
+        return query
+
+
+    # Checks if a relation is joined to the prefix by some predicate, so adding it does not need a cross join
+    def is_connected(self, parsed, prefix, alias):
+        return any(
+            alias in conjunct['aliases'] and conjunct['aliases'] & set(prefix) and conjunct['aliases'] <= set(prefix) | {alias}
+            for conjunct in parsed['conjuncts']
+        )
+
+
+    # Plans a query under the given knob configuration with the join order fixed as written
+    def explain_join_order(self, query, configs=None):
+        settings_queries = ['SET join_collapse_limit TO 1;']
+        if configs is not None:
+            settings_queries += self.knobs.settings_queries(configs)
+        return self.explain_json(query, settings_queries)
+
+
+    # Explores left-deep join orders with a beam search over join prefixes instead of enumerating all permutations
+    def explore_join_orders(self, inputQuery, configs=None, beam_width=3):
+        parsed = self.parse_join_query(inputQuery)
+        aliases = [relation['alias'] for relation in parsed['relations']]
+        if len(aliases) < 2:
+            raise ValueError("The query needs at least two relations in FROM to reorder joins.")
+
+        # Costs the join of a prefix of relations on its own, memoised on the set of relations and their order
+        prefix_costs = {}
+        def prefix_cost(prefix):
+            key = tuple(prefix)
+            if key not in prefix_costs:
+                try:
+                    plan = self.explain_join_order(self.build_join_query(parsed, prefix, select="1", include_tail=False), configs)
+                    prefix_costs[key] = plan['Plan'].get('Total Cost', float('inf'))
+                except FatalProbeError:
+                    raise
+                except Exception:
+                    prefix_costs[key] = float('inf')
+            return prefix_costs[key]
+
+        # Grows the cheapest prefixes one relation at a time, preferring relations connected by a join predicate
+        beam = [[alias] for alias in aliases]
+        for _ in range(len(aliases) - 1):
+            candidates = {}
+            for prefix in beam:
+                remaining = [alias for alias in aliases if alias not in prefix]
+                connected = [alias for alias in remaining if self.is_connected(parsed, prefix, alias)]
+                for alias in connected or remaining:
+                    extended = prefix + [alias]
+                    # Prefixes joining the same relations in the same last step are interchangeable, keep the cheaper one
+                    key = (frozenset(extended), alias)
+                    cost = prefix_cost(extended)
+                    if key not in candidates or cost < candidates[key][0]:
+                        candidates[key] = (cost, extended)
+            beam = [extended for _, extended in sorted(candidates.values(), key=lambda candidate: candidate[0])[:beam_width]]
+
+        results = []
+        for order in beam:
+            rewritten = self.build_join_query(parsed, order)
+            try:
+                plan = self.explain_join_order(rewritten, configs)
+            except FatalProbeError:
+                raise
+            except Exception:
+                continue
+            results.append({
+                'aqp': self.parse_plan(plan),
+                'config': configs if configs is not None else self.knobs.default_configs(),
+                'order': order,
+                'query': rewritten,
+                'cost': plan['Plan'].get('Total Cost'),
+            })
+        results.sort(key=lambda result: result['cost'])
+        return {'results': results, 'probes': len(prefix_costs) + len(beam)}
+
+
+    # Formats the explored join orders for display
+    def parse_join_orders(self, exploration, qep_cost=None):
+        output_text = f"{len(exploration['results'])} join orders planned using {exploration['probes']} EXPLAINs.\n"
+        if qep_cost is not None:
+            output_text += f"The total cost of QEP is {qep_cost}.\n"
+        output_text += "\n"
+        for idx, result in enumerate(exploration['results']):
+            output_text += f"Join Order {idx + 1}: {' -> '.join(result['order'])}\n"
+            output_text += f"Total Cost: {result['cost']}\n"
+            output_text += f"SET join_collapse_limit TO 1;\n{result['query']};\n\n"
+        return output_text
+    #================================================================================================================#
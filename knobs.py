@@ -0,0 +1,237 @@
+import psycopg2
+import copy
+import math
+
+
+# A boolean planner setting that can be switched in a 'what if' query
+class Knob:
+    def __init__(self, name, label, group, min_version=0, markers=None, default=True, operators=None):
+        self.name = name  # Name of the setting, e.g. enable_hashjoin
+        self.label = label  # Name shown in the interface
+        self.group = group  # Group the switch is shown in
+        self.min_version = min_version  # First server_version_num the setting exists in
+        self.markers = markers  # Plan contents that make switching the setting relevant. None means always relevant.
+        self.default = default  # Value the setting has when the query is not modified
+        self.operators = operators or []  # Node types the planner avoids when the setting is off
+
+
+    # Checks if switching the setting can change the given plan
+    def is_relevant(self, plan):
+        if self.markers is None:
+            return True
+        plan_text = str(plan)
+        return any(marker in plan_text for marker in self.markers)
+
+
+    # SQL statement that sets the knob to the given value
+    def set_statement(self, value):
+        return f"SET {self.name} TO {'TRUE' if value else 'FALSE'};"
+
+
+    def __repr__(self):
+        return f"Knob({self.name}={self.default})"
+
+
+# Known planner knobs, in the order they appear in configurations and in the interface
+KNOBS = [
+    # Scan Options
+    Knob('enable_bitmapscan', "Bitmap Scan", "Scan", operators=['Bitmap Heap Scan', 'Bitmap Index Scan']),
+    Knob('enable_indexscan', "Index Scan", "Scan", operators=['Index Scan', 'Index Only Scan']),  # Also disables index-only scans
+    Knob('enable_indexonlyscan', "Index Only Scan", "Scan", min_version=90200, operators=['Index Only Scan']),
+    Knob('enable_seqscan', "Sequential Scan", "Scan", operators=['Seq Scan']),
+    Knob('enable_tidscan', "Tid Scan", "Scan", markers=['Tid'], operators=['Tid Scan', 'Tid Range Scan']),
+    # Join Options
+    Knob('enable_hashjoin', "Hash Join", "Join", markers=['Join', 'Nested Loop'], operators=['Hash Join']),
+    Knob('enable_mergejoin', "Merge Join", "Join", markers=['Join', 'Nested Loop'], operators=['Merge Join']),
+    Knob('enable_nestloop', "Nest Loop", "Join", markers=['Join', 'Nested Loop'], operators=['Nested Loop']),
+    Knob('enable_memoize', "Memoize", "Join", min_version=140000, markers=['Memoize'], operators=['Memoize']),
+    Knob('enable_material', "Materialize", "Join", markers=['Materialize'], operators=['Materialize']),
+    # Aggregate Options
+    Knob('enable_hashagg', "Hash Aggregate", "Aggregate", markers=['Aggregate']),
+    Knob('enable_presorted_aggregate', "Presorted Aggregate", "Aggregate", min_version=160000, markers=['Aggregate']),
+    # Sort Options
+    Knob('enable_incremental_sort', "Incremental Sort", "Sort", min_version=130000, markers=['Sort'], operators=['Incremental Sort']),
+    Knob('enable_sort', "Sort", "Sort", markers=['Sort'], operators=['Sort']),
+    # Parallel Options
+    Knob('enable_gathermerge', "Gather Merge", "Parallel", min_version=100000, markers=['Gather Merge'], operators=['Gather Merge']),
+    Knob('enable_parallel_hash', "Parallel Hash", "Parallel", min_version=110000, markers=['Gather']),
+    Knob('enable_parallel_append', "Parallel Append", "Parallel", min_version=110000, markers=['Gather']),
+    # Partition Options
+    Knob('enable_partition_pruning', "Partition Pruning", "Partition", min_version=110000, markers=['Append']),
+    Knob('enable_partitionwise_join', "Partitionwise Join", "Partition", min_version=110000, markers=['Append'], default=False),
+    Knob('enable_partitionwise_aggregate', "Partitionwise Aggregate", "Partition", min_version=110000, markers=['Append'], default=False),
+]
+
+
+# A numeric planner setting whose range can be swept for plan changes
+class Parameter:
+    def __init__(self, name, label, low, high, unit="", integer=False, log_scale=True):
+        self.name = name  # Name of the setting, e.g. work_mem
+        self.label = label  # Name shown in the interface
+        self.low = low  # Lowest value swept
+        self.high = high  # Highest value swept
+        self.unit = unit  # Unit appended to the value in SET statements, e.g. kB
+        self.integer = integer  # Whether the setting only takes whole numbers
+        self.log_scale = log_scale  # Whether values are spread evenly on a logarithmic scale
+
+
+    # SQL statement that sets the parameter to the given value
+    def set_statement(self, value):
+        return f"SET {self.name} TO '{self.format_value(value)}{self.unit}';"
+
+
+    def format_value(self, value):
+        return str(int(value)) if self.integer else repr(float(value))
+
+
+    # Evenly spread values over the range, including both ends
+    def grid(self, samples):
+        values = []
+        for step in range(samples):
+            fraction = step / (samples - 1) if samples > 1 else 0
+            if self.log_scale:
+                value = math.exp(math.log(self.low) + fraction * (math.log(self.high) - math.log(self.low)))
+            else:
+                value = self.low + fraction * (self.high - self.low)
+            values.append(round(value) if self.integer else value)
+        return sorted(set(values))
+
+
+    # Value halfway between two values on the scale of the parameter
+    def midpoint(self, low, high):
+        value = math.sqrt(low * high) if self.log_scale else (low + high) / 2
+        return int(value) if self.integer else value
+
+
+    # Checks if two values are within the tolerance of each other, so the interval between them is not split further
+    def is_close(self, low, high, tolerance):
+        if self.integer and high - low <= 1:
+            return True
+        if self.log_scale:
+            return high <= low * (1 + tolerance)
+        return high - low <= (self.high - self.low) * tolerance
+
+
+    def __repr__(self):
+        return f"Parameter({self.name}=[{self.low}, {self.high}])"
+
+
+# Known numeric planner settings that can be swept
+PARAMETERS = [
+    Parameter('work_mem', "Work Memory", 64, 4194304, unit="kB", integer=True),
+    Parameter('random_page_cost', "Random Page Cost", 0.1, 100.0),
+    Parameter('effective_cache_size', "Effective Cache Size", 8, 1073741824, unit="kB", integer=True),
+    Parameter('cpu_tuple_cost', "CPU Tuple Cost", 0.0001, 1.0),
+    Parameter('parallel_setup_cost', "Parallel Setup Cost", 1.0, 1000000.0),
+    Parameter('parallel_tuple_cost', "Parallel Tuple Cost", 0.0001, 10.0),
+    Parameter('min_parallel_table_scan_size', "Min Parallel Table Scan Size", 8, 8388608, unit="kB", integer=True),
+    Parameter('max_parallel_workers_per_gather', "Workers Per Gather", 0, 16, integer=True, log_scale=False),
+]
+
+
+# Looks up a known numeric parameter by the name of its setting
+def get_parameter(name):
+    return next(parameter for parameter in PARAMETERS if parameter.name == name)
+
+
+# Planner cost parameters that can be set before every probe, e.g. fitted by CostCalibrator in the order of its design matrix
+COST_PARAMETERS = ['seq_page_cost', 'random_page_cost', 'cpu_tuple_cost', 'cpu_index_tuple_cost', 'cpu_operator_cost']
+
+
+# Checks cost settings, e.g. from a service request, before they are written into SET statements.
+# Returns them with float values, raising ValueError for unknown parameters and values that are not finite and non-negative.
+def validate_cost_settings(settings):
+    if not isinstance(settings, dict):
+        raise ValueError("Cost settings must map cost parameters to values")
+    validated = {}
+    for name, value in settings.items():
+        if name not in COST_PARAMETERS:
+            raise ValueError(f"Unknown cost parameter {name!r}, expected one of {', '.join(COST_PARAMETERS)}")
+        try:
+            validated[name] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Cost parameter {name} must be a number, got {value!r}")
+        if not math.isfinite(validated[name]) or validated[name] < 0:
+            raise ValueError(f"Cost parameter {name} must be finite and non-negative, got {value!r}")
+    return validated
+
+
+# Set of knobs available on a server, driving the enumerator, the generated SQL and the interface switches
+class KnobRegistry:
+    def __init__(self, knobs=None, server_version=None):
+        self.knobs = list(KNOBS if knobs is None else knobs)
+        self.server_version = server_version
+        self.cost_settings = {}  # Cost parameter -> value set before every probe, e.g. fitted by CostCalibrator
+
+
+    # Builds the registry from the knobs that exist on the server, taking their defaults from pg_settings
+    @classmethod
+    def detect(cls, connection, knobs=None):
+        knobs = KNOBS if knobs is None else knobs
+        query = """
+        SELECT name, setting
+        FROM pg_settings
+        WHERE name = ANY(%s)
+        """
+        names = [knob.name for knob in knobs] + ['server_version_num']
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(query, (names,))
+                settings = dict(cursor.fetchall())
+            except psycopg2.Error:
+                connection.rollback()
+                raise
+        server_version = int(settings.pop('server_version_num', 0))
+
+        available = []
+        for knob in knobs:
+            if knob.name not in settings or server_version < knob.min_version:
+                continue
+            available_knob = copy.copy(knob)
+            available_knob.default = settings[knob.name] == 'on'
+            available.append(available_knob)
+        return cls(available, server_version)
+
+
+    def __len__(self):
+        return len(self.knobs)
+
+
+    def __iter__(self):
+        return iter(self.knobs)
+
+
+    def __getitem__(self, index):
+        return self.knobs[index]
+
+
+    def names(self):
+        return [knob.name for knob in self.knobs]
+
+
+    def labels(self):
+        return [knob.label for knob in self.knobs]
+
+
+    # Configuration in which no knob is modified
+    def default_configs(self):
+        return [knob.default for knob in self.knobs]
+
+
+    # Indices of knobs grouped by group name, in registry order
+    def groups(self):
+        groups = {}
+        for index, knob in enumerate(self.knobs):
+            groups.setdefault(knob.group, []).append(index)
+        return groups
+
+
+    # SET statements that apply a configuration, skipping knobs left at their default
+    def settings_queries(self, configs):
+        return [knob.set_statement(value) for knob, value in zip(self.knobs, configs) if value != knob.default]
+
+
+    # SET statements applied before every probe regardless of configuration, e.g. calibrated cost parameters.
+    # The settings are validated again here, as they are written into the statements.
+    def session_queries(self):
+        return [f"SET {name} TO '{value!r}';" for name, value in validate_cost_settings(self.cost_settings).items()]
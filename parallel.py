@@ -0,0 +1,147 @@
+import statistics
+from whatif import QueryModifier
+from knobs import get_parameter
+from probes import FatalProbeError
+
+# Settings that stop the planner from ruling out parallel plans on cost or table size
+ENCOURAGE_PARALLEL = {
+    'parallel_setup_cost': 0,
+    'parallel_tuple_cost': 0,
+    'min_parallel_table_scan_size': 8,
+}
+
+# Cost and size settings that decide whether a parallel plan wins, swept over their grid for every worker count
+PARALLEL_PARAMETERS = ('parallel_setup_cost', 'parallel_tuple_cost', 'min_parallel_table_scan_size')
+
+
+# Answers how a query would be planned, and optionally how fast it would run, with different numbers of parallel workers
+class ParallelAnalyzer(QueryModifier):
+    #========================================Logic to analyse parallel query plans=======================================#
+    # Every worker count above 0 also sweeps the parallel cost parameters over sweep_samples values each, 0 for none
+    def analyse_parallelism(self, inputQuery, configs=None, worker_counts=(0, 1, 2, 4, 8), encourage=False, measure=False, samples=3, sweep_samples=5):
+        base_settings = self.knobs.settings_queries(configs) if configs is not None else []
+        if encourage:
+            base_settings += [get_parameter(name).set_statement(value) for name, value in ENCOURAGE_PARALLEL.items()]
+        workers_parameter = get_parameter('max_parallel_workers_per_gather')
+
+        results = []
+        for workers in worker_counts:
+            settings_queries = base_settings + [workers_parameter.set_statement(workers)]
+            try:
+                plan = self.explain_json(inputQuery, settings_queries)
+            except FatalProbeError:
+                raise
+            except Exception as e:
+                results.append({'workers': workers, 'error': str(e)})
+                continue
+
+            result = {
+                'workers': workers,
+                'cost': plan['Plan'].get('Total Cost'),
+                'fingerprint': self.fingerprint_plan(plan),
+                'gathers': self.get_gather_nodes(plan['Plan']),
+                'parallel_nodes': self.get_parallel_nodes(plan['Plan']),
+                'sweeps': [],
+            }
+            # The parameter swept is set after the others, so it overrides the value set to encourage parallel plans
+            if workers and sweep_samples:
+                for name in PARALLEL_PARAMETERS:
+                    result['sweeps'].append(self.sweep_parallel_parameter(inputQuery, settings_queries, get_parameter(name), sweep_samples))
+
+            # Measured mode runs the query, so it is meant for a local server
+            if measure:
+                timings, launched = [], []
+                for _ in range(samples):
+                    analysed = self.explain_json(inputQuery, settings_queries, ['ANALYZE'])
+                    timings.append(analysed.get('Execution Time'))
+                    launched.append(sum(gather.get('Workers Launched', 0) for gather in self.get_gather_nodes(analysed['Plan'])))
+                result['time'] = statistics.median(timings)
+                result['workers_launched'] = max(launched)
+            results.append(result)
+
+        # Speedups are relative to the plan without parallel workers, or to the first worker count tried
+        reference = next((result for result in results if 'error' not in result), None)
+        for result in results:
+            if reference is None or 'error' in result:
+                continue
+            if result['cost']:
+                result['cost_speedup'] = reference['cost'] / result['cost']
+            if measure and result['time']:
+                result['measured_speedup'] = reference['time'] / result['time']
+        return results
+
+
+    # Plans the query at each value of the grid of a parameter and returns the cost and workers planned at every value
+    def sweep_parallel_parameter(self, inputQuery, settings_queries, parameter, samples):
+        points = []
+        for value in parameter.grid(samples):
+            try:
+                plan = self.explain_json(inputQuery, settings_queries + [parameter.set_statement(value)])
+            except FatalProbeError:
+                raise
+            except Exception:
+                continue
+            workers_planned = sum(gather['Workers Planned'] for gather in self.get_gather_nodes(plan['Plan']))
+            points.append({'value': value, 'cost': plan['Plan'].get('Total Cost'), 'workers_planned': workers_planned})
+        return {'parameter': parameter, 'points': points}
+
+
+    # Returns the Gather and Gather Merge nodes of a plan with the number of workers planned and launched
+    def get_gather_nodes(self, plan):
+        gathers = []
+        if plan.get('Node Type') in ('Gather', 'Gather Merge'):
+            gather = {'Node Type': plan['Node Type'], 'Workers Planned': plan.get('Workers Planned', 0)}
+            if 'Workers Launched' in plan:
+                gather['Workers Launched'] = plan['Workers Launched']
+            gathers.append(gather)
+        for sub_plan in plan.get('Plans', []):
+            gathers.extend(self.get_gather_nodes(sub_plan))
+        return gathers
+
+
+    # Returns the node types of all parallel aware nodes in a plan, e.g. Parallel Seq Scan or Parallel Hash
+    def get_parallel_nodes(self, plan):
+        nodes = [f"Parallel {plan.get('Node Type')}"] if plan.get('Parallel Aware') else []
+        for sub_plan in plan.get('Plans', []):
+            nodes.extend(self.get_parallel_nodes(sub_plan))
+        return nodes
+
+
+    # Value of a parameter for display, whole numbers for integer settings and four significant digits otherwise
+    def format_parameter_value(self, parameter, value):
+        return (parameter.format_value(value) if parameter.integer else f"{value:.4g}") + parameter.unit
+
+
+    # Formats the results of a parallelism analysis for display
+    def parse_parallelism(self, results):
+        output_text = ""
+        for result in results:
+            output_text += f"Workers Per Gather: {result['workers']}\n"
+            if 'error' in result:
+                output_text += f"Failed to plan query: {result['error']}\n\n"
+                continue
+            output_text += f"Estimated Total Cost: {result['cost']}"
+            if 'cost_speedup' in result:
+                output_text += f" (estimated speedup {result['cost_speedup']:.2f}x)"
+            output_text += "\n"
+            if result['gathers']:
+                gathers = ", ".join(f"{gather['Node Type']} with {gather['Workers Planned']} workers planned" for gather in result['gathers'])
+                output_text += f"Gather Nodes: {gathers}\n"
+                output_text += f"Parallel Nodes: {', '.join(result['parallel_nodes']) or 'None'}\n"
+            else:
+                output_text += "The plan does not use parallel workers.\n"
+            for sweep in result.get('sweeps', []):
+                parameter = sweep['parameter']
+                points = ", ".join(
+                    f"{self.format_parameter_value(parameter, point['value'])}: {point['workers_planned'] or 'no'} workers (cost {point['cost']:.2f})"
+                    for point in sweep['points']
+                )
+                output_text += f"{parameter.label}: {points or 'could not be planned'}\n"
+            if 'time' in result:
+                output_text += f"Measured Execution Time: {result['time']} ms with {result['workers_launched']} workers launched"
+                if 'measured_speedup' in result:
+                    output_text += f" (measured speedup {result['measured_speedup']:.2f}x)"
+                output_text += "\n"
+            output_text += "\n"
+        return output_text
+    #================================================================================================================#
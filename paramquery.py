@@ -0,0 +1,180 @@
+import re
+import statistics
+import psycopg2
+from whatif import QueryModifier
+from explain import has_placeholders
+
+PREPARED_STATEMENT = "whatif_prepared"
+
+
+# Compares the generic plan of a parameterized query with the custom plans chosen for sample parameter values
+class ParameterizedQueryAnalyzer(QueryModifier):
+    def __init__(self, connection, knobs=None, columns=None):
+        super().__init__(connection, knobs)
+        self.columns = columns or {}  # Table name -> column names, e.g. from DbConnect.retrieve_schema
+
+
+    #========================================Logic to sample parameter values========================================#
+    # Returns the numbers of the $n placeholders in a query, in order
+    def get_placeholders(self, inputQuery):
+        text = re.sub(r"'(?:[^']|'')*'", "''", inputQuery)
+        return sorted({int(number) for number in re.findall(r"\$(\d+)", text)})
+
+
+    # Finds the (table, column) each placeholder is compared with, e.g. o.o_custkey = $1
+    def get_placeholder_columns(self, inputQuery):
+        relations = {}
+        for table, alias in re.findall(r"\b(?:FROM|JOIN|,)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", inputQuery, re.IGNORECASE):
+            relations[table] = table
+            if alias and alias.upper() not in ('WHERE', 'JOIN', 'ON', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'GROUP', 'ORDER', 'LIMIT'):
+                relations[alias] = table
+
+        placeholder_columns = {}
+        operator = r"(?:=|<>|!=|<=|>=|<|>|\bLIKE\b|\bILIKE\b)"
+        for qualifier, column, number in re.findall(rf"(?:\b(\w+)\s*\.\s*)?\b(\w+)\s*{operator}\s*\$(\d+)", inputQuery, re.IGNORECASE):
+            placeholder_columns.setdefault(int(number), self.resolve_column(qualifier, column, relations))
+        for number, qualifier, column in re.findall(rf"\$(\d+)\s*{operator}\s*(?:\b(\w+)\s*\.\s*)?\b(\w+)", inputQuery, re.IGNORECASE):
+            placeholder_columns.setdefault(int(number), self.resolve_column(qualifier, column, relations))
+        return {number: column for number, column in placeholder_columns.items() if column}
+
+
+    # Resolves a possibly qualified column name to its table, using the column map for unqualified names
+    def resolve_column(self, qualifier, column, relations):
+        if qualifier:
+            table = relations.get(qualifier)
+            return (table, column) if table else None
+        owners = [table for table in set(relations.values()) if column in self.columns.get(table, [])]
+        return (owners[0], column) if len(owners) == 1 else None
+
+
+    # Samples values of a column from its statistics: the most common values first, then histogram bounds across the range.
+    # The table is resolved on the search path like the query resolves it, so a table of the same name in another schema is not used,
+    # and the statistics of an inheritance tree, which the query is planned with, come before those of its parent table alone.
+    def sample_column_values(self, table, column, samples):
+        query = """
+        SELECT s.most_common_vals::text::text[], s.histogram_bounds::text::text[]
+        FROM pg_stats s
+        JOIN pg_class c ON c.relname = s.tablename
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = s.schemaname
+        WHERE c.oid = to_regclass(%s) AND s.attname = %s
+        ORDER BY s.inherited DESC
+        LIMIT 1
+        """
+        def lookup(cursor):
+            cursor.execute(query, (table, column))
+            return cursor.fetchone()
+
+        row = self.probe_runner.run_transaction(self.connection, lookup)
+        if row is None:
+            return []
+        common_values, histogram_bounds = row[0] or [], row[1] or []
+
+        values = list(common_values[:(samples + 1) // 2])
+        if histogram_bounds:
+            needed = samples - len(values)
+            step = max((len(histogram_bounds) - 1) / max(needed - 1, 1), 1)
+            values += [histogram_bounds[min(round(i * step), len(histogram_bounds) - 1)] for i in range(needed)]
+        unique_values = []
+        for value in values:
+            if value not in unique_values:
+                unique_values.append(value)
+        return unique_values[:samples]
+
+
+    # Builds sample parameter tuples, one value per placeholder, from column statistics and any given values
+    def sample_parameters(self, inputQuery, samples=5, given_values=None):
+        given_values = given_values or {}
+        placeholder_columns = self.get_placeholder_columns(inputQuery)
+        candidates = {}
+        for number in self.get_placeholders(inputQuery):
+            if number in given_values:
+                candidates[number] = list(given_values[number])
+            elif number in placeholder_columns:
+                candidates[number] = self.sample_column_values(*placeholder_columns[number], samples)
+            if not candidates.get(number):
+                raise ValueError(f"No sample values found for ${number}. Provide values or compare it with a column that has statistics.")
+        return [
+            tuple(candidates[number][idx % len(candidates[number])] for number in sorted(candidates))
+            for idx in range(max(len(values) for values in candidates.values()))
+        ]
+    #================================================================================================================#
+
+    #====================================Logic to compare generic and custom plans===================================#
+    # Plans the query generically and with custom plans for each sample of parameter values
+    def compare_generic_custom(self, inputQuery, configs=None, samples=5, given_values=None):
+        if not has_placeholders(inputQuery):
+            raise ValueError("The query has no $n parameter placeholders.")
+        settings_queries = self.knobs.settings_queries(configs) if configs is not None else []
+        parameter_samples = self.sample_parameters(inputQuery, samples, given_values)
+
+        # Planned with GENERIC_PLAN or a prepared statement, depending on the server version
+        generic = self.explain_json(inputQuery, settings_queries)
+
+        custom_plans = []
+        for values in parameter_samples:
+            try:
+                custom = self.explain_prepared(inputQuery, settings_queries, values, 'force_custom_plan')
+            except psycopg2.Error as e:
+                custom_plans.append({'values': values, 'error': str(e).strip()})
+                continue
+            custom_plans.append({
+                'values': values,
+                'cost': custom['Plan'].get('Total Cost'),
+                'fingerprint': self.fingerprint_plan(custom),
+                'aqp': self.parse_plan(custom),
+            })
+
+        generic_cost = generic['Plan'].get('Total Cost')
+        generic_fingerprint = self.fingerprint_plan(generic)
+        custom_costs = [plan['cost'] for plan in custom_plans if 'cost' in plan]
+        average_custom_cost = statistics.mean(custom_costs) if custom_costs else None
+        return {
+            'generic_cost': generic_cost,
+            'generic_fingerprint': generic_fingerprint,
+            'generic_aqp': self.parse_plan(generic),
+            'custom_plans': custom_plans,
+            'average_custom_cost': average_custom_cost,
+            # With plan_cache_mode = auto the generic plan is used once it is estimated no dearer than the custom plans
+            'auto_uses_generic': average_custom_cost is not None and generic_cost <= average_custom_cost,
+            'sensitive': any(plan.get('fingerprint') not in (None, generic_fingerprint) for plan in custom_plans),
+        }
+
+
+    # Prepares the query and plans EXECUTE with the given values under a plan_cache_mode, all rolled back afterwards
+    def explain_prepared(self, inputQuery, settings_queries, values, plan_cache_mode):
+        placeholders = ", ".join(["%s"] * len(values))
+
+        # Leftovers of a failed attempt are deallocated first, so a retry can prepare the statement again
+        def explain(cursor):
+            cursor.execute("DEALLOCATE ALL;")
+            cursor.execute("".join(self.knobs.session_queries() + settings_queries) + f"SET LOCAL plan_cache_mode TO {plan_cache_mode};")
+            cursor.execute(f"PREPARE {PREPARED_STATEMENT} AS {inputQuery}")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE {PREPARED_STATEMENT} ({placeholders})", values)
+            return cursor.fetchall()[0][0][0]
+
+        try:
+            return self.probe_runner.run_transaction(self.connection, explain)
+        finally:
+            # Prepared statements outlive the rollback, so they are deallocated separately
+            self.probe_runner.run(self.connection, "BEGIN;DEALLOCATE ALL;")
+
+
+    # Formats the comparison of generic and custom plans for display
+    def parse_generic_custom(self, comparison):
+        output_text = f"Generic Plan: Total Cost {comparison['generic_cost']} (plan {comparison['generic_fingerprint']})\n"
+        if comparison['average_custom_cost'] is not None:
+            output_text += f"Average Custom Plan Cost: {comparison['average_custom_cost']}\n"
+        output_text += f"plan_cache_mode = auto would {'switch to the generic plan' if comparison['auto_uses_generic'] else 'keep using custom plans'}.\n"
+        if comparison['sensitive']:
+            output_text += "The query is parameter sensitive: some parameter values get a different custom plan.\n"
+        output_text += "\n"
+        for idx, plan in enumerate(comparison['custom_plans']):
+            values = ", ".join(f"${number + 1} = {value}" for number, value in enumerate(plan['values']))
+            output_text += f"Custom Plan {idx + 1} ({values}): "
+            if 'error' in plan:
+                output_text += f"Failed to plan: {plan['error']}\n"
+                continue
+            same = "same as" if plan['fingerprint'] == comparison['generic_fingerprint'] else "differs from"
+            output_text += f"Total Cost {plan['cost']}, plan {plan['fingerprint']} {same} generic plan\n"
+        return output_text
+    #================================================================================================================#
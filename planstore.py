@@ -0,0 +1,85 @@
+import collections
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+import zlib
+
+
+# Removes the store file once the store is closed or garbage collected
+def remove_store_file(database, path):
+    database.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# Keeps full plan bodies out of memory in a zlib compressed SQLite file, with a bounded cache of recently loaded plans
+class PlanStore:
+    def __init__(self, path=None, memory_cap=64 * 1024 * 1024):
+        self.memory_cap = memory_cap  # Bytes of plan JSON kept decompressed in memory
+        self.cache = collections.OrderedDict()  # Key -> (plan, size), least recently used first
+        self.cached_bytes = 0
+        self.lock = threading.Lock()  # Probes on replicas store plans from worker threads
+
+        if path is None:
+            file, path = tempfile.mkstemp(prefix="whatif_plans_", suffix=".db")
+            os.close(file)
+            self.database = sqlite3.connect(path, check_same_thread=False)
+            self.finalizer = weakref.finalize(self, remove_store_file, self.database, path)
+        else:
+            self.database = sqlite3.connect(path, check_same_thread=False)
+            self.finalizer = weakref.finalize(self, self.database.close)
+        self.path = path
+        self.database.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, body BLOB NOT NULL)")
+
+
+    def close(self):
+        self.finalizer()
+
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.cache:
+                return True
+            return self.database.execute("SELECT 1 FROM plans WHERE key = ?", (key,)).fetchone() is not None
+
+
+    # Stores a plan under a key, replacing any plan stored under it before. Plans are written straight to disk and not cached.
+    def put(self, key, plan):
+        body = zlib.compress(json.dumps(plan, separators=(',', ':')).encode())
+        with self.lock, self.database:
+            self.database.execute("INSERT OR REPLACE INTO plans VALUES (?, ?)", (key, body))
+            if key in self.cache:
+                self.cached_bytes -= self.cache.pop(key)[1]
+
+
+    # Loads a plan, from the cache if it was used recently. Returns None if no plan is stored under the key.
+    def get(self, key):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key][0]
+            row = self.database.execute("SELECT body FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            text = zlib.decompress(row[0])
+            plan = json.loads(text)
+
+            # The least recently used plans are dropped until the new one fits under the memory cap
+            size = len(text)
+            if size <= self.memory_cap:
+                while self.cached_bytes + size > self.memory_cap:
+                    _, (_, dropped_size) = self.cache.popitem(last=False)
+                    self.cached_bytes -= dropped_size
+                self.cache[key] = (plan, size)
+                self.cached_bytes += size
+            return plan
+
+
+    def clear(self):
+        with self.lock, self.database:
+            self.database.execute("DELETE FROM plans")
+            self.cache.clear()
+            self.cached_bytes = 0
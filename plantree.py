@@ -0,0 +1,236 @@
+import sys
+from array import array
+
+# Plan attributes kept for every node as text, next to the numeric columns
+TEXT_COLUMNS = {
+    'node_types': 'Node Type',
+    'relations': 'Relation Name',
+    'indexes': 'Index Name',
+    'join_types': 'Join Type',
+    'strategies': 'Strategy',
+}
+
+# Plan attributes kept for every node as arrays of floats
+NUMERIC_COLUMNS = {
+    'startup_costs': 'Startup Cost',
+    'total_costs': 'Total Cost',
+    'rows': 'Plan Rows',
+    'widths': 'Plan Width',
+    'shared_hits': 'Shared Hit Blocks',
+    'shared_reads': 'Shared Read Blocks',
+}
+
+# Plan-level figures EXPLAIN reports next to the tree, e.g. with BUFFERS, MEMORY or SERIALIZE, as label, group and key. A group of None is the top level.
+SUMMARY_FIELDS = {
+    'planning_time': ("Planning time (ms)", None, 'Planning Time'),
+    'planning_shared_hits': ("Planning shared buffers hit", 'Planning', 'Shared Hit Blocks'),
+    'planning_shared_reads': ("Planning shared buffers read", 'Planning', 'Shared Read Blocks'),
+    'planning_memory_used': ("Planning memory used (bytes)", 'Planning', 'Memory Used'),
+    'planning_memory_allocated': ("Planning memory allocated (bytes)", 'Planning', 'Memory Allocated'),
+    'execution_time': ("Execution time (ms)", None, 'Execution Time'),
+    'serialization_time': ("Serialization time (ms)", 'Serialization', 'Time'),
+    'serialization_output': ("Serialization output (kB)", 'Serialization', 'Output Volume'),
+}
+
+# Parents whose children are grouped when they are identical, e.g. the scans of every partition under an Append
+GROUPED_NODE_TYPES = ('Append', 'Merge Append')
+
+# Attributes that make two subtrees different operators. Relation and index names are left out, as each partition has its own.
+STRUCTURE_KEYS = ('Node Type', 'Parent Relationship', 'Join Type', 'Strategy', 'Scan Direction')
+
+
+# Key that is equal for subtrees with the same operators in the same shape
+def get_structure_key(node):
+    return (
+        tuple(node.get(key) for key in STRUCTURE_KEYS),
+        'Index Name' in node,
+        tuple(get_structure_key(child) for child in node.get('Plans', [])),
+    )
+
+
+# Merges structurally identical subtrees into one, adding up their costs and rows so totals stay the same
+def merge_subtrees(nodes):
+    merged = {key: value for key, value in nodes[0].items() if key != 'Plans'}
+    merged['Group Count'] = sum(node.get('Group Count', 1) for node in nodes)
+    for key in ('Total Cost', 'Plan Rows'):
+        merged[key] = round(sum(node.get(key, 0) for node in nodes), 2)
+    for key in ('Shared Hit Blocks', 'Shared Read Blocks'):
+        if any(key in node for node in nodes):
+            merged[key] = sum(node.get(key, 0) for node in nodes)
+    merged['Startup Cost'] = min(node.get('Startup Cost', 0) for node in nodes)
+    for key in ('Relation Name', 'Index Name'):
+        names = [node[key] for node in nodes if key in node]
+        if len(set(names)) > 1:
+            merged[key] = f"{names[0]} .. {names[-1]}"
+    if 'Plans' in nodes[0]:
+        merged['Plans'] = [merge_subtrees([node['Plans'][position] for node in nodes]) for position in range(len(nodes[0]['Plans']))]
+    return merged
+
+
+# Returns a copy of a plan where identical children of Append and Merge Append nodes are one node with a 'Group Count'.
+# Groups are listed in the order their first member appears.
+def compress_plan(qep):
+    if 'Plan' in qep and isinstance(qep['Plan'], dict):
+        return {**qep, 'Plan': compress_plan(qep['Plan'])}
+    node = dict(qep)
+    if 'Plans' not in node:
+        return node
+    children = [compress_plan(child) for child in node['Plans']]
+    if node.get('Node Type') in GROUPED_NODE_TYPES:
+        groups = {}
+        for child in children:
+            groups.setdefault(get_structure_key(child), []).append(child)
+        children = [members[0] if len(members) == 1 else merge_subtrees(members) for members in groups.values()]
+    node['Plans'] = children
+    return node
+
+
+# Plan-level figures of a plan as returned by EXPLAIN (FORMAT JSON), keyed like SUMMARY_FIELDS. Figures the plan does not report are left out.
+def get_plan_summary(qep):
+    summary = {}
+    for name, (_, group, key) in SUMMARY_FIELDS.items():
+        values = qep if group is None else qep.get(group) or {}
+        if key in values:
+            summary[name] = values[key]
+    return summary
+
+
+# Plan tree stored as index arrays and columns instead of one dict per node.
+# Nodes are numbered breadth first from the root 0, so the children of a node are the contiguous range child_start .. child_start + child_count.
+class PlanTree:
+    def __init__(self):
+        self.parents = array('l')
+        self.child_start = array('l')
+        self.child_count = array('l')
+        self.group_counts = array('l')  # Number of identical subtrees a node stands for, see compress_plan
+        for name in TEXT_COLUMNS:
+            setattr(self, name, [])
+        for name in NUMERIC_COLUMNS:
+            setattr(self, name, array('d'))
+        self.summary = {}  # Plan-level figures, see get_plan_summary
+
+
+    # Builds the tree from a plan as returned by EXPLAIN (FORMAT JSON), either the top-level object or its 'Plan'
+    @classmethod
+    def from_plan(cls, qep):
+        tree = cls()
+        root = qep['Plan'] if 'Plan' in qep and isinstance(qep['Plan'], dict) else qep
+        if root is not qep:
+            tree.summary = get_plan_summary(qep)
+        queue = [(root, -1)]
+        position = 0
+        while position < len(queue):
+            node, parent = queue[position]
+            index = position
+            position += 1
+            tree.parents.append(parent)
+            tree.group_counts.append(node.get('Group Count', 1))
+            for name, key in TEXT_COLUMNS.items():
+                value = node.get(key)
+                # Node types and relation names repeat a lot, so they share one string each
+                getattr(tree, name).append(sys.intern(value) if isinstance(value, str) else None)
+            for name, key in NUMERIC_COLUMNS.items():
+                getattr(tree, name).append(float(node.get(key, 0) or 0))
+            sub_plans = node.get('Plans', [])
+            tree.child_start.append(len(queue))
+            tree.child_count.append(len(sub_plans))
+            queue.extend((sub_plan, index) for sub_plan in sub_plans)
+            # Visited nodes are dropped so only the arrays hold on to the plan contents
+            queue[index] = None
+        return tree
+
+
+    def __len__(self):
+        return len(self.parents)
+
+
+    def children(self, index):
+        return range(self.child_start[index], self.child_start[index] + self.child_count[index])
+
+
+    def edges(self):
+        return [(self.parents[index], index) for index in range(1, len(self))]
+
+
+    # Describes a node by its type and the relation or index it works on, e.g. Index Scan on orders using orders_pkey
+    def describe(self, index):
+        description = self.node_types[index] or "Unknown"
+        if self.relations[index]:
+            description += f" on {self.relations[index]}"
+        if self.indexes[index]:
+            description += f" using {self.indexes[index]}"
+        return description
+
+
+    # Text shown in the box of a node when the tree is drawn
+    def label(self, index):
+        lines = [self.node_types[index] or "Unknown"]
+        if self.group_counts[index] > 1:
+            lines[0] += f" (x{self.group_counts[index]})"
+        if self.join_types[index]:
+            lines.append(f"Join Type: {self.join_types[index]}")
+        if self.strategies[index]:
+            lines.append(f"Strategy: {self.strategies[index]}")
+        if self.relations[index]:
+            lines.append(f"Relation: {self.relations[index]}")
+        if self.indexes[index]:
+            lines.append(f"Index: {self.indexes[index]}")
+        lines.append(f"Cost: {self.startup_costs[index]:.2f}..{self.total_costs[index]:.2f}")
+        lines.append(f"Rows: {self.rows[index]:.0f}  Width: {self.widths[index]:.0f}")
+        if self.shared_hits[index] or self.shared_reads[index]:
+            lines.append(f"Buffers: hit={self.shared_hits[index]:.0f} read={self.shared_reads[index]:.0f}")
+        return "\n".join(lines)
+
+
+    def operators(self):
+        return [self.describe(index) for index in range(len(self))]
+
+
+    # Positions every node, the root at (xcenter, 0) and each level vert_gap lower, splitting the width of a node evenly among its children
+    def layout(self, width=1.0, vert_gap=0.2, xcenter=0.5):
+        xs, ys, widths = array('d', [0.0]) * len(self), array('d', [0.0]) * len(self), array('d', [0.0]) * len(self)
+        if not len(self):
+            return xs, ys
+        xs[0], widths[0] = xcenter, width
+        # Breadth first numbering means parents are always placed before their children
+        for index in range(len(self)):
+            count = self.child_count[index]
+            if not count:
+                continue
+            dx = widths[index] / count
+            left = xs[index] - widths[index] / 2 - dx / 2
+            for position, child in enumerate(self.children(index)):
+                xs[child] = left + (position + 1) * dx
+                ys[child] = ys[index] - vert_gap
+                widths[child] = dx
+        return xs, ys
+
+
+    # Walks two trees together and returns the nodes that differ. Subtrees under nodes of a different operator are not compared further.
+    def diff(self, other):
+        differences = []
+        pairs = [(0, 0)] if len(self) and len(other) else []
+        while pairs:
+            index, other_index = pairs.pop()
+            if self.describe(index) != other.describe(other_index):
+                differences.append({'index': index, 'other_index': other_index, 'operator': (self.describe(index), other.describe(other_index))})
+                continue
+            changes = {
+                name: (getattr(self, name)[index], getattr(other, name)[other_index])
+                for name in NUMERIC_COLUMNS if getattr(self, name)[index] != getattr(other, name)[other_index]
+            }
+            if changes or self.child_count[index] != other.child_count[other_index]:
+                differences.append({'index': index, 'other_index': other_index, **changes})
+            pairs.extend(reversed(list(zip(self.children(index), other.children(other_index)))))
+        return differences
+
+
+    # Exports the tree as a networkx DiGraph with integer node ids, importing networkx only when asked for
+    def to_networkx(self):
+        import networkx as nx
+        graph = nx.DiGraph()
+        for index in range(len(self)):
+            attributes = {key: getattr(self, name)[index] for name, key in {**TEXT_COLUMNS, **NUMERIC_COLUMNS}.items() if getattr(self, name)[index] is not None}
+            graph.add_node(index, **attributes)
+        graph.add_edges_from(self.edges())
+        return graph
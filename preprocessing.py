@@ -1,7 +1,14 @@
 import psycopg2
 from typing import TypedDict
-import networkx as nx
+from contextlib import contextmanager
+import threading
+import time
 import ast
+from knobs import KnobRegistry
+from replicas import ReplicaProbeExecutor
+from plantree import PlanTree, compress_plan, SUMMARY_FIELDS
+from explain import ExplainRequest, format_plan_text
+from probes import ProbeRunner, reset_transaction
 
 
 # Typed dictionary for details to connect to database
@@ -13,17 +20,127 @@ class LoginDetails(TypedDict):
     port: int
 
 
+# Keeps warm connections per database so that switching databases and starting workers avoids reconnecting
+class ConnectionPool:
+    def __init__(self, login_details: LoginDetails, max_idle_per_database=4, health_check_interval=30):
+        self.login_details = login_details
+        self.max_idle_per_database = max_idle_per_database
+        self.health_check_interval = health_check_interval  # Seconds a connection may sit idle before it is pinged
+        self.idle = {}  # Database name -> list of idle connections
+        self.last_used = {}  # id(connection) -> time it was last handed back
+        self.lock = threading.Lock()
+
+
+    # Opens a new connection to the given database
+    def open_connection(self, dbname):
+        return psycopg2.connect(
+            host=self.login_details["host"],
+            port=self.login_details["port"],
+            user=self.login_details["user"],
+            password=self.login_details["password"],
+            dbname=dbname
+        )
+
+
+    # Hands out a healthy idle connection to the database, opening a new one if none is available
+    def acquire(self, dbname):
+        while True:
+            with self.lock:
+                idle = self.idle.get(dbname)
+                connection = idle.pop() if idle else None
+            if connection is None:
+                return self.open_connection(dbname)
+            if self.is_healthy(connection):
+                return connection
+            self.discard(connection)
+
+
+    # Returns a connection to the pool, recycling it if it is broken or the pool is full
+    def release(self, connection, dbname):
+        if not self.reset(connection):
+            self.discard(connection)
+            return
+        with self.lock:
+            idle = self.idle.setdefault(dbname, [])
+            if len(idle) < self.max_idle_per_database:
+                idle.append(connection)
+                self.last_used[id(connection)] = time.monotonic()
+                return
+        self.discard(connection)
+
+
+    # Context manager that acquires a connection and always releases it
+    @contextmanager
+    def connection(self, dbname):
+        connection = self.acquire(dbname)
+        try:
+            yield connection
+        finally:
+            self.release(connection, dbname)
+
+
+    # Rolls back any open transaction. Returns False if the connection is no longer usable.
+    def reset(self, connection):
+        return reset_transaction(connection)
+
+
+    # Checks that a connection is usable, pinging the server if it has been idle for a while
+    def is_healthy(self, connection):
+        if not self.reset(connection):
+            return False
+        last_used = self.last_used.get(id(connection), 0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+    # Closes a connection and forgets about it
+    def discard(self, connection):
+        self.last_used.pop(id(connection), None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+    # Closes all idle connections
+    def close_all(self):
+        with self.lock:
+            connections = [connection for idle in self.idle.values() for connection in idle]
+            self.idle.clear()
+        for connection in connections:
+            self.discard(connection)
+
+
 # Handles connection to database and the logic to perform database operations
 class DbConnect:
-    def __init__(self, login_details: LoginDetails):
+    def __init__(self, login_details: LoginDetails, replicas=None):
         self.login_details = login_details
-        self.connection = psycopg2.connect(
-            host=login_details["host"],
-            port=login_details["port"],
-            user=login_details["user"],
-            password=login_details["password"],
-            dbname=login_details["dbname"]
-        )
+        self.pool = ConnectionPool(login_details)
+        self.connection = self.pool.acquire(login_details["dbname"])
+        self.dbname = login_details["dbname"]
+
+        # Interactive connection kept warm for each database that has been connected to
+        self.connections = {self.dbname: self.connection}
+
+        # Read-only replicas that what-if probes can be spread over, given as host and port with the primary's login otherwise
+        self.replica_pools = [ConnectionPool({**login_details, **replica}) for replica in replicas or []]
+        # Probe executor per database, kept so replicas are verified once per query rather than once per run
+        self.probe_executors = {}
+
+        # Cached schema metadata per database, and the list of databases in server
+        self.schema_cache = {}
+        self.database_cache = None
+        self.knob_registry = None
+
+        # Runs the QEP probe with timeouts and retries, so a stuck planner does not hang the interface
+        self.probe_runner = ProbeRunner()
 
 
     # Returns connection to database
@@ -31,40 +148,58 @@ class DbConnect:
         return self.connection
 
 
-    # Closes connection to database
+    # Closes all connections to the server
     def close_connection(self):
-        if self.connection:
-            self.connection.close()
+        for connection in self.connections.values():
+            self.pool.discard(connection)
+        self.connections.clear()
+        self.pool.close_all()
+        for pool in self.replica_pools:
+            pool.close_all()
+
+
+    # Context manager handing out a separate pooled connection to the connected database, e.g. for enumeration workers
+    @contextmanager
+    def worker_connection(self, database=None):
+        with self.pool.connection(database or self.dbname) as connection:
+            yield connection
+
+
+    # Executor that spreads what-if probes on the connected database over the replicas, None if there are none
+    def probe_executor(self):
+        if not self.replica_pools:
+            return None
+        if self.dbname not in self.probe_executors:
+            self.probe_executors[self.dbname] = ReplicaProbeExecutor(self.replica_pools, self.dbname)
+        return self.probe_executors[self.dbname]
 
 
     # Retrives all relations from database
-    def retrieve_tables(self):
-        cursor = self.connection.cursor()
-        query = """
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public'
-        """
-        cursor.execute(query)
-        tables = cursor.fetchall()
-        table_list = [table[0] for table in tables]
-        cursor.close()
-        return table_list
+    def retrieve_tables(self, refresh=False):
+        schema = self.retrieve_schema(refresh)
+        return list(schema["tables"])
 
     # Retrives all databases in server
-    def retrieve_databases(self):
-        cursor = self.connection.cursor()
-        query = """
-        SELECT datname 
-        FROM pg_database 
-        WHERE datistemplate = false
-        """
-        cursor.execute(query)
-        databases = cursor.fetchall()
-        database_list = [db[0] for db in databases]
-        cursor.close()
-        return database_list
+    def retrieve_databases(self, refresh=False):
+        if self.database_cache is None or refresh:
+            cursor = self.connection.cursor()
+            query = """
+            SELECT datname 
+            FROM pg_database 
+            WHERE datistemplate = false
+            """
+            cursor.execute(query)
+            databases = cursor.fetchall()
+            self.database_cache = [db[0] for db in databases]
+            cursor.close()
+        return list(self.database_cache)
     
+    # Retrieves the planner knobs available on the server
+    def retrieve_knobs(self, refresh=False):
+        if self.knob_registry is None or refresh:
+            self.knob_registry = KnobRegistry.detect(self.connection)
+        return self.knob_registry
+
     # Retrieves the name of the currently connected database
     def retrieve_current_database(self):
         cursor = self.connection.cursor()
@@ -74,73 +209,120 @@ class DbConnect:
         cursor.close()
         return current_db
     
+    # Switches the interactive connection to another database, reusing its warm connection if there is one
     def connect_to_database(self, database):
         # Ensure the connection exists
         if not self.connection:
             raise Exception("No existing connection to update. Initialize a connection first.")
 
+        connection = self.connections.get(database)
+        if connection is not None and not self.pool.is_healthy(connection):
+            self.pool.discard(connection)
+            connection = None
 
-        # Extract connection parameters
-        host = self.login_details['host']
-        user = self.login_details['user']
-        password = self.login_details['password']
-        port = self.login_details['port']
+        # Reconnect with the new database if no usable connection is kept for it
+        if connection is None:
+            connection = self.pool.acquire(database)
+            self.connections[database] = connection
 
-        # Close the existing connection
-        self.connection.close()
+        # The connection being switched away from stays warm and is only pinged again after it has idled
+        self.pool.last_used[id(self.connection)] = time.monotonic()
+        self.connection = connection
+        self.dbname = database
 
-        # Reconnect with the new database
-        try:
-            self.connection = psycopg2.connect(
-                host=host,
-                user=user,
-                password=password,
-                port=port,
-                dbname=database  # Use the new database name
-            )
 
-        except Exception as e:
-            raise e
+    # Retrives all columns from relation
+    def retrieve_columns(self, table):
+        schema = self.schema_cache.get(self.dbname)
+        if schema is None:
+            schema = self.retrieve_schema()
+        return list(schema["columns"].get(table, []))
 
 
+    #=========================================Logic to cache Schema Metadata=========================================#
+    # Returns cached tables and columns of the connected database, prefetching them if the catalog has changed
+    def retrieve_schema(self, refresh=False, schema_name="public"):
+        cached = self.schema_cache.get(self.dbname)
+        if cached is not None and not refresh and cached["schema"] == schema_name:
+            if cached["marker"] == self.retrieve_catalog_marker(schema_name):
+                return cached
+        return self.prefetch_schema(schema_name)
 
-    # Retrives all columns from relation
-    def retrieve_columns(self, table):
-        cursor = self.connection.cursor()
-        query = f"""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = '{table}'
-        ORDER BY ordinal_position
+
+    # Fetches all tables and their columns in a single catalog query and caches them for the connected database
+    def prefetch_schema(self, schema_name="public"):
+        query = """
+        SELECT c.relname, a.attname
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_catalog.pg_attribute a
+            ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        ORDER BY c.relname, a.attnum
         """
-        cursor.execute(query)
-        columns = cursor.fetchall()
-        column_list = [col[0] for col in columns]
-        cursor.close()
-        return column_list
+        with self.connection.cursor() as cursor:
+            marker = self._fetch_catalog_marker(cursor, schema_name)
+            cursor.execute(query, (schema_name,))
+            rows = cursor.fetchall()
+
+        tables, columns = [], {}
+        for table, column in rows:
+            if table not in columns:
+                tables.append(table)
+                columns[table] = []
+            if column is not None:
+                columns[table].append(column)
+
+        schema = {"schema": schema_name, "marker": marker, "tables": tables, "columns": columns}
+        self.schema_cache[self.dbname] = schema
+        return schema
+
+
+    # Returns a cheap marker that changes whenever relations or columns in the schema are created, altered or dropped
+    def retrieve_catalog_marker(self, schema_name="public"):
+        with self.connection.cursor() as cursor:
+            return self._fetch_catalog_marker(cursor, schema_name)
+
+
+    def _fetch_catalog_marker(self, cursor, schema_name):
+        query = """
+        SELECT count(*), coalesce(max(c.oid::bigint), 0), coalesce(max(c.xmin::text::bigint), 0),
+            (SELECT coalesce(max(a.xmin::text::bigint), 0)
+             FROM pg_catalog.pg_attribute a
+             JOIN pg_catalog.pg_class ac ON ac.oid = a.attrelid
+             JOIN pg_catalog.pg_namespace an ON an.oid = ac.relnamespace
+             WHERE an.nspname = %s AND a.attnum > 0)
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s
+        """
+        cursor.execute(query, (schema_name, schema_name))
+        return tuple(cursor.fetchone())
+
+
+    # Drops cached schema metadata for one database, or for all databases if none is given
+    def invalidate_schema_cache(self, database=None):
+        if database is None:
+            self.schema_cache.clear()
+        else:
+            self.schema_cache.pop(database, None)
+    #================================================================================================================#
     
 
     # Retrives QEP given given query. Return QEP format varies depending on value of json.
-    def retrieve_qep(self, query, json=False):
-        cursor = self.connection.cursor()
-        try:
-            if json:
-                explain_query = f"EXPLAIN (FORMAT JSON) {query}"
-            else:
-                explain_query = f"EXPLAIN {query}"         
-            cursor.execute(explain_query)
-            result = cursor.fetchall()
-            if json:
-                qep = result[0][0]
-                qep_text = str(qep)[1:-1]  # To remove square brackets
-            else:
-                qep_text = "\n".join(row[0] for row in result)
-        except Exception as e:
-            cursor.execute("ROLLBACK;")
-            raise e
-        finally:
-            cursor.close()
-        return qep_text
+    # The plan is fetched once as JSON with the buffer and settings detail the server supports, and the text format is rendered from it.
+    def retrieve_qep(self, query, json=False, options=()):
+        request = ExplainRequest.with_details(query, options, self.retrieve_knobs().server_version)
+        # Calibrated cost parameters and the timeouts only apply inside a transaction that is rolled back afterwards
+        setup_queries = self.probe_runner.timeout_queries('ANALYZE' in request.options) + self.retrieve_knobs().session_queries()
+        qep = self.probe_runner.run(self.connection, "BEGIN;" + "".join(setup_queries) + request.statement())[0][0][0]
+        return str(qep) if json else format_plan_text(qep)
+
+
+    # Renders a plan from EXPLAIN (FORMAT JSON) as EXPLAIN would print it in text
+    def generate_text_qep(self, qep_json):
+        qep_dict = ast.literal_eval(qep_json) if isinstance(qep_json, str) else qep_json
+        return format_plan_text(qep_dict)
 
 
     #========================================Logic to generate Procedural QEP========================================#
@@ -178,6 +360,8 @@ class DbConnect:
                 nodes['Child'][childIndex]['Table'] = plan['Relation Name']
             if 'Index Name' in plan:
                 nodes['Child'][childIndex]['Index'] = plan['Index Name']
+            if 'Group Count' in plan:
+                nodes['Child'][childIndex]['Count'] = plan['Group Count']
 
 
     def printTree(self, tree):
@@ -204,6 +388,10 @@ class DbConnect:
             involved_tables = self.get_all_relations(branch)
             if involved_tables:
                 current_output += " on " + " and ".join(involved_tables)
+
+        # Grouped identical subplans show how many they stand for
+        if 'Count' in branch:
+            current_output += f" x{branch['Count']}"
         
         # Add parent information, including table names, if available
         if childOf:
@@ -239,17 +427,22 @@ class DbConnect:
         return list(set(tables))
 
 
-    def generate_procedural_qep(self, qep_json):
+    # Identical subplans under Append and Merge Append nodes are shown once with their count if compress is set
+    def generate_procedural_qep(self, qep_json, compress=False):
         qep_dict = ast.literal_eval(qep_json)
+        if compress:
+            qep_dict = compress_plan(qep_dict)
         nodes = self.parse_plan(qep_dict)
         procedural_qep = self.printTree(nodes)
         return procedural_qep
     #================================================================================================================#
 
     #=======================================Logic to generate Cost Calculation=======================================#
-    def explain_cost(self, qep_json):
-        # Parse the JSON to a dictionary
+    def explain_cost(self, qep_json, compress=False):
+        # Parse the JSON to a dictionary, grouping identical subplans with their summed cost if compress is set
         qep_dict = ast.literal_eval(qep_json)
+        if compress:
+            qep_dict = compress_plan(qep_dict)
         
         # Parse the plan into a structured tree
         nodes = self.parse_plan_with_costs(qep_dict)
@@ -294,6 +487,8 @@ class DbConnect:
                 nodes['Child'][child_index]['Table'] = plan['Relation Name']
             if 'Index Name' in plan:
                 nodes['Child'][child_index]['Index'] = plan['Index Name']
+            if 'Group Count' in plan:
+                nodes['Child'][child_index]['Count'] = plan['Group Count']
 
 
     def print_cost_tree(self, tree):
@@ -330,6 +525,8 @@ class DbConnect:
             involved_tables = self.get_all_relations(branch)
             if involved_tables:
                 current_output += " on " + " and ".join(involved_tables)
+        if 'Count' in branch:
+            current_output += f" x{branch['Count']}"
 
         # Close parentheses and add `+`
         current_output += ") +\n"
@@ -360,66 +557,34 @@ class DbConnect:
             result += "Both QEP and AQP have the same cost and are equally cost-effective."
         
         return result
-    #================================================================================================================#
-    
-    #===========================================Logic to generate QEP Tree===========================================#
-    def hierarchical_layout(self, G, root=None, width=1.0, vert_gap=0.2, vert_loc=0, xcenter=0.5):
-        pos = self._hierarchy_pos(G, root, width, vert_gap, vert_loc, xcenter)
-        return pos
 
 
-    def _hierarchy_pos(self, G, node, width=1.0, vert_gap=0.2, vert_loc=0, xcenter=0.5, pos=None, parent=None, parsed=[]):
-        if pos is None:
-            pos = {node: (xcenter, vert_loc)}
-        else:
-            pos[node] = (xcenter, vert_loc)
-        
-        children = list(G.successors(node))
-        if not isinstance(G, nx.DiGraph) and parent is not None:
-            children.remove(parent)  # Remove parent for undirected graphs.
+    # Compares the buffers and memory of two plans explained with BUFFERS or MEMORY. Returns an empty string if neither reports any.
+    def compare_io(self, qep_json, aqp_json):
+        qep_tree, aqp_tree = self.generate_plan_tree(qep_json), self.generate_plan_tree(aqp_json)
+        figures = [
+            ("Shared buffers hit", int(sum(qep_tree.shared_hits)), int(sum(aqp_tree.shared_hits))),
+            ("Shared buffers read", int(sum(qep_tree.shared_reads)), int(sum(aqp_tree.shared_reads))),
+        ]
+        figures += [(label, qep_tree.summary.get(name), aqp_tree.summary.get(name)) for name, (label, _, _) in SUMMARY_FIELDS.items()]
 
-        if len(children) != 0:
-            dx = width / len(children) 
-            nextx = xcenter - width / 2 - dx / 2
-            for child in children:
-                nextx += dx
-                pos = self._hierarchy_pos(G, child, width=dx, vert_gap=vert_gap, vert_loc=vert_loc-vert_gap, xcenter=nextx, pos=pos, parent=node, parsed=parsed)
-        return pos
+        result = ""
+        for label, qep_value, aqp_value in figures:
+            if qep_value or aqp_value:
+                result += f"{label}: QEP {qep_value if qep_value is not None else '-'}, AQP {aqp_value if aqp_value is not None else '-'}\n"
+        return result
+    #================================================================================================================#
+    
+    #===========================================Logic to generate QEP Tree===========================================#
+    # Builds the compact tree used to lay out, draw and compare a plan, with identical subplans grouped if compress is set
+    def generate_plan_tree(self, qep_json, compress=False):
+        qep_dict = ast.literal_eval(qep_json) if isinstance(qep_json, str) else qep_json
+        return PlanTree.from_plan(compress_plan(qep_dict) if compress else qep_dict)
 
 
+    # Exports a plan as a networkx DiGraph, for analysis outside the interface. Returns the graph and the id of its root.
     def generate_qep_graph(self, qep_json):
-        # Retrieve and parse QEP JSON data
-        qep_dict = ast.literal_eval(qep_json)
-        
-        # Initialize directed graph
-        graph = nx.DiGraph()
-        
-        # Capture the root node ID
-        root_node_id = self.recursively_add_nodes(graph, qep_dict["Plan"])
-        
-        # Return both the graph and root_node_id
-        return graph, root_node_id
-
-
-    def recursively_add_nodes(self, graph, node, parent=None):
-        # Generate a unique node ID
-        node_id = node.get("Node Type", "Unknown") + "_" + str(id(node))
-        
-        # Filter out the 'Plans' attribute and add other attributes to the node
-        node_attributes = {k: v for k, v in node.items() if k != "Plans"}
-        graph.add_node(node_id, **node_attributes)
-        
-        # Add an edge if this is not the root node
-        if parent:
-            graph.add_edge(parent, node_id)
-        
-        # Recursively add child nodes if they exist
-        for sub_plan in node.get("Plans", []):
-            self.recursively_add_nodes(graph, sub_plan, node_id)
-        
-        # Return the root node ID when the function is called with `parent=None`
-        if parent is None:
-            return node_id
+        return self.generate_plan_tree(qep_json).to_networkx(), 0
     #================================================================================================================#
 
 
@@ -0,0 +1,144 @@
+import psycopg2
+from psycopg2 import extensions
+import collections
+import threading
+import time
+
+# SQLSTATE codes and classes of errors a probe is retried for, as another attempt can succeed:
+# lock not available (lock_timeout), serialization failure, deadlock and insufficient resources
+RETRYABLE_SQLSTATES = ('55P03', '40001', '40P01', '53')
+
+# SQLSTATE classes and codes after which the connection cannot be used any more: connection exceptions and server shutdown
+FATAL_SQLSTATES = ('08', '57P01', '57P02', '57P03')
+
+# SQLSTATE of a statement cancelled by statement_timeout
+TIMEOUT_SQLSTATE = '57014'
+
+
+# Raised when the connection a probe ran on broke, so probing on that connection should stop
+class FatalProbeError(RuntimeError):
+    pass
+
+
+# Rolls back any open transaction. Returns False if the connection is no longer usable.
+def reset_transaction(connection):
+    if connection.closed:
+        return False
+    try:
+        status = connection.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+# Classifies the error of a probe as 'retryable', 'timeout', 'fatal', or 'failed' for errors the configuration itself causes
+def classify_error(error, connection):
+    code = getattr(error, 'pgcode', None) or ''
+    if connection.closed or code.startswith(FATAL_SQLSTATES):
+        return 'fatal'
+    # Errors without a SQLSTATE from the driver itself mean the connection was lost
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not code:
+        return 'fatal'
+    if code == TIMEOUT_SQLSTATE:
+        return 'timeout'
+    if code.startswith(RETRYABLE_SQLSTATES):
+        return 'retryable'
+    return 'failed'
+
+
+# Runs probes bounded by statement_timeout and lock_timeout, retries errors another attempt can get past and always rolls
+# the transaction of a probe back. Counts the outcome of every probe for display; one runner can be shared between threads.
+class ProbeRunner:
+    def __init__(self, statement_timeout=10000, lock_timeout=2000, retries=2, backoff=0.05, history_size=1000):
+        self.statement_timeout = statement_timeout  # Milliseconds a probe may take to plan, 0 for no limit
+        self.lock_timeout = lock_timeout  # Milliseconds a probe waits for a lock, e.g. on a table being altered
+        self.retries = retries  # Times a probe is run again after a retryable error
+        self.backoff = backoff  # Seconds waited before the first retry, doubled for every retry after it
+        self.outcomes = collections.Counter()  # Outcome -> number of probes: ok, retried, timeout, failed or fatal
+        self.history = collections.deque(maxlen=history_size)  # Outcome, attempts, time and error of the latest probes
+        self.lock = threading.Lock()
+
+
+    # SET LOCAL statements that bound a probe until its transaction ends. Analysed probes execute the query, so its run time is not limited.
+    def timeout_queries(self, analyze=False):
+        queries = [f"SET LOCAL lock_timeout TO {int(self.lock_timeout)};"]
+        if not analyze:
+            queries.append(f"SET LOCAL statement_timeout TO {int(self.statement_timeout)};")
+        return queries
+
+
+    # Runs a probe, statements starting with BEGIN, and returns the rows of the last statement, or [] if it returns none.
+    # Raises FatalProbeError if the connection broke, and the error of the last attempt for other errors.
+    def run(self, connection, query):
+        def work(cursor):
+            cursor.execute(query)
+            return cursor.fetchall() if cursor.description is not None else []
+        return self.call(connection, work)
+
+
+    # Runs work(cursor) in a transaction started with the timeouts, for probes that take several statements, and returns its result
+    def run_transaction(self, connection, work, analyze=False):
+        def transaction(cursor):
+            cursor.execute("BEGIN;" + "".join(self.timeout_queries(analyze)))
+            return work(cursor)
+        return self.call(connection, transaction)
+
+
+    # Calls work(cursor), retrying errors another attempt can get past, and records the outcome
+    def call(self, connection, work):
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                rows = self.execute(connection, work)
+            except Exception as e:
+                outcome = classify_error(e, connection)
+                if outcome == 'retryable' and attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                self.record('failed' if outcome == 'retryable' else outcome, attempt + 1, start, e)
+                if outcome == 'fatal':
+                    raise FatalProbeError(str(e)) from e
+                raise
+            self.record('retried' if attempt else 'ok', attempt + 1, start)
+            return rows
+
+
+    # Calls work once, leaving the connection outside any transaction whether it succeeded or not
+    def execute(self, connection, work):
+        try:
+            with connection.cursor() as cursor:
+                return work(cursor)
+        finally:
+            reset_transaction(connection)
+
+
+    def record(self, outcome, attempts, start, error=None):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.history.append({
+                'outcome': outcome,
+                'attempts': attempts,
+                'time': (time.perf_counter() - start) * 1000,
+                'error': str(error).strip() if error is not None else None,
+            })
+
+
+    # Formats the outcomes of the probes run so far, with the slowest probe and the latest error
+    def parse_outcomes(self):
+        with self.lock:
+            outcomes, history = dict(self.outcomes), list(self.history)
+        output_text = (
+            f"Probes: {sum(outcomes.values())} run, {outcomes.get('ok', 0)} planned at once, {outcomes.get('retried', 0)} after a retry, "
+            f"{outcomes.get('timeout', 0)} timed out, {outcomes.get('failed', 0)} failed, {outcomes.get('fatal', 0)} lost their connection.\n"
+        )
+        if history:
+            slowest = max(history, key=lambda probe: probe['time'])
+            output_text += f"Slowest probe took {slowest['time']:.1f} ms in {slowest['attempts']} attempt(s).\n"
+        errors = [probe['error'] for probe in history if probe['error']]
+        if errors:
+            output_text += f"Latest error: {errors[-1].splitlines()[0]}\n"
+        return output_text
@@ -0,0 +1,145 @@
+import collections
+import copy
+import threading
+from probes import FatalProbeError
+
+# Number of queries whose replica verification is kept
+VERIFIED_CACHE_SIZE = 100
+
+
+# Shards what-if probes across read-only replicas, with work stealing between workers and retry on another worker on failure
+class ReplicaProbeExecutor:
+    def __init__(self, pools, dbname, workers_per_replica=2, retries=2):
+        self.pools = pools  # ConnectionPool per replica, e.g. DbConnect.replica_pools
+        self.dbname = dbname
+        self.workers_per_replica = workers_per_replica
+        self.retries = retries  # Times a probe is handed to another worker after its connection failed
+        self.verified = collections.OrderedDict()  # (Query, session settings) -> pools whose plan matched the primary and the warnings of the check
+        self.warnings = []  # Replicas skipped or failed since the warnings were last taken, for display
+        self.lock = threading.Lock()
+
+
+    #============================================Logic to verify replicas============================================#
+    # Returns the pools of the replicas that plan the query like the primary, checking each replica once per query and session settings.
+    # The warnings of a check are reported again whenever its result is reused.
+    def verify_replicas(self, query_modifier, inputQuery):
+        key = (inputQuery, tuple(query_modifier.knobs.session_queries()))
+        with self.lock:
+            if key in self.verified:
+                self.verified.move_to_end(key)
+                consistent, warnings = self.verified[key]
+                self.warnings.extend(warnings)
+                return consistent
+        primary_fingerprint = query_modifier.fingerprint_plan(query_modifier.explain_json(inputQuery, []))
+
+        consistent, warnings = [], []
+        for pool in self.pools:
+            try:
+                with pool.connection(self.dbname) as connection:
+                    replica_fingerprint = query_modifier.fingerprint_plan(self.get_prober(query_modifier, connection).explain_json(inputQuery, []))
+            except Exception as e:
+                warnings.append(f"Replica {self.get_name(pool)} is unavailable: {e}")
+                continue
+            # Replicas with different statistics or settings would report plans the primary never produces
+            if replica_fingerprint == primary_fingerprint:
+                consistent.append(pool)
+            else:
+                warnings.append(f"Replica {self.get_name(pool)} plans the query differently from the primary, not used.")
+        with self.lock:
+            self.verified[key] = (consistent, warnings)
+            if len(self.verified) > VERIFIED_CACHE_SIZE:
+                self.verified.popitem(last=False)
+            self.warnings.extend(warnings)
+        return consistent
+
+
+    def get_name(self, pool):
+        return f"{pool.login_details['host']}:{pool.login_details['port']}"
+
+
+    # Returns the warnings collected since the last call and clears them
+    def take_warnings(self):
+        with self.lock:
+            warnings, self.warnings = self.warnings, []
+        return warnings
+
+
+    # Copy of the query modifier that probes on another connection but records into the same probe statistics
+    def get_prober(self, query_modifier, connection):
+        prober = copy.copy(query_modifier)
+        prober.connection = connection
+        prober.probe_executor = None
+        return prober
+    #================================================================================================================#
+
+    #==============================================Logic to shard probes=============================================#
+    # Probes every configuration and returns the parsed plans in the order of configs, None where the planner failed.
+    # Probes that no replica could run are run on the primary connection of the query modifier.
+    def probe_plans(self, query_modifier, inputQuery, configs):
+        pools = self.verify_replicas(query_modifier, inputQuery)
+        if not pools:
+            return [query_modifier.probe_plan(inputQuery, config) for config in configs]
+
+        results = [None] * len(configs)
+        # Each worker starts with its own share of (index, attempts) work items and steals from the others when done.
+        # Items left in the queue of a worker that stopped are stolen by the others.
+        queues = [collections.deque() for _ in range(len(pools) * self.workers_per_replica)]
+        for idx in range(len(configs)):
+            queues[idx % len(queues)].append((idx, 0))
+        failed = []
+
+        def work(worker, pool):
+            try:
+                with pool.connection(self.dbname) as connection:
+                    prober = self.get_prober(query_modifier, connection)
+                    while True:
+                        item = self.next_item(queues, worker)
+                        if item is None:
+                            return
+                        idx, attempts = item
+                        # probe_plan returns None for planner errors, a fatal error means the replica failed
+                        try:
+                            results[idx] = prober.probe_plan(inputQuery, configs[idx])
+                        except FatalProbeError:
+                            self.retry_item(queues, failed, worker, idx, attempts)
+                            raise
+            except Exception as e:
+                with self.lock:
+                    self.warnings.append(f"Replica {self.get_name(pool)} failed: {e}")
+
+        threads = [
+            threading.Thread(target=work, args=(worker, pools[worker // self.workers_per_replica]), daemon=True)
+            for worker in range(len(queues))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Configurations left over once the replicas are exhausted are probed on the primary
+        leftovers = failed + [idx for queue in queues for idx, _ in queue]
+        for idx in sorted(set(leftovers)):
+            results[idx] = query_modifier.probe_plan(inputQuery, configs[idx])
+        return results
+
+
+    # Takes the next item of a worker's own queue, or steals the last item of the longest other queue
+    def next_item(self, queues, worker):
+        with self.lock:
+            if queues[worker]:
+                return queues[worker].popleft()
+            victim = max(range(len(queues)), key=lambda other: len(queues[other]))
+            if queues[victim]:
+                return queues[victim].pop()
+            return None
+
+
+    # Hands a failed item to another worker, or gives it up to the primary once it ran out of retries
+    def retry_item(self, queues, failed, worker, idx, attempts):
+        with self.lock:
+            others = [other for other in range(len(queues)) if other != worker]
+            if attempts < self.retries and others:
+                queues[min(others, key=lambda other: len(queues[other]))].append((idx, attempts + 1))
+            else:
+                failed.append(idx)
+    #================================================================================================================#
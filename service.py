@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import collections
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from knobs import KnobRegistry, get_parameter, validate_cost_settings
+from planstore import PlanStore
+from probes import ProbeRunner
+from preprocessing import DbConnect
+from whatif import QueryModifier
+
+ENDPOINTS = ('plan', 'enumerate', 'compare', 'sweep')
+MAX_BODY_SIZE = 1024 * 1024
+MAX_SWEEP_SAMPLES = 64  # Grid points of a sweep, each of which can be bisected further
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# Serves what-if analyses over HTTP/JSON to several clients, sharing one connection pool, one plan store and one result cache.
+# Requests identical to one still running wait for its result instead of probing again.
+class WhatIfService:
+    def __init__(self, dbconnect, workers=8, cache_size=256, cache_ttl=300, config_cache_size=4096):
+        self.dbconnect = dbconnect
+        self.executor = ThreadPoolExecutor(max_workers=workers)  # Probes block on psycopg2, so they run on threads
+        self.plan_stores = {}  # Database name -> store of the plans probed on it
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl  # Seconds a result is served from the cache, as plans change with statistics
+        self.results = collections.OrderedDict()  # Request key -> (time, result), least recently used first
+        self.in_flight = {}  # Request key -> future of the running request
+        self.knob_registries = {}  # Database name -> knobs detected on it
+        self.config_cache_size = config_cache_size  # Configurations remembered, an enumeration remembers one per plan found
+        self.config_fingerprints = collections.OrderedDict()  # (database, query, settings, configuration) -> (time, fingerprint of its plan)
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.probe_runner = ProbeRunner()  # Shared by all requests, so the outcomes of their probes are counted together
+
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for plan_store in self.plan_stores.values():
+            plan_store.close()
+        self.dbconnect.close_connection()
+
+
+    #=============================================Logic to share results=============================================#
+    # Identical requests have the same key, whatever the order of their JSON fields
+    def get_request_key(self, endpoint, request):
+        return hashlib.sha1(json.dumps([endpoint, request], sort_keys=True).encode()).hexdigest()
+
+
+    # Answers a request from the cache, from an identical request in flight, or by running it on a worker thread
+    async def handle_request(self, endpoint, request):
+        self.stats['requests'] += 1
+        # Malformed requests are rejected here, before they take a worker thread
+        self.parse_request(request)
+        if endpoint == 'sweep':
+            self.parse_sweep(request)
+        key = self.get_request_key(endpoint, request)
+
+        cached = self.get_cached(self.results, key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.in_flight[key] = future
+        try:
+            result = await loop.run_in_executor(self.executor, getattr(self, f"run_{endpoint}"), request)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Marks the error as seen when no other request was waiting for it
+            raise
+        finally:
+            del self.in_flight[key]
+
+        self.put_cached(self.results, key, result, self.cache_size)
+        future.set_result(result)
+        return result
+
+
+    # Value cached under a key if it is younger than the TTL, marking it as recently used. Returns None otherwise.
+    def get_cached(self, cache, key):
+        with self.lock:
+            cached = cache.get(key)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[0] >= self.cache_ttl:
+                del cache[key]
+                return None
+            cache.move_to_end(key)
+            return cached[1]
+
+
+    # Caches a value, dropping the least recently used values beyond the size
+    def put_cached(self, cache, key, value, size):
+        with self.lock:
+            cache[key] = (time.monotonic(), value)
+            cache.move_to_end(key)
+            while len(cache) > size:
+                cache.popitem(last=False)
+    #================================================================================================================#
+
+    #==============================================Logic to run requests=============================================#
+    # Query modifier on a pooled connection, with the knobs of the database and the cost settings of the request
+    def get_query_modifier(self, connection, dbname, request):
+        with self.lock:
+            if dbname not in self.knob_registries:
+                self.knob_registries[dbname] = KnobRegistry.detect(connection)
+            if dbname not in self.plan_stores:
+                self.plan_stores[dbname] = PlanStore()
+        knobs = copy.copy(self.knob_registries[dbname])
+        # Settings are written into SET statements, so only known cost parameters with numeric values are accepted
+        knobs.cost_settings = validate_cost_settings(request.get('settings') or {})
+        query_modifier = QueryModifier(connection, knobs)
+        query_modifier.plan_store = self.plan_stores[dbname]
+        query_modifier.probe_runner = self.probe_runner
+        return query_modifier
+
+
+    # Reads the fields every request has, raising ValueError for a malformed request
+    def parse_request(self, request):
+        query = request.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("'query' must be a non-empty string")
+        return request.get('dbname') or self.dbconnect.dbname, query
+
+
+    # Reads the configuration of a request, the default one if none is given, raising ValueError unless it has a boolean per knob
+    def parse_configs(self, query_modifier, request):
+        configs = request.get('configs') or query_modifier.knobs.default_configs()
+        if not isinstance(configs, list) or len(configs) != len(query_modifier.knobs):
+            raise ValueError(f"'configs' must have {len(query_modifier.knobs)} values")
+        if not all(value in (True, False) for value in configs):
+            raise ValueError("'configs' values must be true or false")
+        return [bool(value) for value in configs]
+
+
+    # Reads the parameter and number of samples of a sweep request, raising ValueError for unknown parameters and bad sample counts
+    def parse_sweep(self, request):
+        try:
+            parameter = get_parameter(request.get('parameter'))
+        except StopIteration:
+            raise ValueError(f"Unknown parameter {request.get('parameter')!r}")
+        samples = request.get('samples', 8)
+        if isinstance(samples, bool) or not isinstance(samples, int) or not 2 <= samples <= MAX_SWEEP_SAMPLES:
+            raise ValueError(f"'samples' must be an integer from 2 to {MAX_SWEEP_SAMPLES}")
+        return parameter, samples
+
+
+    # Key under which the plan of a configuration is remembered, so enumerated plans are served without probing again
+    def get_config_key(self, dbname, query, request, configs):
+        return (dbname, query.strip(), json.dumps(request.get('settings') or {}, sort_keys=True), tuple(configs))
+
+
+    # Plans the query under a configuration, the default one if none is given
+    def run_plan(self, request):
+        dbname, query = self.parse_request(request)
+        with self.dbconnect.worker_connection(dbname) as connection:
+            query_modifier = self.get_query_modifier(connection, dbname, request)
+            configs = self.parse_configs(query_modifier, request)
+
+            fingerprint = self.get_cached(self.config_fingerprints, self.get_config_key(dbname, query, request, configs))
+            plan = query_modifier.load_plan(query, configs) if fingerprint else None
+            if plan is None:
+                plan = query_modifier.explain_json(query, query_modifier.knobs.settings_queries(configs), ['SUMMARY'])
+                fingerprint = query_modifier.store_plan(query, configs, plan)
+                self.put_cached(self.config_fingerprints, self.get_config_key(dbname, query, request, configs), fingerprint, self.config_cache_size)
+        return {'plan': plan, 'fingerprint': fingerprint, 'cost': plan['Plan'].get('Total Cost'), 'planning_time': plan.get('Planning Time')}
+
+
+    # Finds a configuration for every distinct plan of the query
+    def run_enumerate(self, request):
+        dbname, query = self.parse_request(request)
+        with self.dbconnect.worker_connection(dbname) as connection:
+            query_modifier = self.get_query_modifier(connection, dbname, request)
+            qep = query_modifier.explain_json(query, [], ['SUMMARY'])
+            plans = query_modifier.retrieve_all_plans(query, qep)
+        for plan in plans:
+            self.put_cached(self.config_fingerprints, self.get_config_key(dbname, query, request, plan['config']), plan['fingerprint'], self.config_cache_size)
+        return {'knobs': query_modifier.knobs.names(), 'plans': plans}
+
+
+    # Compares the cost of the QEP with the plan under a configuration
+    def run_compare(self, request):
+        qep = self.run_plan({**request, 'configs': None})
+        aqp = self.run_plan(request)
+        _, qep_cost = self.dbconnect.explain_cost(str(qep['plan']))
+        _, aqp_cost = self.dbconnect.explain_cost(str(aqp['plan']))
+        return {
+            'qep_fingerprint': qep['fingerprint'],
+            'aqp_fingerprint': aqp['fingerprint'],
+            'qep_cost': qep_cost,
+            'aqp_cost': aqp_cost,
+            'comparison': self.dbconnect.compare_cost(qep_cost, aqp_cost),
+        }
+
+
+    # Sweeps a numeric parameter, given by the name of its setting, under a configuration
+    def run_sweep(self, request):
+        dbname, query = self.parse_request(request)
+        parameter, samples = self.parse_sweep(request)
+        with self.dbconnect.worker_connection(dbname) as connection:
+            query_modifier = self.get_query_modifier(connection, dbname, request)
+            configs = self.parse_configs(query_modifier, request)
+            sweep = query_modifier.sweep_parameter(query, parameter, configs, samples)
+        return {**sweep, 'parameter': parameter.name}
+    #================================================================================================================#
+
+    #===============================================Logic to serve HTTP==============================================#
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving what-if analyses on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+    # Reads one HTTP request, answers it with JSON and closes the connection
+    async def handle_connection(self, reader, writer):
+        try:
+            status, response = await self.handle_http(reader)
+        except Exception as e:
+            status, response = 500, {'error': str(e)}
+        body = json.dumps(response, default=str).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+    # Routes GET /health and POST /<endpoint>. Returns the status code and the JSON response.
+    async def handle_http(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return 400, {'error': "Malformed request line"}
+        method, path = request_line[0], request_line[1].split("?")[0].strip("/")
+
+        if path == "health":
+            return 200, {'status': "ok", **self.stats, 'probes': dict(self.probe_runner.outcomes)}
+        if path not in ENDPOINTS:
+            return 404, {'error': f"Unknown endpoint /{path}"}
+        if method != "POST":
+            return 405, {'error': "Use POST"}
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            return 413, {'error': "Request too large"}
+        try:
+            request = json.loads(await reader.readexactly(length)) if length else {}
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            return 200, await self.handle_request(path, request)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+    #================================================================================================================#
+
+
+# Client of a running WhatIfService, e.g. for the interface to enumerate through a shared service instead of its own connection
+class ServiceClient:
+    def __init__(self, url, timeout=600):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+
+    # Posts a request and returns the JSON response, raising RuntimeError with the message of the service on failure
+    def request(self, endpoint, payload):
+        request = urllib.request.Request(
+            f"{self.url}/{endpoint}", data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read() or b"{}").get('error', str(e)))
+
+
+    def plan(self, dbname, query, configs=None, settings=None):
+        return self.request("plan", {'dbname': dbname, 'query': query, 'configs': configs, 'settings': settings or {}})
+
+
+    def enumerate(self, dbname, query, settings=None):
+        return self.request("enumerate", {'dbname': dbname, 'query': query, 'settings': settings or {}})
+
+
+    def compare(self, dbname, query, configs, settings=None):
+        return self.request("compare", {'dbname': dbname, 'query': query, 'configs': configs, 'settings': settings or {}})
+
+
+    # Sweeps a parameter, returning the sweep with the parameter looked up again so it can be formatted and plotted locally
+    def sweep(self, dbname, query, parameter, configs=None, settings=None, samples=8):
+        sweep = self.request("sweep", {'dbname': dbname, 'query': query, 'parameter': parameter.name, 'configs': configs, 'settings': settings or {}, 'samples': samples})
+        return {**sweep, 'parameter': get_parameter(sweep['parameter'])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve what-if analyses to several clients over HTTP/JSON.")
+    parser.add_argument("--listen", default="127.0.0.1", help="Address to serve on, local only by default")
+    parser.add_argument("--listen-port", type=int, default=8765)
+    parser.add_argument("--host", default=os.environ.get("PGHOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PGPORT", 5432)))
+    parser.add_argument("--user", default=os.environ.get("PGUSER", "postgres"))
+    parser.add_argument("--dbname", default=os.environ.get("PGDATABASE", "postgres"))
+    parser.add_argument("--workers", type=int, default=8, help="Requests planned at the same time")
+    args = parser.parse_args(argv)
+
+    # The password comes from the environment or ~/.pgpass so it does not show up in the process list
+    login_details = {"host": args.host, "port": args.port, "user": args.user, "password": os.environ.get("PGPASSWORD"), "dbname": args.dbname}
+    service = WhatIfService(DbConnect(login_details), args.workers)
+    service.dbconnect.pool.max_idle_per_database = args.workers
+    try:
+        asyncio.run(service.serve(args.listen, args.listen_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
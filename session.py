@@ -0,0 +1,111 @@
+import json
+import struct
+import zlib
+from array import array
+
+# Files start with this marker so other files are rejected before anything is decompressed
+SESSION_MAGIC = b"QEPSESS1"
+SESSION_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+
+# Every frame in the compressed stream is its length followed by its bytes
+FRAME_LENGTH = struct.Struct(">I")
+
+
+# Writes an analysis session to a file as one zlib stream of frames: a JSON header, then per plan a JSON summary, the
+# plan body with its procedural and cost text as JSON, and its tree layout as raw doubles. Plans are written as they
+# are produced, so a generator keeps only one plan in memory.
+def save_session(path, header, plans):
+    compressor = zlib.compressobj(6)
+    with open(path, "wb") as file:
+        file.write(SESSION_MAGIC)
+
+        def write_frame(data):
+            file.write(compressor.compress(FRAME_LENGTH.pack(len(data)) + data))
+
+        write_frame(json.dumps({**header, 'version': SESSION_VERSION}, separators=(',', ':')).encode())
+        count = 0
+        for plan in plans:
+            summary = {key: plan.get(key) for key in ('label', 'fingerprint', 'config', 'cost', 'planning_time')}
+            body = {key: plan.get(key) for key in ('plan', 'procedural', 'procedural_expanded', 'cost_explanation', 'cost_explanation_expanded')}
+            xs, ys = plan['layout']
+            write_frame(json.dumps(summary, separators=(',', ':')).encode())
+            write_frame(json.dumps(body, separators=(',', ':')).encode())
+            write_frame(xs.tobytes() + ys.tobytes())
+            count += 1
+        file.write(compressor.flush())
+    return count
+
+
+# Reads a session written by save_session. The header is read on open; plans are decompressed in chunks while iterating
+# and their bodies are only parsed when asked for, so large sessions open quickly.
+class SessionReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if self.file.read(len(SESSION_MAGIC)) != SESSION_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a saved session")
+        self.decompressor = zlib.decompressobj()
+        self.buffer = bytearray()
+        header = self.read_frame()
+        self.header = json.loads(header) if header is not None else {}
+        if self.header.get('version') != SESSION_VERSION:
+            self.file.close()
+            raise ValueError(f"{path} was saved by an unsupported version")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        self.file.close()
+
+
+    # Decompresses chunks until the buffer holds at least size bytes. Returns False if the stream ends first.
+    def fill(self, size):
+        while len(self.buffer) < size:
+            chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                self.buffer.extend(self.decompressor.flush())
+                return len(self.buffer) >= size
+            self.buffer.extend(self.decompressor.decompress(chunk))
+        return True
+
+
+    # Returns the next frame, or None at the end of the stream
+    def read_frame(self):
+        if not self.fill(FRAME_LENGTH.size):
+            if self.buffer:
+                raise ValueError("Session file is truncated")
+            return None
+        end = FRAME_LENGTH.size + FRAME_LENGTH.unpack_from(self.buffer)[0]
+        if not self.fill(end):
+            raise ValueError("Session file is truncated")
+        data = bytes(self.buffer[FRAME_LENGTH.size:end])
+        del self.buffer[:end]
+        return data
+
+
+    # Yields the summary of every plan, with its body kept as bytes under 'body' and its layout as (xs, ys)
+    def __iter__(self):
+        while True:
+            summary = self.read_frame()
+            if summary is None:
+                return
+            body, layout = self.read_frame(), self.read_frame()
+            if body is None or layout is None:
+                raise ValueError("Session file is truncated")
+            xs, ys = array('d'), array('d')
+            xs.frombytes(layout[:len(layout) // 2])
+            ys.frombytes(layout[len(layout) // 2:])
+            yield {**json.loads(summary), 'body': body, 'layout': (xs, ys)}
+
+
+# Parses the plan body, procedural text and cost text of a plan read from a session. The expanded texts are None if no subplans were grouped.
+def load_plan_body(entry):
+    return json.loads(entry['body'])
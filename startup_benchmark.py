@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules timed, with the most seconds their import may take in a fresh interpreter
+BUDGETS = {
+    'knobs': 0.5,
+    'preprocessing': 0.5,
+    'whatif': 0.5,
+    'workload': 0.5,
+    'baseline': 0.5,
+    'interface': 1.5,
+}
+
+# Libraries that must not be loaded by any of the modules above, only once a graph is drawn or costs are calibrated
+LAZY_MODULES = ('matplotlib', 'networkx', 'numpy')
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+# Imports a module in a new interpreter and returns the seconds it took and the lazy libraries it loaded
+def measure_import(module):
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Times each module a number of times and reports the median against its budget. Returns False on any regression.
+def run_benchmark(modules, repeat=5, scale=1.0):
+    passed = True
+    for module in modules:
+        try:
+            samples = [measure_import(module) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{module}: could not be imported ({e})")
+            passed = False
+            continue
+        seconds = statistics.median(sample['seconds'] for sample in samples)
+        loaded = sorted({name for sample in samples for name in sample['loaded']})
+        budget = BUDGETS[module] * scale
+        status = "ok"
+        if seconds > budget:
+            status = "SLOW"
+            passed = False
+        if loaded:
+            status = f"LOADS {', '.join(loaded)}"
+            passed = False
+        print(f"{module}: {seconds * 1000:.0f} ms (budget {budget * 1000:.0f} ms) {status}")
+    return passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check that the modules import quickly and without plotting libraries.")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies every budget, e.g. for slow machines")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.modules, args.repeat, args.scale) else 1)
@@ -0,0 +1,182 @@
+import customtkinter as ctk
+import tkinter as tk
+from tkinter import font as tkfont
+
+# Lines pulled from a line source at a time when scrolling or searching past the lines generated so far
+FILL_SIZE = 1024
+
+
+# Lines generated on demand from an iterable, so long outputs are only produced as far as they are viewed or searched
+class LineSource:
+    def __init__(self, lines=()):
+        self.iterator = iter(lines)
+        self.lines = []
+        self.exhausted = False
+
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(text.splitlines())
+
+
+    # Generates lines until there are at least count of them or the iterable ends
+    def fill(self, count):
+        while not self.exhausted and len(self.lines) < count:
+            line = next(self.iterator, None)
+            if line is None:
+                self.exhausted = True
+            else:
+                self.lines.append(line)
+
+
+    # Number of lines generated so far, the total once exhausted
+    def __len__(self):
+        return len(self.lines)
+
+
+    def get(self, start, stop):
+        self.fill(stop)
+        return self.lines[start:stop]
+
+
+    # Index of the first line from start on that contains the text, ignoring case, or None
+    def find(self, text, start=0):
+        text = text.lower()
+        position = start
+        while True:
+            self.fill(position + FILL_SIZE)
+            for index in range(position, len(self.lines)):
+                if text in self.lines[index].lower():
+                    return index
+            if self.exhausted:
+                return None
+            position = len(self.lines)
+
+
+# Read-only text pane that only puts the lines in view into the Tk text widget, with a search bar
+class VirtualTextView(ctk.CTkFrame):
+    def __init__(self, master, width=700, height=150, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.source = LineSource()
+        self.first = 0  # Index of the top line in view
+        self.visible = 1  # Number of lines that fit
+        self.match = None  # Index of the line found by the last search
+
+        # For searching the whole output
+        self.search_input = ctk.CTkEntry(self, placeholder_text="Search", width=200)
+        self.search_input.grid(row=0, column=0, padx=(0, 10), pady=(0, 5), sticky="W")
+        self.search_input.bind("<Return>", lambda event: self.on_search())
+        search_button = ctk.CTkButton(self, text="Find Next", width=80, command=self.on_search)
+        search_button.grid(row=0, column=1, pady=(0, 5), sticky="W")
+        self.search_label = ctk.CTkLabel(self, text="")
+        self.search_label.grid(row=0, column=2, padx=10, pady=(0, 5), sticky="W")
+
+        # Text widget of fixed pixel size, scrolled by line index instead of by its own contents
+        text_frame = tk.Frame(self, width=width, height=height, bg="#1d1e1e")
+        text_frame.grid(row=1, column=0, columnspan=3)
+        text_frame.grid_propagate(False)
+        text_frame.grid_rowconfigure(0, weight=1)
+        text_frame.grid_columnconfigure(0, weight=1)
+        self.text = tk.Text(text_frame, wrap="none", bg="#1d1e1e", fg="#dce4ee", borderwidth=0, highlightthickness=0, state="disabled")
+        self.text.grid(row=0, column=0, sticky="NSEW")
+        self.text.tag_configure("match", background="#1f6aa5")
+        self.v_scrollbar = tk.Scrollbar(text_frame, orient="vertical", command=self.on_scroll)
+        self.v_scrollbar.grid(row=0, column=1, sticky="NS")
+        h_scrollbar = tk.Scrollbar(text_frame, orient="horizontal", command=self.text.xview)
+        h_scrollbar.grid(row=1, column=0, sticky="EW")
+        self.text.configure(xscrollcommand=h_scrollbar.set)
+
+        self.line_height = tkfont.Font(font=self.text.cget("font")).metrics("linespace")
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", lambda event: self.scroll_to(self.first - event.delta // 120 * 3))
+        self.text.bind("<Button-4>", lambda event: self.scroll_to(self.first - 3))
+        self.text.bind("<Button-5>", lambda event: self.scroll_to(self.first + 3))
+
+
+    # Shows the lines of an iterable, generating them only as they are scrolled to
+    def set_lines(self, lines):
+        self.source = lines if isinstance(lines, LineSource) else LineSource(lines)
+        self.first = 0
+        self.match = None
+        self.search_label.configure(text="")
+        self.render()
+
+
+    def set_text(self, text):
+        self.set_lines(LineSource.from_text(text))
+
+
+    def clear(self):
+        self.set_lines(LineSource())
+
+
+    # Returns the whole text, generating any lines not yet viewed
+    def get_text(self):
+        self.source.fill(float('inf'))
+        return "\n".join(self.source.lines)
+
+
+    def on_resize(self, event):
+        self.visible = max(1, event.height // self.line_height)
+        self.render()
+
+
+    # Handles the scrollbar, which reports either a fraction to move to or a number of lines or pages to scroll by
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.get_total()))
+        elif unit == "pages":
+            self.scroll_to(self.first + int(amount) * self.visible)
+        else:
+            self.scroll_to(self.first + int(amount))
+
+
+    def scroll_to(self, line):
+        self.source.fill(line + self.visible)
+        self.first = max(0, min(line, len(self.source) - self.visible))
+        self.render()
+
+
+    # Number of lines the scrollbar covers. Until the source is exhausted there is always one more page than generated.
+    def get_total(self):
+        total = len(self.source) if self.source.exhausted else len(self.source) + self.visible
+        return max(total, self.first + self.visible, 1)
+
+
+    # Replaces the contents of the text widget with the lines in view
+    def render(self):
+        lines = self.source.get(self.first, self.first + self.visible)
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(lines))
+        if self.match is not None and self.first <= self.match < self.first + len(lines):
+            self.highlight(self.match - self.first + 1)
+        self.text.configure(state="disabled")
+        total = self.get_total()
+        self.v_scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+
+
+    def highlight(self, row):
+        text = self.search_input.get()
+        start = self.text.search(text, f"{row}.0", stopindex=f"{row}.end", nocase=True)
+        if start:
+            self.text.tag_add("match", start, f"{start}+{len(text)}c")
+
+
+    # Finds the next line containing the search text, wrapping around to the top once
+    def on_search(self):
+        text = self.search_input.get()
+        if not text:
+            return
+        start = self.match + 1 if self.match is not None else self.first
+        match = self.source.find(text, start)
+        if match is None and start > 0:
+            match = self.source.find(text, 0)
+        if match is None:
+            self.match = None
+            self.search_label.configure(text="Not found")
+            self.render()
+            return
+        self.match = match
+        self.search_label.configure(text=f"Line {match + 1}")
+        self.scroll_to(match)
@@ -1,52 +1,56 @@
 import itertools
+import difflib
+import hashlib
+import statistics
+import json as jsonlib
 import re
+from knobs import KnobRegistry, get_parameter
+from explain import ExplainRequest, format_plan_text
+from planstore import PlanStore
+from probes import ProbeRunner, FatalProbeError
+
+# Settings that give the planner more room without changing the units of cost, so plans under them are comparable with the QEP
+ROOM_PARAMETERS = ('work_mem', 'max_parallel_workers_per_gather', 'min_parallel_table_scan_size')
+
+# Multiples of the current value of a room parameter that are tried, and the parameters that give more room when lowered
+ROOM_FACTORS = (4, 16)
+ROOM_BELOW = ('min_parallel_table_scan_size',)
 
 # Handles the processing of 'what if' queries
 class QueryModifier:
-    def __init__(self, connection):
+    # Most relevant knobs whose combinations are all probed from one plan, i.e. at most 2^7 probes per plan found
+    MAX_COMBINATION_KNOBS = 7
+
+    def __init__(self, connection, knobs=None):
         self.connection = connection
+        # Planner knobs that make up a configuration, detected from the server if not given
+        self.knobs = knobs if knobs is not None else KnobRegistry.detect(connection)
+        # Configuration -> estimated cost and planning time samples of the probes run for it
+        self.probe_stats = {}
+        # Number of EXPLAINs run and skipped by the last enumeration, and how many configurations were seeded from a previous one
+        self.enumeration_stats = {'probes': 0, 'skipped': 0, 'seeded': 0, 'incremental': False, 'reused': 0}
+        # Executor that spreads probes over replicas, e.g. from DbConnect.probe_executor. None probes on this connection.
+        self.probe_executor = None
+        # Store the full bodies of enumerated plans are spilled to, created on first use if not given
+        self.plan_store = None
+        # Runs every probe with timeouts and retries and counts their outcomes. Probers copied for replicas share it.
+        self.probe_runner = ProbeRunner()
 
 
     # Logic to generate AQP and corresponding PostgreSQL query given original query and list of configurations
-    def get_aqp_and_query(self, query, configs, json=False):
-        config_names = [
-            'enable_bitmapscan',
-            'enable_indexscan',
-            'enable_indexonlyscan',
-            'enable_seqscan',
-            'enable_hashjoin',
-            'enable_mergejoin',
-            'enable_nestloop',
-            'enable_hashagg',
-            'enable_presorted_aggregate',
-            'enable_incremental_sort',
-            'enable_sort'
-        ]
-        config_queries = [
-            f"SET {config_name} TO FALSE;" for config, config_name in zip(configs, config_names) if not config
-        ]
+    # The plan is fetched once as JSON with the buffer and settings detail the server supports, and the text format is rendered from it.
+    # settings_queries are further SET statements applied after the configuration, e.g. parameter values found by find_cheapest_plan.
+    def get_aqp_and_query(self, query, configs, json=False, options=(), settings_queries=()):
+        config_queries = self.knobs.session_queries() + self.knobs.settings_queries(configs) + list(settings_queries)
         
         settings_query = "BEGIN; " + " ".join(config_queries)
-        if json:
-            explain_query = f"EXPLAIN (FORMAT JSON) {query};"
-        else:
-            explain_query = f"EXPLAIN {query};"
-        combined_query = settings_query + " " + explain_query  # To execute
+        request = ExplainRequest.with_details(query, options, getattr(self.knobs, 'server_version', None))
+        # The timeouts bound the query executed but are left out of the one displayed
+        timeout_queries = self.probe_runner.timeout_queries('ANALYZE' in request.options)
+        combined_query = "BEGIN; " + " ".join(timeout_queries + config_queries) + " " + request.statement()  # To execute
         display_query = settings_query + " " + query  # To display
-        with self.connection.cursor() as cursor:
-            try:
-                cursor.execute(combined_query)
-                result = cursor.fetchall()
-                if json:
-                    aqp = result[0][0]
-                    aqp_text = str(aqp)[1:-1]
-                else:
-                    aqp_text = "\n".join(row[0] for row in result)   
-            except Exception as e:
-                cursor.execute("ROLLBACK;")
-                raise e           
-            finally:
-                cursor.execute("ROLLBACK;")    
+        aqp = self.probe_runner.run(self.connection, combined_query)[0][0][0]
+        aqp_text = str(aqp) if json else format_plan_text(aqp)
         return display_query, aqp_text
 
 
@@ -57,88 +61,231 @@ class QueryModifier:
         return formatted_query
 
     #==========================Logic to generate all possible combinations of configurations=========================#
-    def retrieve_all_plans(self, inputQuery, qep):
-        # Configurations in order of execution
-        scan_config = ['bitmapscan', 'indexscan', 'indexonlyscan', 'seqscan']
-        other_config = ['hashjoin', 'mergejoin', 'nestloop', 'hashagg', 'presorted_aggregate', 'incremental_sort', 'sort']
-
-        plan_list = [qep]
-        config_list = [[True for _ in range(11)]]
-        l = [True, False]
-        
-        # Generate all 4-bit combinations for scan configurations, excluding all-True combination
-        combinations4 = [list(i) for i in itertools.product(l, repeat=4)]
-        combinations4.remove([True for _ in range(4)])
-
-        # Testing scan configurations
-        for config in combinations4:
-            query = 'BEGIN;' + ''.join(
-                f'SET enable_{setting} TO FALSE;' for setting, enabled in zip(scan_config, config) if not enabled
-            ) + f'EXPLAIN (FORMAT JSON) {inputQuery};'
-            
-            with self.connection.cursor() as cursor:
-                try:
-                    cursor.execute(query)
-                    aqp = self.parse_plan(cursor.fetchall()[0][0][0])
-                except Exception:
-                    aqp = None
-                finally:
-                    cursor.execute("ROLLBACK;")
+    # Finds a configuration for every distinct plan. Only fingerprints and summaries are kept in memory, plan bodies go to the plan store.
+    # Given the plans of a previous version of the query that has the same QEP, only their configurations are probed and only plans of
+    # shapes not found before are expanded, as the neighbourhoods of the others were explored then. This is a heuristic that can miss
+    # plans a full enumeration would find, so it is meant for edits of literals; otherwise the query is enumerated from scratch.
+    def retrieve_all_plans(self, inputQuery, qep, previous_plans=None):
+        if self.plan_store is None:
+            self.plan_store = PlanStore()
 
-            if aqp and aqp not in plan_list:
-                plan_list.append(aqp)
-                config_list.append(config + [True for _ in range(7)])
+        # Knobs in order of execution: scan knobs are tried first, then all other knobs on the plans found
+        groups = self.knobs.groups()
+        scan_indices = [i for i in groups.get('Scan', []) if self.knobs[i].is_relevant(qep)]
+        other_indices = [i for i in range(len(self.knobs)) if self.knobs[i].group != 'Scan']
+        default = self.knobs.default_configs()
 
-        # Iteratively modify configurations for joins, aggregation, sorting
-        plan_iterate = plan_list.copy()
-        config_iterate = config_list.copy()
-        
-        while True:
-            new_plans, new_configs = [], []
-
-            for plan, config in zip(plan_iterate, config_iterate):
-                if 'Join' not in str(plan) and 'Aggregate' not in str(plan) and 'Sort' not in str(plan):
-                    continue
-
-                # Generate combinations for other configurations based on plan contents
-                combinations7 = [list(i) for i in itertools.product(l, repeat=7) if i not in config_list]
-                if 'Join' not in str(plan):
-                    combinations7 = [comb for comb in combinations7 if False not in comb[:3]]
-                if 'Aggregate' not in str(plan):
-                    combinations7 = [comb for comb in combinations7 if False not in comb[3:5]]
-                if 'Sort' not in str(plan):
-                    combinations7 = [comb for comb in combinations7 if False not in comb[5:]]
-
-                # Execute configurations
-                for config2 in combinations7:
-                    query = 'BEGIN;' + ''.join(
-                        f'SET enable_{setting} TO FALSE;' for setting, enabled in zip(scan_config, config[:4]) if not enabled
-                    ) + ''.join(
-                        f'SET enable_{setting} TO FALSE;' for setting, enabled in zip(other_config, config2) if not enabled
-                    ) + f'EXPLAIN (FORMAT JSON) {inputQuery};'
-
-                    with self.connection.cursor() as cursor:
-                        try:
-                            cursor.execute(query)
-                            aqp = self.parse_plan(cursor.fetchall()[0][0][0])
-                        except Exception:
-                            aqp = None
-                        finally:
-                            cursor.execute("ROLLBACK;")
-
-                    if aqp and aqp not in plan_list and aqp not in new_plans:
-                        new_plans.append(aqp)
-                        new_configs.append(config[:4] + config2)
-        
-            if new_plans:
-                plan_iterate = new_plans.copy()
-                config_iterate = new_configs.copy()
-                plan_list.extend(new_plans)
-                config_list.extend(new_configs)
+        qep_fingerprint = self.store_plan(inputQuery, default, qep)
+        fingerprint_list = [qep_fingerprint]
+        config_list = [default]
+        seen = set()  # The QEP itself is not in here, so a configuration that reproduces it is still listed
+        probed = {tuple(default)}
+        self.probe_stats.setdefault(tuple(default), {'cost': qep.get('Plan', {}).get('Total Cost'), 'planning_times': []})
+        previous_plans = [entry for entry in previous_plans or [] if len(entry['config']) == len(self.knobs)]
+        explored = {entry['fingerprint'] for entry in previous_plans}  # Plan shapes whose neighbourhoods were explored before
+        incremental = qep_fingerprint in explored
+        self.enumeration_stats = {'probes': 0, 'skipped': 0, 'seeded': 0, 'incremental': incremental, 'reused': 0}
+
+        # Configurations with the summary of the plan they produced, used to skip probes whose plan is already known
+        known = [(default, {'fingerprint': qep_fingerprint, 'nodes': qep, 'operators': self.get_node_types(qep.get('Plan', {}))})]
+
+        # Each plan found is remembered by the configuration and the knobs relevant to it
+        iterate = []
+        if incremental:
+            self.enumeration_stats['reused'] += 1
+        else:
+            explored = set()
+            iterate.append((default, self.get_relevant_knobs(qep, other_indices)))
+
+        # First round of configurations: the productive ones of the previous query, or else the scan configurations
+        if incremental:
+            configs = [list(entry['config']) for entry in previous_plans if tuple(entry['config']) not in probed]
+            self.enumeration_stats['seeded'] = len(configs)
+        else:
+            configs = list(self.generate_combinations(default, scan_indices))
+        probed.update(tuple(config) for config in configs)
+        rounds = [configs]
+
+        # Iteratively modify configurations for joins, aggregation, sorting and the remaining knobs
+        while rounds or iterate:
+            if rounds:
+                configs = rounds.pop(0)
             else:
-                break
-            
-        return [{'aqp': plan, 'config': config} for plan, config in zip(plan_list, config_list)]
+                configs = []
+                # Collect the configurations of this round first so they can be probed as one batch
+                for config, relevant in iterate:
+                    # Only switch knobs that can affect the operators in the plan
+                    if not relevant:
+                        continue
+
+                    # Execute configurations, keeping the scan knobs of the plan and resetting the others
+                    base = [value if self.knobs[i].group == 'Scan' else default[i] for i, value in enumerate(config)]
+                    for config2 in self.generate_neighbours(config, base, relevant):
+                        if tuple(config2) in probed:
+                            continue
+                        probed.add(tuple(config2))
+                        configs.append(config2)
+                iterate = []
+
+            for summary, config in zip(self.probe_new_plans(inputQuery, configs, known), configs):
+                if summary and summary['fingerprint'] not in seen:
+                    seen.add(summary['fingerprint'])
+                    # A configuration that was not probed is listed with the body of the plan it must reproduce
+                    if 'source' in summary:
+                        self.copy_plan(inputQuery, summary['source'], config)
+                    fingerprint_list.append(summary['fingerprint'])
+                    config_list.append(config)
+                    if summary['fingerprint'] in explored:
+                        self.enumeration_stats['reused'] += 1
+                    else:
+                        iterate.append((config, self.get_relevant_knobs(summary['nodes'], other_indices)))
+
+        return [
+            {'fingerprint': fingerprint, 'config': config, **self.get_probe_summary(config)}
+            for fingerprint, config in zip(fingerprint_list, config_list)
+        ]
+
+
+    # Probes a batch of configurations, skipping those whose plan is already known. Returns the probe summaries in order.
+    def probe_new_plans(self, inputQuery, configs, known):
+        summaries = [None] * len(configs)
+        unknown = []
+        for idx, config in enumerate(configs):
+            match = self.find_known_plan(config, known)
+            if match is None:
+                unknown.append(idx)
+                continue
+            known_config, summary = match
+            summaries[idx] = {**summary, 'source': known_config}
+            self.probe_stats.setdefault(tuple(config), {'cost': self.probe_stats.get(tuple(known_config), {}).get('cost'), 'planning_times': []})
+            self.enumeration_stats['skipped'] += 1
+
+        for idx, summary in zip(unknown, self.probe_plans(inputQuery, [configs[idx] for idx in unknown])):
+            summaries[idx] = summary
+            if summary:
+                known.append((configs[idx], summary))
+        self.enumeration_stats['probes'] += len(unknown)
+        return summaries
+
+
+    # Finds a probed configuration whose plan a configuration must reproduce, as (configuration, summary), or None.
+    # Switching off a knob cannot change a plan that uses none of the operators the knob avoids, as that plan stays the cheapest allowed.
+    def find_known_plan(self, config, known):
+        for known_config, summary in known:
+            if all(
+                value == known_value or (known_value and not value and knob.operators and summary['operators'].isdisjoint(knob.operators))
+                for knob, value, known_value in zip(self.knobs, config, known_config)
+            ):
+                return known_config, summary
+        return None
+
+
+    # Indices of the given knobs that can affect the operators in a plan
+    def get_relevant_knobs(self, plan, indices):
+        return [i for i in indices if self.knobs[i].is_relevant(plan)]
+
+
+    # Generates every configuration that switches some of the given knobs away from their default, keeping the rest of base
+    def generate_combinations(self, base, indices):
+        choices = [(self.knobs[i].default, not self.knobs[i].default) for i in indices]
+        for values in itertools.product(*choices):
+            if all(value == self.knobs[i].default for i, value in zip(indices, values)):
+                continue
+            config = list(base)
+            for i, value in zip(indices, values):
+                config[i] = value
+            yield config
+
+
+    # Configurations to probe from a plan found: every combination of the relevant knobs if there are at most MAX_COMBINATION_KNOBS,
+    # otherwise one knob switched at a time from the configuration of the plan, so the search follows each new plan greedily
+    def generate_neighbours(self, config, base, relevant):
+        if len(relevant) <= self.MAX_COMBINATION_KNOBS:
+            yield from self.generate_combinations(base, relevant)
+            return
+        for i in relevant:
+            neighbour = list(config)
+            neighbour[i] = not neighbour[i]
+            yield neighbour
+
+
+    # Probes a batch of configurations, on replicas if a probe executor is set. Returns the probe summaries in order.
+    def probe_plans(self, inputQuery, configs):
+        if self.probe_executor is not None and configs:
+            return self.probe_executor.probe_plans(self, inputQuery, configs)
+        return [self.probe_plan(inputQuery, config) for config in configs]
+
+
+    # Runs EXPLAIN under a configuration and stores the plan. Returns its fingerprint, parsed nodes and node types, or None if the planner failed.
+    def probe_plan(self, inputQuery, config):
+        try:
+            plan = self.explain_json(inputQuery, self.knobs.settings_queries(config), ['SUMMARY'])
+        except FatalProbeError:
+            raise
+        except Exception:
+            return None
+        self.record_probe(config, plan)
+        nodes = self.parse_plan(plan)
+        return {'fingerprint': self.store_plan(inputQuery, config, plan, nodes), 'nodes': nodes, 'operators': self.get_node_types(plan['Plan'])}
+
+
+    # Spills the body of the plan of a configuration to the plan store and returns the fingerprint of the plan
+    def store_plan(self, inputQuery, config, plan, nodes=None):
+        if self.plan_store is not None:
+            self.plan_store.put(self.get_plan_key(inputQuery, config), plan)
+        return self.fingerprint_plan(nodes if nodes is not None else plan)
+
+
+    # Loads the body of the plan of an enumerated configuration from the plan store, None if it is not stored
+    def load_plan(self, inputQuery, config):
+        if self.plan_store is None:
+            return None
+        return self.plan_store.get(self.get_plan_key(inputQuery, config))
+
+
+    # Stores the body of the plan of one configuration under another configuration that reproduces it
+    def copy_plan(self, inputQuery, source_config, config):
+        plan = self.load_plan(inputQuery, source_config)
+        if plan is not None:
+            self.plan_store.put(self.get_plan_key(inputQuery, config), plan)
+
+
+    # Configurations with the same plan shape still differ in costs and estimates, so stored plans are keyed by query, session
+    # settings such as calibrated costs and configuration, rather than by fingerprint
+    def get_plan_key(self, inputQuery, config):
+        session = "".join(self.knobs.session_queries())
+        return hashlib.sha1(f"{inputQuery.strip()}\n{session}".encode()).hexdigest()[:16] + "".join("1" if value else "0" for value in config)
+
+
+    # Keeps the estimated cost and planning time reported by EXPLAIN (SUMMARY) for a configuration
+    def record_probe(self, config, plan):
+        stats = self.probe_stats.setdefault(tuple(config), {'cost': None, 'planning_times': []})
+        stats['cost'] = plan['Plan'].get('Total Cost')
+        if 'Planning Time' in plan:
+            stats['planning_times'].append(plan['Planning Time'])
+
+
+    # Estimated cost and median planning time in ms recorded for a configuration, None if it was not probed
+    def get_probe_summary(self, config):
+        stats = self.probe_stats.get(tuple(config))
+        if stats is None:
+            return {'cost': None, 'planning_time': None}
+        planning_times = stats['planning_times']
+        return {'cost': stats['cost'], 'planning_time': statistics.median(planning_times) if planning_times else None}
+
+
+    # Runs EXPLAIN (FORMAT JSON) after the given SET statements in a rolled back transaction and returns the plan
+    def explain_json(self, inputQuery, settings_queries, options=None):
+        request = ExplainRequest(inputQuery, options or [], getattr(self.knobs, 'server_version', None))
+        setup_queries = self.probe_runner.timeout_queries('ANALYZE' in request.options) + self.knobs.session_queries() + settings_queries
+        query = 'BEGIN;' + ''.join(setup_queries) + request.statement()
+        return self.probe_runner.run(self.connection, query)[0][0][0]
+
+
+    # Short hash identifying the structure of a plan, i.e. its operators, relations and indexes
+    def fingerprint_plan(self, qep):
+        nodes = self.parse_plan(qep) if isinstance(qep.get('Plan'), dict) else qep
+        return hashlib.sha1(jsonlib.dumps(nodes, sort_keys=True).encode()).hexdigest()[:16]
 
 
     def parse_plan(self, qep):
@@ -164,6 +311,245 @@ class QueryModifier:
                 nodes['Child'][childIndex]['Index'] = plan['Index Name']
     #================================================================================================================#
 
+    #=========================Logic to find values of numeric parameters where the plan changes=======================#
+    def sweep_parameter(self, inputQuery, parameter, configs=None, samples=8, tolerance=0.01):
+        settings_queries = self.knobs.settings_queries(configs) if configs is not None else []
+        probes = {}
+
+        # Plans the query with the parameter at a value, remembering every value already planned
+        def probe(value):
+            if value not in probes:
+                try:
+                    plan = self.explain_json(inputQuery, settings_queries + [parameter.set_statement(value)])
+                    probes[value] = (self.fingerprint_plan(plan), plan['Plan'].get('Total Cost'))
+                except FatalProbeError:
+                    raise
+                except Exception:
+                    probes[value] = (None, None)
+            return probes[value][0]
+
+        # Splits an interval until the value where the plan changes is pinned down to the tolerance
+        def bisect(low, high):
+            if probe(low) == probe(high):
+                return
+            if parameter.is_close(low, high, tolerance):
+                breakpoints.append({'low': low, 'high': high, 'before': probes[low][0], 'after': probes[high][0]})
+                return
+            mid = parameter.midpoint(low, high)
+            if mid in (low, high):
+                breakpoints.append({'low': low, 'high': high, 'before': probes[low][0], 'after': probes[high][0]})
+                return
+            bisect(low, mid)
+            bisect(mid, high)
+
+        # A coarse grid catches plans that only win inside the range, bisection then narrows each change
+        breakpoints = []
+        grid = parameter.grid(samples)
+        for low, high in zip(grid, grid[1:]):
+            bisect(low, high)
+
+        points = [(value, cost, fingerprint) for value, (fingerprint, cost) in sorted(probes.items())]
+        return {'parameter': parameter, 'points': points, 'breakpoints': breakpoints, 'probes': len(probes)}
+
+
+    # Formats the result of a sweep for display
+    def parse_sweep(self, sweep):
+        parameter = sweep['parameter']
+        output_text = f"{parameter.label} ({parameter.name}) swept from {parameter.low}{parameter.unit} to {parameter.high}{parameter.unit} using {sweep['probes']} EXPLAINs.\n"
+        if not sweep['breakpoints']:
+            output_text += "The plan does not change over the range.\n"
+        for idx, breakpoint in enumerate(sweep['breakpoints']):
+            low = parameter.format_value(breakpoint['low']) + parameter.unit
+            high = parameter.format_value(breakpoint['high']) + parameter.unit
+            output_text += f"Plan change {idx + 1}: between {low} and {high} (plan {breakpoint['before']} -> {breakpoint['after']})\n"
+        return output_text
+    #================================================================================================================#
+
+    #=====================================Logic to search for the cheapest forceable plan============================#
+    # Heuristic search for the cheapest plan the planner can be steered to, starting from the cheapest plan already enumerated.
+    # Under fixed settings the planner already returns the cheapest plan it finds, so switching knobs off cannot lower the cost.
+    # Only settings that give it more choices can: knobs that are off by default, and more memory and parallel workers.
+    # These keep the units costs are measured in, so costs stay comparable with the QEP. Each step tries every such change from the
+    # best settings found so far and keeps the cheapest, until no change lowers the cost. Every setting is planned at most once.
+    def find_cheapest_plan(self, inputQuery, qep, plans=None):
+        default = self.knobs.default_configs()
+        current_values = self.get_current_values([parameter.name for parameter in self.get_room_parameters()])
+        costs = {}  # (configuration, parameter values) -> (cost, plan), so no setting is planned twice
+        stats = {'probes': 0, 'seeded': 0}
+
+        # Plans the query under a configuration and parameter values, None if the planner failed
+        def probe(config, values):
+            key = (tuple(config), tuple(sorted(values.items())))
+            if key not in costs:
+                stats['probes'] += 1
+                try:
+                    plan = self.explain_json(inputQuery, self.knobs.settings_queries(config) + self.get_parameter_settings(values))
+                    costs[key] = (plan['Plan'].get('Total Cost', float('inf')), plan)
+                except FatalProbeError:
+                    raise
+                except Exception:
+                    costs[key] = (float('inf'), None)
+            return costs[key]
+
+        # The search starts from the cheapest of the QEP and the plans enumerated for it, with the costs recorded then
+        best = {'config': default, 'values': {}, 'cost': qep['Plan'].get('Total Cost', float('inf')), 'plan': qep}
+        costs[(tuple(default), ())] = (best['cost'], qep)
+        for entry in plans or []:
+            if entry.get('cost') is None or len(entry['config']) != len(self.knobs):
+                continue
+            stats['seeded'] += 1
+            costs.setdefault((tuple(entry['config']), ()), (entry['cost'], None))
+            if entry['cost'] < best['cost']:
+                best.update(config=list(entry['config']), values={}, cost=entry['cost'], plan=None)
+
+        while True:
+            candidates = []
+            for i, knob in enumerate(self.knobs):
+                if not knob.default and not best['config'][i]:
+                    candidates.append(([True if j == i else value for j, value in enumerate(best['config'])], best['values']))
+            for parameter in self.get_room_parameters():
+                for value in self.get_room_values(parameter, best['values'].get(parameter.name, current_values.get(parameter.name))):
+                    candidates.append((best['config'], {**best['values'], parameter.name: value}))
+
+            improved = None
+            for config, values in candidates:
+                cost, plan = probe(config, values)
+                if cost < best['cost'] and (improved is None or cost < improved['cost']):
+                    improved = {'config': config, 'values': values, 'cost': cost, 'plan': plan}
+            if improved is None:
+                break
+            best = improved
+
+        # A seeded plan that was not beaten is loaded from the plan store, or planned again if it is not stored
+        plan = best['plan'] or self.load_plan(inputQuery, best['config']) or self.explain_json(inputQuery, self.knobs.settings_queries(best['config']))
+        return {
+            'aqp': self.parse_plan(plan), 'plan': plan, 'config': best['config'], 'cost': best['cost'],
+            'settings': best['values'], 'settings_queries': self.get_parameter_settings(best['values']),
+            'qep_cost': qep['Plan'].get('Total Cost'), 'probes': stats['probes'], 'seeded': stats['seeded'],
+        }
+
+
+    # Numeric settings that give the planner more room without changing the units of cost, searched by find_cheapest_plan
+    def get_room_parameters(self):
+        return [get_parameter(name) for name in ROOM_PARAMETERS]
+
+
+    # Values that give the planner more room than the current one: ROOM_FACTORS times more, or less for settings in ROOM_BELOW,
+    # within the range of the parameter. Nothing is tried if the current value is unknown.
+    def get_room_values(self, parameter, current):
+        if current is None:
+            return []
+        values = []
+        for factor in ROOM_FACTORS:
+            if parameter.name in ROOM_BELOW:
+                value = max(current / factor, parameter.low)
+            else:
+                value = min(max(current, 1) * factor, parameter.high)
+            value = round(value) if parameter.integer else value
+            if value != current and value not in values:
+                values.append(value)
+        return values
+
+
+    # SET statements for parameter values, in the order of the parameters
+    def get_parameter_settings(self, values):
+        return [get_parameter(name).set_statement(value) for name, value in sorted(values.items())]
+
+
+    # Current values of numeric settings in the units of their Parameter, i.e. kB for sizes pg_settings reports in 8kB pages
+    def get_current_values(self, names):
+        name_list = ", ".join(f"'{name}'" for name in names)
+        query = (
+            "BEGIN;SELECT name, setting::float * CASE unit WHEN '8kB' THEN 8 WHEN 'MB' THEN 1024 ELSE 1 END "
+            f"FROM pg_settings WHERE name IN ({name_list});"
+        )
+        try:
+            return {name: value for name, value in self.probe_runner.run(self.connection, query)}
+        except FatalProbeError:
+            raise
+        except Exception:
+            return {}
+
+
+    # Returns the node types used in a plan, as a set or, if unique is False, as a list with one entry per node
+    def get_node_types(self, plan, unique=True):
+        node_types = [plan.get('Node Type')]
+        for sub_plan in plan.get('Plans', []):
+            node_types.extend(self.get_node_types(sub_plan, unique=False))
+        return set(node_types) if unique else node_types
+    #================================================================================================================#
+
+    #=========================================Logic to measure planning time=========================================#
+    # Re-plans every configuration until it has the given number of planning time samples and updates the plans with the medians
+    def measure_planning_times(self, inputQuery, plans, samples=5):
+        for plan in plans:
+            config = plan['config']
+            settings_queries = self.knobs.settings_queries(config)
+            stats = self.probe_stats.setdefault(tuple(config), {'cost': None, 'planning_times': []})
+            while len(stats['planning_times']) < samples:
+                try:
+                    self.record_probe(config, self.explain_json(inputQuery, settings_queries, ['SUMMARY']))
+                except FatalProbeError:
+                    raise
+                except Exception:
+                    break
+            plan.update(self.get_probe_summary(config))
+        return plans
+
+
+    # Formats the planning time and estimated cost of the QEP and every AQP for display
+    def parse_planning_times(self, plans):
+        output_text = ""
+        for idx, plan in enumerate(plans):
+            name = "QEP" if idx == 0 else f"Combination {idx + 1}"
+            planning_time = f"{plan['planning_time']:.3f} ms" if plan.get('planning_time') is not None else "unknown"
+            output_text += f"{name}: Planning Time {planning_time}, Total Cost {plan.get('cost')}\n"
+        return output_text
+    #================================================================================================================#
+
+    # Token level changes between two versions of a query, as (previous text, new text) pairs
+    def diff_queries(self, previous, current):
+        old, new = self.tokenize_query(previous), self.tokenize_query(current)
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        return [(" ".join(old[i1:i2]), " ".join(new[j1:j2])) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+    # Splits a query into quoted strings, numbers, words and single symbols
+    def tokenize_query(self, query):
+        return re.findall(r"'(?:[^']|'')*'|\d+(?:\.\d+)?|\w+|\S", query)
+
+
+    # Checks if changes to a query only replace numbers and quoted strings with others, so the plans of the previous query can be reused
+    def is_literal_change(self, changes):
+        literal = re.compile(r"'(?:[^']|'')*'|\d+(?:\.\d+)?")
+        for old, new in changes:
+            old_tokens, new_tokens = self.tokenize_query(old), self.tokenize_query(new)
+            if len(old_tokens) != len(new_tokens) or not all(literal.fullmatch(token) for token in old_tokens + new_tokens):
+                return False
+        return True
+
+
+    # Formats how much work the last enumeration took, and the query changes it was re-analysed for
+    def parse_enumeration_stats(self, changes=None):
+        stats = self.enumeration_stats
+        output_text = f"Enumerated with {stats['probes']} EXPLAINs, {stats['skipped']} skipped as they could not change a known plan.\n"
+        if changes is not None:
+            if stats['incremental']:
+                output_text += (
+                    f"Re-analysed after {len(changes)} change(s) to literals of the previous query: its {stats['seeded']} productive configuration(s) "
+                    f"were probed again and {stats['reused']} plan(s) of shapes found before were not expanded again:\n"
+                )
+            else:
+                output_text += f"Enumerated from scratch, as the previous query changed in more than literals or its QEP changed, after {len(changes)} change(s):\n"
+            for old, new in changes[:5]:
+                output_text += f"  {old!r} -> {new!r}\n"
+            if len(changes) > 5:
+                output_text += f"  ... and {len(changes) - 5} more\n"
+        if self.probe_executor is not None:
+            output_text += "".join(warning + "\n" for warning in self.probe_executor.take_warnings())
+        return output_text + self.probe_runner.parse_outcomes()
+
+
     # Extracts all valid configurations
     def retrieve_valid_combinations(self, plan):
             return [entry['config'] for entry in plan if 'config' in entry]
@@ -171,28 +557,21 @@ class QueryModifier:
 
     # Parse and formats list of valid combinations for display
     def parse_valid_configurations(self, valid_configurations):
+        return "".join(line + "\n" for line in self.generate_valid_configuration_lines(valid_configurations))
+
+
+    # Yields the display lines of the valid combinations one at a time, a block per combination followed by a blank line
+    def generate_valid_configuration_lines(self, valid_configurations):
         # Define the features corresponding to each index
-        features = [
-            "Bitmap Scan", "Index Scan", "Index Only Scan", "Sequential Scan",  # Scan Options
-            "Hash Join", "Merge Join", "Nest Loop",  # Join Options
-            "Hash Aggregate", "Presorted Aggregate",  # Aggregate Options
-            "Incremental Sort", "Sort"  # Sort Options
-        ]
-        
-        # Initialize an empty string to accumulate the output
-        output_text = ""
-        
-        # Iterate through the valid configurations
+        features = self.knobs.labels()
+
         for idx, config in enumerate(valid_configurations):
-            output_text += f"Combination {idx + 1}:\n"
-            
-            # Check each feature and append the result to the output string
-            for i, is_enabled in enumerate(config):
+            yield f"Combination {idx + 1}:"
+
+            # Check each feature and yield its status
+            for feature, is_enabled in zip(features, config):
                 status = "Enabled" if is_enabled else "Disabled"
-                output_text += f"{features[i]}: {status}\n"
-            output_text += "\n"  # Add a newline between combinations
-        
-        # Return the formatted output as text
-        return output_text
+                yield f"{feature}: {status}"
+            yield ""
 
         
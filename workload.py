@@ -0,0 +1,201 @@
+import csv
+import hashlib
+import json
+import re
+import sys
+
+# Logged plans and statements can be far longer than the default csv field limit
+csv.field_size_limit(2 ** 31 - 1)
+
+# csvlog has no header, the message is the 14th column
+CSVLOG_MESSAGE_COLUMN = 13
+DURATION_PATTERN = re.compile(r"duration: ([\d.]+) ms\s+(?:statement|execute [^:]*|parse [^:]*|bind [^:]*): (.*)", re.DOTALL)
+AUTO_EXPLAIN_PATTERN = re.compile(r"duration: ([\d.]+) ms\s+plan:\s*(.*)", re.DOTALL)
+
+
+# Reads queries from PostgreSQL logs or a pg_stat_statements export one at a time and aggregates them by fingerprint
+class WorkloadImporter:
+    def __init__(self, max_fingerprints=10000):
+        self.max_fingerprints = max_fingerprints  # Distinct queries kept in memory, the lightest are dropped beyond this
+        self.entries = {}  # Fingerprint -> aggregated entry
+        self.lines_read = 0
+        self.statements_read = 0
+
+
+    #=============================================Logic to read workloads============================================#
+    # Imports a file, detecting its format if not given. Returns the number of statements read.
+    def import_file(self, path, file_format=None):
+        file_format = file_format or self.detect_format(path)
+        with open(path, newline='', encoding='utf-8', errors='replace') as file:
+            if file_format == 'pg_stat_statements':
+                statements = self.read_pg_stat_statements(file)
+            elif file_format == 'csvlog':
+                statements = self.read_csvlog(file)
+            else:
+                statements = self.read_stderr_log(file)
+            count = 0
+            for query, calls, total_time in statements:
+                self.add_statement(query, calls, total_time)
+                count += 1
+        return count
+
+
+    # Guesses the format of a file from its first line
+    def detect_format(self, path):
+        with open(path, newline='', encoding='utf-8', errors='replace') as file:
+            first_line = file.readline()
+        header = [column.strip().lower() for column in next(csv.reader([first_line]), [])]
+        if 'query' in header and 'calls' in header:
+            return 'pg_stat_statements'
+        if path.endswith('.csv') or re.match(r'^\d{4}-\d{2}-\d{2} [\d:.]+ \w+,', first_line):
+            return 'csvlog'
+        return 'stderr'
+
+
+    # Yields (query, calls, total time in ms) from a pg_stat_statements export with a header row
+    def read_pg_stat_statements(self, file):
+        for row in csv.DictReader(file):
+            self.lines_read += 1
+            row = {key.strip().lower(): value for key, value in row.items() if key}
+            total_time = row.get('total_exec_time') or row.get('total_time') or 0
+            yield row['query'], int(float(row.get('calls') or 1)), float(total_time)
+
+
+    # Yields (query, 1, duration in ms) for every logged statement in a csvlog file
+    def read_csvlog(self, file):
+        for row in csv.reader(file):
+            self.lines_read += 1
+            if len(row) > CSVLOG_MESSAGE_COLUMN:
+                statement = self.parse_log_message(row[CSVLOG_MESSAGE_COLUMN])
+                if statement:
+                    yield statement
+
+
+    # Yields (query, 1, duration in ms) for every logged statement in a stderr log, joining continuation lines
+    def read_stderr_log(self, file):
+        message = None
+        for line in file:
+            self.lines_read += 1
+            line = line.rstrip('\r\n')
+            # Lines of a multi-line statement or plan are indented with a tab
+            if line.startswith('\t') and message is not None:
+                message += '\n' + line[1:]
+                continue
+            if message is not None:
+                statement = self.parse_log_message(message)
+                if statement:
+                    yield statement
+            match = re.search(r"\b(?:LOG|STATEMENT|DETAIL|ERROR|WARNING|NOTICE|FATAL|PANIC):\s+(.*)", line)
+            message = match.group(1) if match else None
+        if message is not None:
+            statement = self.parse_log_message(message)
+            if statement:
+                yield statement
+
+
+    # Extracts the query and duration from a log_min_duration_statement or auto_explain message
+    def parse_log_message(self, message):
+        match = AUTO_EXPLAIN_PATTERN.match(message)
+        if match:
+            query = self.get_auto_explain_query(match.group(2))
+            return (query, 1, float(match.group(1))) if query else None
+        match = DURATION_PATTERN.match(message)
+        if match:
+            return match.group(2).strip(), 1, float(match.group(1))
+        return None
+
+
+    # Finds the query text in an auto_explain plan logged in text or JSON format
+    def get_auto_explain_query(self, plan_text):
+        if plan_text.lstrip().startswith('{'):
+            try:
+                return json.loads(plan_text).get('Query Text', '').strip() or None
+            except ValueError:
+                match = re.search(r'"Query Text": ("(?:\\.|[^"\\])*")', plan_text)
+                return json.loads(match.group(1)).strip() if match else None
+        match = re.search(r"Query Text: (.*?)(?:\n\s*\S.*\(cost=|\Z)", plan_text, re.DOTALL)
+        return match.group(1).strip() if match else None
+    #================================================================================================================#
+
+    #===========================================Logic to aggregate queries===========================================#
+    # Replaces literals with placeholders so that queries differing only in constants share a fingerprint
+    def normalize_query(self, query):
+        normalized = re.sub(r"--[^\n]*", " ", query)
+        normalized = re.sub(r"/\*.*?\*/", " ", normalized, flags=re.DOTALL)
+        normalized = re.sub(r"'(?:[^']|'')*'", "?", normalized)
+        normalized = re.sub(r"\$\d+", "?", normalized)
+        normalized = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b", "?", normalized)
+        normalized = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", normalized)
+        normalized = re.sub(r"\s+", " ", normalized).strip().rstrip(';').strip()
+        return normalized.lower()
+
+
+    def fingerprint_query(self, query):
+        return hashlib.sha1(self.normalize_query(query).encode()).hexdigest()[:16]
+
+
+    # Adds a statement to the aggregate, keeping the first query text with literals as the example to plan
+    def add_statement(self, query, calls=1, total_time=0.0):
+        self.statements_read += 1
+        fingerprint = self.fingerprint_query(query)
+        entry = self.entries.get(fingerprint)
+        if entry is None:
+            entry = {'fingerprint': fingerprint, 'query': query.strip().rstrip(';'), 'calls': 0, 'total_time': 0.0}
+            self.entries[fingerprint] = entry
+        elif re.search(r"\$\d", entry['query']) and not re.search(r"\$\d", query):
+            entry['query'] = query.strip().rstrip(';')
+        entry['calls'] += calls
+        entry['total_time'] += total_time
+
+        # Memory stays bounded: once twice the limit is reached, only the heaviest entries are kept
+        if len(self.entries) >= 2 * self.max_fingerprints:
+            self.entries = {entry['fingerprint']: entry for entry in self.top(self.max_fingerprints)}
+
+
+    # Returns the heaviest n entries, weighted by total time or by number of calls
+    def top(self, n=10, by='total_time'):
+        return sorted(self.entries.values(), key=lambda entry: (entry[by], entry['calls']), reverse=True)[:n]
+    #================================================================================================================#
+
+    #============================================Logic to analyse workload===========================================#
+    # Runs the what-if enumerator on each of the heaviest queries with the given QueryModifier
+    def enumerate_workload(self, query_modifier, n=10, by='total_time'):
+        results = []
+        for entry in self.top(n, by):
+            result = dict(entry)
+            try:
+                qep = query_modifier.explain_json(entry['query'], [])
+                plans = query_modifier.retrieve_all_plans(entry['query'], qep)
+                result['qep_cost'] = qep['Plan'].get('Total Cost')
+                result['plans'] = plans
+                result['valid_configurations'] = query_modifier.retrieve_valid_combinations(plans)
+            except Exception as e:
+                result['error'] = str(e).strip()
+            # Replicas skipped or failed while enumerating this query
+            if query_modifier.probe_executor is not None:
+                result['warnings'] = query_modifier.probe_executor.take_warnings()
+            results.append(result)
+        return results
+
+
+    # Formats the heaviest queries, and their enumeration results if given, for display
+    def parse_workload(self, entries):
+        output_text = f"{self.statements_read} statements read from {self.lines_read} lines, {len(self.entries)} distinct queries.\n\n"
+        for idx, entry in enumerate(entries):
+            output_text += f"Query {idx + 1} ({entry['fingerprint']}): {entry['calls']} calls, {entry['total_time']:.2f} ms total\n"
+            output_text += f"{entry['query']}\n"
+            if 'error' in entry:
+                output_text += f"Failed to enumerate plans: {entry['error']}\n"
+            elif 'plans' in entry:
+                output_text += f"QEP cost {entry['qep_cost']}, {len(entry['valid_configurations'])} valid combinations\n"
+            output_text += "".join(warning + "\n" for warning in entry.get('warnings', []))
+            output_text += "\n"
+        return output_text
+    #================================================================================================================#
+
+
+if __name__ == '__main__':
+    importer = WorkloadImporter()
+    for path in sys.argv[1:]:
+        importer.import_file(path)
+    print(importer.parse_workload(importer.top(10)))